@@ -1,4 +1,7 @@
 import torch 
+import torch.multiprocessing as mp
+import torch.distributed as dist
+from torch.nn.utils import parameters_to_vector, vector_to_parameters
 from torch import nn, optim
 from torch.utils.data import DataLoader, TensorDataset, Subset, random_split, sampler
 import torchvision 
@@ -19,49 +22,223 @@ import os
 from os.path import exists as file_exists
 import seaborn as sns
 import pandas as pd
-import sympy
-from sympy.solvers import solve 
-from sympy import Symbol 
 import argparse
 from numpy import genfromtxt
 from datetime import datetime
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+import time
 from PIL import Image
 from sklearn.isotonic import IsotonicRegression
 
 now = datetime.now()    
 date_time = now.strftime('%m.%d_%H.%M.%S')
 
-def class_card(prev_labels,
-               x,
-               num_classes,
-               model,
-               is_isoreg,
-               rare_isoreg,
-               common_isoreg,
-               device):
+def class_probs(x,
+                num_classes,
+                model,
+                is_isoreg,
+                rare_isoreg,
+                common_isoreg,
+                device):
     
     model.eval()
-    logits = model(x.unsqueeze(0).to(device))
+    with torch.no_grad():
+        logits = model(x.to(device))
     softmax = nn.functional.softmax(logits, dim=1)
     
-    top_score = softmax.max(1).values
-    pred = softmax.max(1).indices
+    top_scores, preds = softmax.max(1)
     
     if is_isoreg:
-        if pred < 5:
-            cal_top_score = rare_isoreg.predict(top_score.cpu().detach().numpy())
-            
-        else:
-            cal_top_score = common_isoreg.predict(top_score.cpu().detach().numpy())
-    
-        renorm_factor = (1 - torch.from_numpy(cal_top_score).to(device))/(softmax.sum() - top_score) if top_score < 1 else 0
-        softmax = torch.mul(renorm_factor*torch.ones(num_classes).to(device), softmax)
-        softmax.squeeze().double()[pred] = torch.from_numpy(cal_top_score).to(device)
-    
-    softmax = softmax.squeeze()
-    label_counts = [(prev_labels==i).float().sum() for i in range(num_classes)]
+        cal_top_scores = torch.where(preds < 5, rare_isoreg(top_scores), common_isoreg(top_scores))
+        
+        # class_card's arithmetic row by row: the float32 mass off the top class sets the factor, and a row with a top score
+        # of 1 is zeroed, since class_card's factor of 0 kept it float32 and its calibrated top score went into a discarded copy
+        renorm_factors = torch.where(top_scores < 1, (1 - cal_top_scores)/(softmax.sum(1) - top_scores), torch.zeros_like(cal_top_scores))
+        softmax = renorm_factors.unsqueeze(1)*softmax
+        softmax[torch.arange(len(x), device=device), preds] = torch.where(top_scores < 1, cal_top_scores, torch.zeros_like(cal_top_scores))
     
-    return sum([softmax[i] * np.sqrt(label_counts[i] + 1) for i in range(num_classes)]), sum([softmax[i] * np.sqrt(label_counts[i]) for i in range(num_classes)])
+    return softmax.double().cpu()
+
+class StreamProbs:
+    def __init__(self,
+                 stream_x,
+                 num_classes,
+                 model,
+                 is_isoreg,
+                 rare_isoreg,
+                 common_isoreg,
+                 device,
+                 score_batch_size):
+        
+        self.stream_x = stream_x
+        self.score_batch_size = score_batch_size
+        self.score = lambda x: class_probs(x, num_classes, model, is_isoreg, rare_isoreg, common_isoreg, device)
+        
+        self.start = 0
+        self.probs = torch.empty(0)
+        self.calls = 0
+        self.saved = 0
+    
+    def __getitem__(self, i):
+        # chunks are scored lazily from the first item whose decision is not forced by the count bounds
+        if not self.start <= i < self.start + len(self.probs):
+            self.start = i
+            self.probs = self.score(self.stream_x[i:i+self.score_batch_size])
+        self.calls += 1
+        return self.probs[i - self.start]
+
+objectives = {'sqrt': lambda n, param: torch.sqrt(n),
+              'log1p': lambda n, param: torch.log1p(n),
+              'capped_linear': lambda n, param: torch.clamp(n, max=param),
+              'power': lambda n, param: torch.pow(n, param)}
+
+class Objective:
+    def __init__(self, name, budget, param=None):
+        if name in ['capped_linear', 'power'] and param is None:
+            raise ValueError(f'objective {name} needs --objective_param')
+        
+        # outside (0, 1] the power objective is not concave, so its increments would not shrink
+        if name == 'power' and not 0 < param <= 1:
+            raise ValueError(f'objective power needs --objective_param in (0, 1], got {param}')
+        
+        n = torch.arange(budget+2, dtype=torch.double)
+        vals = objectives[name](n, param)
+        
+        self.name = name
+        self.inc = lambda n: (objectives[name](torch.tensor(n + 1., dtype=torch.double), param) - objectives[name](torch.tensor(float(n), dtype=torch.double), param)).item()
+        self.vals = vals[:-1]
+        self.incs = vals[1:] - vals[:-1]
+    
+    def balanced_size(self, tau):
+        # the size at which a class's increment drops to tau; the table only runs to the budget, so past it the first
+        # such size is found by doubling and then bisecting over the (non-increasing) increments
+        if self.incs[-1] <= tau:
+            return int((self.incs > tau).sum())
+        lo, hi = len(self.incs) - 1, 2*len(self.incs)
+        while self.inc(hi) > tau:
+            lo, hi = hi, 2*hi
+        while hi - lo > 1:
+            mid = (lo + hi)//2
+            lo, hi = (mid, hi) if self.inc(mid) > tau else (lo, mid)
+        return hi
+
+class SelectionState:
+    def __init__(self, num_classes, objective, is_isoreg):
+        self.counts = torch.zeros(num_classes, dtype=torch.long)
+        self.size = 0
+        
+        # calibrated rows do not keep a unit mass (rows with a top score of 1 are zeroed, and float32 renormalization can leave
+        # the rest slightly above 1), so they are never forced in and are only forced out below a padded mass
+        self.convex = not is_isoreg
+        self.max_mass = 1. if self.convex else 1.01
+        
+        self.vals = objective.vals
+        self.incs = objective.incs
+        
+        self.cur_vals = self.vals[self.counts]
+        self.cur_incs = self.incs[self.counts]
+    
+    def add(self, y):
+        y = int(y)
+        self.counts[y] += 1
+        self.size += 1
+        self.cur_vals[y] = self.vals[self.counts[y]]
+        self.cur_incs[y] = self.incs[self.counts[y]]
+    
+    def sync(self, counts):
+        # the size stays local, since the budget bounds each agent's own selection
+        self.counts = counts.clone()
+        self.cur_vals = self.vals[self.counts]
+        self.cur_incs = self.incs[self.counts]
+    
+    def gain(self, softmax):
+        return softmax @ self.cur_incs
+    
+    def value(self, softmax=None):
+        return self.cur_vals.sum() if softmax is None else softmax @ self.cur_vals
+    
+    def forced(self, threshold, budget, weights=None):
+        # softmax @ weights is a convex combination, so it is decided without scoring once threshold is outside their range
+        weights = self.cur_incs if weights is None else weights
+        if self.size >= budget or weights.max()*self.max_mass < threshold:
+            return False
+        if self.convex and weights.min() >= threshold:
+            return True
+        return None
+
+class SelectionStates:
+    def __init__(self, num_states, num_classes, objective, is_isoreg):
+        self.counts = torch.zeros(num_states, num_classes, dtype=torch.long)
+        self.sizes = torch.zeros(num_states, dtype=torch.long)
+        self.convex = not is_isoreg
+        self.max_mass = 1. if self.convex else 1.01
+        
+        self.vals = objective.vals
+        self.incs = objective.incs
+        
+        self.cur_vals = self.vals[self.counts]
+        self.cur_incs = self.incs[self.counts]
+    
+    def add(self, y, mask=None):
+        # y is one label for every masked state, or one label per state
+        mask = torch.ones_like(self.sizes, dtype=torch.bool) if mask is None else mask
+        states = mask.nonzero().view(-1)
+        y = torch.as_tensor(y).long().expand(len(self.sizes))[states]
+        self.counts[states, y] += 1
+        self.sizes += mask
+        self.cur_vals[states, y] = self.vals[self.counts[states, y]]
+        self.cur_incs[states, y] = self.incs[self.counts[states, y]]
+    
+    def gains(self, softmax):
+        return self.cur_incs @ softmax
+    
+    def values(self, softmax=None):
+        return self.cur_vals.sum(1) if softmax is None else self.cur_vals @ softmax
+    
+    def forced(self, thresholds, budget, weights=None):
+        weights = self.cur_incs if weights is None else weights
+        reject = (self.sizes >= budget) | (weights.max(1).values*self.max_mass < thresholds)
+        accept = ~reject & self.convex & (weights.min(1).values >= thresholds)
+        return accept, reject
+    
+    def keep(self, mask):
+        self.counts = self.counts[mask]
+        self.sizes = self.sizes[mask]
+        self.cur_vals = self.cur_vals[mask]
+        self.cur_incs = self.cur_incs[mask]
+
+class SelectedBuffer:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.x = None
+        self.y = None
+        self.size = 0
+        self.ends = []
+    
+    def extend(self, x, y):
+        # storage is allocated once the item shape is known and kept across clears
+        if self.x is None:
+            self.x = torch.empty((self.capacity,) + tuple(x.shape[1:]), dtype=x.dtype)
+            self.y = torch.empty(self.capacity, dtype=y.dtype)
+        self.x[self.size:self.size+len(x)] = x
+        self.y[self.size:self.size+len(y)] = y
+        self.size += len(x)
+        self.ends += [self.size]
+    
+    def append(self, x, y):
+        self.extend(x.unsqueeze(0), y.unsqueeze(0))
+    
+    def clear(self):
+        self.size = 0
+        self.ends = []
+    
+    def view(self):
+        return self.x[:self.size], self.y[:self.size]
+    
+    def segments(self):
+        # one view per extend since the last clear, e.g. one per agent when agent selections are merged
+        return [(self.x[start:end], self.y[start:end]) for start, end in zip([0] + self.ends[:-1], self.ends)]
 
 def get_DIST_DMGT_subsets(stream_x,
                           stream_y,
@@ -73,29 +250,171 @@ def get_DIST_DMGT_subsets(stream_x,
                           rare_isoreg,
                           common_isoreg,
                           device,
-                          budget):
-    
-    DIST_DMGT_x = stream_x[0].unsqueeze(0)
-    DIST_DMGT_y = stream_y[0].unsqueeze(0)
+                          budget,
+                          score_batch_size,
+                          objective,
+                          oracle_calls):
+    
+    DIST_DMGT_buffer = SelectedBuffer(budget)
+    DIST_DMGT_buffer.append(stream_x[0], stream_y[0])
+    sel_idxs = [0]
+    
+    DIST_DMGT_state = SelectionState(num_classes, objective, is_isoreg)
+    DIST_DMGT_state.add(stream_y[0])
+    
+    stream_probs = StreamProbs(stream_x,
+                               num_classes,
+                               DIST_DMGT_model,
+                               is_isoreg,
+                               rare_isoreg,
+                               common_isoreg,
+                               device,
+                               score_batch_size)
     
     for i in range(1, len(stream_x)):
-        f_values =  class_card(DIST_DMGT_y,
-                      stream_x[i],
-                      num_classes,
-                      DIST_DMGT_model,
-                      is_isoreg,
-                      rare_isoreg,
-                      common_isoreg,
-                      device)
-        
-        if f_values[0] - f_values[1] >= taus[int(sel_round)] and len(DIST_DMGT_x) < budget:
-            DIST_DMGT_x = torch.cat((DIST_DMGT_x, stream_x[i].unsqueeze(0)))
-            DIST_DMGT_y = torch.cat((DIST_DMGT_y, stream_y[i].unsqueeze(0)))
+        decided = DIST_DMGT_state.forced(taus[int(sel_round)], budget)
+        if decided is None:
+            decided = bool(DIST_DMGT_state.gain(stream_probs[i]) >= taus[int(sel_round)])
+        else:
+            stream_probs.saved += 1
+        if decided:
+            DIST_DMGT_buffer.append(stream_x[i], stream_y[i])
+            sel_idxs += [i]
+            DIST_DMGT_state.add(stream_y[i])
+    
+    oracle_calls += torch.tensor([stream_probs.calls, stream_probs.saved, DIST_DMGT_state.size])
     
+    DIST_DMGT_x, DIST_DMGT_y = DIST_DMGT_buffer.view()
     rand_idxs = torch.randperm(len(stream_x))[:budget]
     RAND_x = stream_x[rand_idxs]
     RAND_y = stream_y[rand_idxs]
-    return DIST_DMGT_x, DIST_DMGT_y, RAND_x, RAND_y
+    
+    # the stream positions of both selections go with them, so the index encoding sends them as they are
+    return DIST_DMGT_x, DIST_DMGT_y, RAND_x, RAND_y, torch.tensor(sel_idxs), rand_idxs
+
+def get_SYNC_DMGT_subsets(agent_streams_x,
+                          agent_streams_y,
+                          taus,
+                          sel_round,
+                          DIST_DMGT_model,
+                          num_classes,
+                          is_isoreg,
+                          rare_isoreg,
+                          common_isoreg,
+                          device,
+                          budget,
+                          score_batch_size,
+                          objective,
+                          sync_period,
+                          oracle_calls,
+                          sync_stats):
+    
+    num_agents = len(agent_streams_x)
+    agent_counts = torch.zeros(num_agents, num_classes, dtype=torch.long)
+    
+    agent_buffers = []
+    agent_states = []
+    agent_stream_probs = []
+    for agent in range(num_agents):
+        agent_buffers += [SelectedBuffer(budget)]
+        agent_buffers[agent].append(agent_streams_x[agent][0], agent_streams_y[agent][0])
+        
+        agent_states += [SelectionState(num_classes, objective, is_isoreg)]
+        agent_states[agent].add(agent_streams_y[agent][0])
+        agent_counts[agent, int(agent_streams_y[agent][0])] += 1
+        
+        agent_stream_probs += [StreamProbs(agent_streams_x[agent],
+                                           num_classes,
+                                           DIST_DMGT_model,
+                                           is_isoreg,
+                                           rare_isoreg,
+                                           common_isoreg,
+                                           device,
+                                           score_batch_size)]
+    
+    # agents score gains against their own counts plus the other agents' counts as of the last sync, and every sync costs each agent its counts up and the global counts down
+    stream_len = max(len(agent_stream_x) for agent_stream_x in agent_streams_x)
+    for start in range(1, stream_len, sync_period):
+        for agent in range(num_agents):
+            for i in range(start, min(start + sync_period, len(agent_streams_x[agent]))):
+                decided = agent_states[agent].forced(taus[int(sel_round)], budget)
+                if decided is None:
+                    decided = bool(agent_states[agent].gain(agent_stream_probs[agent][i]) >= taus[int(sel_round)])
+                else:
+                    agent_stream_probs[agent].saved += 1
+                if decided:
+                    agent_buffers[agent].append(agent_streams_x[agent][i], agent_streams_y[agent][i])
+                    agent_states[agent].add(agent_streams_y[agent][i])
+                    agent_counts[agent, int(agent_streams_y[agent][i])] += 1
+        
+        if start + sync_period < stream_len:
+            for agent in range(num_agents):
+                agent_states[agent].sync(agent_counts.sum(0))
+            sync_stats[0] += 1
+            sync_stats[1] += 2*agent_counts.numel()*agent_counts.element_size()
+    
+    oracle_calls += torch.tensor([sum(stream_probs.calls for stream_probs in agent_stream_probs),
+                                  sum(stream_probs.saved for stream_probs in agent_stream_probs),
+                                  int(agent_counts.sum())])
+    
+    # share of the value the agents credit their own selections with that is lost once the selections are pooled
+    sync_stats[2] = 1 - objective.vals[agent_counts.sum(0)].sum()/objective.vals[agent_counts].sum()
+    
+    return [agent_buffer.view() for agent_buffer in agent_buffers]
+
+def get_VEC_DMGT_subsets(streams_x,
+                         streams_y,
+                         taus,
+                         sel_round,
+                         DIST_DMGT_model,
+                         num_classes,
+                         is_isoreg,
+                         rare_isoreg,
+                         common_isoreg,
+                         device,
+                         budget,
+                         score_batch_size,
+                         objective,
+                         oracle_calls):
+    
+    num_agents, stream_len = streams_y.shape
+    tau = taus[int(sel_round)]
+    
+    # the agents are the rows of one count state, and every agent keeps its first item as in get_DIST_DMGT_subsets
+    selected = torch.zeros(num_agents, stream_len, dtype=torch.bool)
+    selected[:,0] = True
+    VEC_states = SelectionStates(num_agents, num_classes, objective, is_isoreg)
+    VEC_states.add(streams_y[:,0])
+    
+    start = 0
+    probs = torch.empty(num_agents, 0, num_classes, dtype=torch.double)
+    calls = 0
+    
+    for i in range(1, stream_len):
+        accept, reject = VEC_states.forced(tau, budget)
+        undecided = ~(accept | reject)
+        if undecided.any():
+            # one forward pass scores the next chunk of items for every agent at once
+            if not start <= i < start + probs.shape[1]:
+                start = i
+                chunk_x = streams_x[:,i:i+score_batch_size]
+                probs = class_probs(chunk_x.flatten(0,1),
+                                    num_classes,
+                                    DIST_DMGT_model,
+                                    is_isoreg,
+                                    rare_isoreg,
+                                    common_isoreg,
+                                    device).view(num_agents, -1, num_classes)
+            gains = (probs[:,i-start].unsqueeze(1) @ VEC_states.cur_incs.unsqueeze(2)).view(num_agents)
+            accept |= undecided & (gains >= tau)
+            calls += int(undecided.sum())
+        
+        selected[accept,i] = True
+        VEC_states.add(streams_y[:,i], accept)
+    
+    oracle_calls += torch.tensor([calls, num_agents*(stream_len-1) - calls, int(VEC_states.sizes.sum())])
+    
+    return [(streams_x[agent][selected[agent]], streams_y[agent][selected[agent]]) for agent in range(num_agents)]
 
 def get_SIEVE_subsets(stream_x,
                       stream_y,
@@ -106,60 +425,63 @@ def get_SIEVE_subsets(stream_x,
                       common_isoreg,
                       device,
                       budget,
-                      epsilon):
+                      epsilon,
+                      score_batch_size,
+                      objective,
+                      oracle_calls):
 
     SIEVE_x = stream_x[0].unsqueeze(0)
     SIEVE_y = stream_y[0].unsqueeze(0)
     
-    init_x = SIEVE_x[0]
     init_y = SIEVE_y[0]
 
-    m = 1
+    m = objective.incs[0].item()
     epsilon = 0.1
     j = 1
     O = []
     while (1+epsilon)**j >= m and (1+epsilon)**j <= 2*m*len(stream_x):
         O += [(1+epsilon)**j]
         j += 1
-    set_dict = {}
-    taus = torch.Tensor().to(device)
-    for i in range(1, len(stream_x)):
-        new_taus = torch.Tensor().to(device)
-        for idx,v in enumerate(O):
-            if v not in list(set_dict.keys()):
-                set_dict[v] = [(init_x,init_y)]
-                taus = torch.cat((taus,torch.tensor([[v]]).to(device)))
-            else:
-                f_values = class_card(torch.tensor(list(zip(*set_dict[v]))[1]),
-                                      stream_x[i],
-                                      num_classes,
-                                      SIEVE_model,
-                                      is_isoreg,
-                                      rare_isoreg,
-                                      common_isoreg,
-                                      device)
-                tau = (v/2 - f_values[1])/(budget - len(set_dict[v]))
-                new_taus = torch.cat((new_taus,torch.tensor([tau]).to(device)))
-                if f_values[0] - f_values[1] >= tau and len(set_dict[v]) < budget:
-                    set_dict[v] += [(stream_x[i],stream_y[i])]
-        if len(new_taus) > 0:
-            taus = torch.cat((taus, new_taus.unsqueeze(1)),dim=1) 
-
-    max_value = -np.inf
-    max_key = None
-    max_idx = 0
-    for idx,key in enumerate(list(set_dict.keys())):
-        label_counts = [(torch.tensor(list(zip(*set_dict[key]))[1])==i).float().sum() for i in range(num_classes)]
-        if sum([np.sqrt(label_counts[i]) for i in range(num_classes)]) > max_value:
-            max_key = key
-            max_idx = idx
-            max_value = sum([np.sqrt(label_counts[i]) for i in range(num_classes)])
-    SIEVE_x = torch.stack(list(zip(*set_dict[max_key]))[0])
-    SIEVE_y = torch.stack(list(zip(*set_dict[max_key]))[1])
-    sel_taus = taus[max_idx][1:]
-    SIEVE_min_max_taus = torch.tensor([sel_taus.min(),sel_taus.max()])
-    
-    return SIEVE_x, SIEVE_y, SIEVE_min_max_taus
+    O = torch.tensor(O, dtype=torch.double)
+    
+    SIEVE_states = SelectionStates(len(O), num_classes, objective, is_isoreg)
+    SIEVE_states.add(init_y)
+    sieve_idxs = torch.zeros(len(O), budget, dtype=torch.int32)
+    taus = torch.full((len(O), len(stream_x)-2), np.nan, dtype=torch.double)
+    
+    stream_probs = StreamProbs(stream_x,
+                               num_classes,
+                               SIEVE_model,
+                               is_isoreg,
+                               rare_isoreg,
+                               common_isoreg,
+                               device,
+                               score_batch_size)
+    
+    # the second item only opens the sieves, as in the original per-threshold loop
+    for i in range(2, len(stream_x)):
+        remaining = budget - SIEVE_states.sizes
+        accept, reject = SIEVE_states.forced(O/2, budget, SIEVE_states.cur_incs*remaining.unsqueeze(1) + SIEVE_states.cur_vals)
+        undecided = ~(accept | reject)
+        if undecided.any():
+            probs = stream_probs[i]
+            taus[:,i-2] = (O/2 - SIEVE_states.values(probs))/remaining
+            accept |= undecided & (SIEVE_states.gains(probs) >= taus[:,i-2])
+        else:
+            stream_probs.saved += 1
+        sieve_idxs[accept, SIEVE_states.sizes[accept]] = i
+        SIEVE_states.add(stream_y[i], accept)
+
+    oracle_calls += torch.tensor([stream_probs.calls, stream_probs.saved, int(SIEVE_states.sizes.sum())])
+    
+    max_idx = int(SIEVE_states.values().argmax())
+    sel_idxs = sieve_idxs[max_idx,:SIEVE_states.sizes[max_idx]].long()
+    SIEVE_x = stream_x[sel_idxs]
+    SIEVE_y = stream_y[sel_idxs]
+    sel_taus = taus[max_idx]
+    SIEVE_min_max_taus = torch.tensor([np.nanmin(sel_taus.numpy()),np.nanmax(sel_taus.numpy())])
+    
+    return SIEVE_x, SIEVE_y, SIEVE_min_max_taus, sel_idxs
 
 def get_SIEVE_PLUS_subsets(stream_x,
                            stream_y,
@@ -170,77 +492,197 @@ def get_SIEVE_PLUS_subsets(stream_x,
                            common_isoreg,
                            device,
                            budget,
-                           epsilon):
+                           epsilon,
+                           score_batch_size,
+                           objective,
+                           oracle_calls):
 
-    SIEVE_PLUS_x = stream_x[0].unsqueeze(0)
-    SIEVE_PLUS_y = stream_y[0].unsqueeze(0)
+    init_y = stream_y[0]
     
-    init_x = SIEVE_PLUS_x[0]
-    init_y = SIEVE_PLUS_y[0]
-
-    m = 1
-    epsilon = 0.1
+    # every item has the same singleton value m, so the live thresholds are only ever cut from below by the lower bound
+    m = objective.incs[0].item()
     lb = 0
-    set_dict = {}
-    taus = torch.Tensor().to(device)
+    
+    tau_min = max(lb,m)/(2*budget)
+    j = np.arange(np.floor(np.log(tau_min/(1+epsilon))/np.log(1+epsilon)), np.ceil(np.log(m)/np.log(1+epsilon))+1)
+    O = torch.tensor((1+epsilon)**j, dtype=torch.double)
+    O = O[(O >= tau_min/(1+epsilon)) & (O <= m)]
+    
+    SIEVE_PLUS_states = SelectionStates(len(O), num_classes, objective, is_isoreg)
+    SIEVE_PLUS_states.add(init_y)
+    sieve_idxs = torch.zeros(len(O), budget, dtype=torch.int32)
+    peak_size = int(SIEVE_PLUS_states.sizes.sum())
+    
+    stream_probs = StreamProbs(stream_x,
+                               num_classes,
+                               SIEVE_PLUS_model,
+                               is_isoreg,
+                               rare_isoreg,
+                               common_isoreg,
+                               device,
+                               score_batch_size)
+    
     for i in range(1, len(stream_x)):
-        new_taus = torch.Tensor().to(device)
+        accept, reject = SIEVE_PLUS_states.forced(O, budget)
+        undecided = ~(accept | reject)
+        if undecided.any():
+            accept |= undecided & (SIEVE_PLUS_states.gains(stream_probs[i]) >= O)
+        else:
+            stream_probs.saved += 1
+        if not accept.any():
+            continue
+        
+        sieve_idxs[accept, SIEVE_PLUS_states.sizes[accept]] = i
+        SIEVE_PLUS_states.add(stream_y[i], accept)
+        peak_size = max(peak_size, int(SIEVE_PLUS_states.sizes.sum()))
+        
+        lb = max(lb, SIEVE_PLUS_states.values().max().item())
         tau_min = max(lb,m)/(2*budget)
+        live = O >= tau_min/(1+epsilon)
+        if not live.all():
+            O = O[live]
+            sieve_idxs = sieve_idxs[live]
+            SIEVE_PLUS_states.keep(live)
+    
+    oracle_calls += torch.tensor([stream_probs.calls, stream_probs.saved, peak_size])
+    
+    max_idx = int(SIEVE_PLUS_states.values().argmax())
+    sel_idxs = sieve_idxs[max_idx,:SIEVE_PLUS_states.sizes[max_idx]].long()
+    SIEVE_PLUS_x = stream_x[sel_idxs]
+    SIEVE_PLUS_y = stream_y[sel_idxs]
+    
+    return SIEVE_PLUS_x, SIEVE_PLUS_y, O[max_idx], sel_idxs
+
+def get_THREE_SIEVES_subsets(stream_x,
+                             stream_y,
+                             THREE_SIEVES_model,
+                             num_classes,
+                             is_isoreg,
+                             rare_isoreg,
+                             common_isoreg,
+                             device,
+                             budget,
+                             epsilon,
+                             patience,
+                             score_batch_size,
+                             objective,
+                             oracle_calls):
+
+    init_y = stream_y[0]
+    
+    # a single sieve walks down the thresholds, so only one selection of at most budget items is stored
+    m = objective.incs[0].item()
+    j = int(np.ceil(np.log(m)/np.log(1+epsilon)))
+    O = []
+    while (1+epsilon)**j <= budget*m:
+        O += [(1+epsilon)**j]
+        j += 1
+    O = O[::-1]
+    
+    THREE_SIEVES_state = SelectionState(num_classes, objective, is_isoreg)
+    THREE_SIEVES_state.add(init_y)
+    sel_idxs = [0]
+    v_idx = 0
+    t = 0
+    
+    stream_probs = StreamProbs(stream_x,
+                               num_classes,
+                               THREE_SIEVES_model,
+                               is_isoreg,
+                               rare_isoreg,
+                               common_isoreg,
+                               device,
+                               score_batch_size)
+    
+    for i in range(1, len(stream_x)):
+        remaining = budget - THREE_SIEVES_state.size
+        decided = THREE_SIEVES_state.forced(O[v_idx]/2, budget, THREE_SIEVES_state.cur_incs*remaining + THREE_SIEVES_state.cur_vals)
+        if decided is None:
+            probs = stream_probs[i]
+            decided = bool(THREE_SIEVES_state.gain(probs) >= (O[v_idx]/2 - THREE_SIEVES_state.value(probs))/remaining)
+        else:
+            stream_probs.saved += 1
+        if decided:
+            sel_idxs += [i]
+            THREE_SIEVES_state.add(stream_y[i])
+            t = 0
+        else:
+            t += 1
+            # lower the threshold after patience consecutive rejections
+            if t >= patience and v_idx < len(O)-1:
+                v_idx += 1
+                t = 0
+    
+    oracle_calls += torch.tensor([stream_probs.calls, stream_probs.saved, THREE_SIEVES_state.size])
+    
+    THREE_SIEVES_x = stream_x[sel_idxs]
+    THREE_SIEVES_y = stream_y[sel_idxs]
+    return THREE_SIEVES_x, THREE_SIEVES_y, torch.tensor(sel_idxs)
 
-        j = 1
-        O_i = []
-        while (1+epsilon)**j >= tau_min/(1+epsilon) and (1+epsilon)**j <= 1:
-            O_i += [(1+epsilon)**j]
-            j += 1
-        
-        set_dict = {tau:set_dict[tau] for tau in set_dict if tau > tau_min}
-        for idx,tau in enumerate(O_i):
-            if tau not in list(set_dict.keys()):
-                set_dict[tau] = [(init_x,init_y)]
-                taus = torch.cat((taus,torch.tensor([[tau]]).to(device)))
+class TensorLoader():
+    
+    def __init__(self,
+                 dataset,
+                 batch_size,
+                 shuffle=False):
+        
+        # Subset views, random_split's included, collapse to one index tensor into the backing TensorDataset
+        self.dataset = dataset
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.idxs = None
+        while isinstance(dataset, Subset):
+            idxs = torch.as_tensor(dataset.indices, dtype=torch.long)
+            self.idxs = idxs if self.idxs is None else idxs[self.idxs]
+            dataset = dataset.dataset
+        self.tensors = dataset.tensors
+    
+    def __len__(self):
+        return -(-len(self.dataset) // self.batch_size)
+    
+    def __iter__(self):
+        
+        # the permutation comes from the global generator, so a seeded run draws the same batches
+        idxs = torch.randperm(len(self.dataset)) if self.shuffle else None
+        if self.idxs is not None:
+            idxs = self.idxs if idxs is None else self.idxs[idxs]
+        
+        for start in range(0, len(self.dataset), self.batch_size):
+            if idxs is None:
+                yield tuple(tensor[start:start+self.batch_size] for tensor in self.tensors)
             else:
-                f_values = class_card(torch.tensor(list(zip(*set_dict[tau]))[1]),
-                                      stream_x[i],
-                                      num_classes,
-                                      SIEVE_model,
-                                      is_isoreg,
-                                      rare_isoreg,
-                                      common_isoreg,
-                                      device)
-                new_taus = torch.cat((new_taus,torch.tensor([tau]).to(device)))
-                if tau > 0 and f_values[0] - f_values[1] >= tau and len(set_dict[tau]) < budget:
-                    set_dict[tau] += [(stream_x[i],stream_y[i])]
-                    lb = max(lb, sum([np.sqrt(label_counts[i] for i in range(num_classes))]))
-        if len(new_taus) > 0:
-            taus = torch.cat((taus, new_taus.unsqueeze(1)),dim=1) 
-
-    max_value = -np.inf
-    max_key = None
-    max_idx = 0
-    for idx,key in enumerate(list(set_dict.keys())):
-        label_counts = [(torch.tensor(list(zip(*set_dict[key]))[1])==i).float().sum() for i in range(num_classes)]
-        if sum([np.sqrt(label_counts[i]) for i in range(num_classes)]) > max_value:
-            max_key = key
-            max_idx = idx
-            max_value = sum([np.sqrt(label_counts[i]) for i in range(num_classes)])
-    SIEVE_PLUS_x = torch.stack(list(zip(*set_dict[max_key]))[0])
-    SIEVE_PLUS_y = torch.stack(list(zip(*set_dict[max_key]))[1])
-    sel_taus = taus[max_idx][1:]
-    SIEVE_PLUS_min_max_taus = torch.tensor([sel_taus.min(),sel_taus.max()])
-    
-    return SIEVE_PLUS_x, SIEVE_PLUS_y, SIEVE_PLUS_min_max_taus
+                yield tuple(tensor[idxs[start:start+self.batch_size]] for tensor in self.tensors)
 
 def train(device,
           num_epochs,
           train_loader,
           class_dict,
-          model):
+          model,
+          trainer,
+          stop_loader,
+          stop_patience,
+          time_budget,
+          train_stats):
    
+    # models are trained in place, so either trainer warm starts from the previous round's weights
+    if trainer == 'lbfgs':
+        return train_lbfgs(device, num_epochs, train_loader, model, stop_loader, stop_patience, time_budget, train_stats)
+    
     model = model.to(device)
     
     optimizer = optim.SGD(model.parameters(), lr=0.001, momentum=0.9, weight_decay=0.0005)
     criterion = nn.CrossEntropyLoss()
     
+    # a held-out loss that stops improving first cuts the learning rate, then ends training after stop_patience epochs
+    scheduler = optim.lr_scheduler.ReduceLROnPlateau(optimizer, factor=0.1, patience=stop_patience//2) if stop_patience > 0 else None
+    best_loss, best_state, bad_epochs = float('inf'), None, 0
+    
+    # stop reasons: 0 epoch cap, 1 train accuracy, 2 held-out patience, 3 time budget
+    stop_reason = 0
+    start = time.time()
+    
+    # a run of zero epochs reports zero epochs trained
+    epoch = -1
     for epoch in range(num_epochs):
         
         train_loss = 0.0
@@ -264,10 +706,241 @@ def train(device,
         print(f'Epoch: {epoch} Train Loss: {train_loss:.6f}  Train Acc: {train_acc:.6f}')
 
         if train_acc >= 0.99:
+            stop_reason = 1
             break
+        
+        if stop_patience > 0:
+            stop_loss = calc_loss(model, stop_loader)
+            scheduler.step(stop_loss)
+            if stop_loss < best_loss:
+                best_loss, best_state, bad_epochs = stop_loss, {name: param.clone() for name, param in model.state_dict().items()}, 0
+            else:
+                bad_epochs += 1
+            if bad_epochs >= stop_patience:
+                stop_reason = 2
+                break
+        
+        if time_budget > 0 and time.time() - start >= time_budget:
+            stop_reason = 3
+            break
+    
+    # unless the selection was fit, the weights with the best held-out loss are kept
+    if best_state is not None and stop_reason != 1:
+        model.load_state_dict(best_state)
+    
+    if train_stats is not None:
+        train_stats[0], train_stats[1] = epoch + 1, stop_reason
+    
+    return model
 
+def train_lbfgs(device,
+                num_epochs,
+                train_loader,
+                model,
+                stop_loader,
+                stop_patience,
+                time_budget,
+                train_stats):
+    
+    # the selection is small enough for one batch, so the loss SGD descends, weight decay included, is minimized over all of it
+    data, targets = (torch.cat(tensors).to(device) for tensors in zip(*train_loader))
+    model = model.to(device)
+    
+    # with a held-out check or a time budget, each step runs one iteration so both are checked between iterations
+    checked = stop_patience > 0 or time_budget > 0
+    optimizer = optim.LBFGS(model.parameters(), max_iter=1 if checked else num_epochs, tolerance_grad=1e-5, tolerance_change=1e-9, line_search_fn='strong_wolfe')
+    criterion = nn.CrossEntropyLoss()
+    
+    def closure():
+        optimizer.zero_grad()
+        loss = criterion(model(data), targets.long()) + 0.0005/2*sum(param.pow(2).sum() for param in model.parameters())
+        loss.backward()
+        return loss
+    
+    param_state = optimizer.state[optimizer.param_groups[0]["params"][0]]
+    best_loss, best_state, bad_iters = float('inf'), None, 0
+    
+    # stop reasons as in train: 0 iteration cap or convergence, 2 held-out patience, 3 time budget
+    stop_reason = 0
+    start = time.time()
+    
+    for _ in range(num_epochs if checked else 1):
+        num_iters = param_state.get("n_iter", 0)
+        model.train()
+        optimizer.step(closure)
+        
+        # a step that runs no iteration means the tolerances were met
+        if param_state.get("n_iter", 0) == num_iters:
+            break
+        
+        if stop_patience > 0:
+            stop_loss = calc_loss(model, stop_loader)
+            if stop_loss < best_loss:
+                best_loss, best_state, bad_iters = stop_loss, {name: param.clone() for name, param in model.state_dict().items()}, 0
+            else:
+                bad_iters += 1
+            if bad_iters >= stop_patience:
+                stop_reason = 2
+                break
+        
+        if time_budget > 0 and time.time() - start >= time_budget:
+            stop_reason = 3
+            break
+    
+    # the weights with the best held-out loss are kept
+    if best_state is not None:
+        model.load_state_dict(best_state)
+    
+    with torch.no_grad():
+        output = model(data)
+        train_loss = criterion(output, targets.long()).item()
+        train_acc = (output.max(1)[1]==targets).float().mean().item()
+    
+    num_iters = param_state.get("n_iter", 0)
+    print(f'Iterations: {num_iters} Train Loss: {train_loss:.6f}  Train Acc: {train_acc:.6f}')
+    
+    if train_stats is not None:
+        train_stats[0], train_stats[1] = num_iters, stop_reason
+    
     return model
 
+def train_stacked(device,
+                  num_epochs,
+                  train_sets,
+                  batch_size,
+                  models,
+                  stop_loader,
+                  stop_patience,
+                  time_budget,
+                  train_stats):
+    
+    num_tracks = len(models)
+    
+    # the tracks' linear heads are stacked, so one batched step updates every track that is still training
+    weight = torch.stack([model.linear.weight.detach() for model in models]).to(device).requires_grad_()
+    bias = torch.stack([model.linear.bias.detach() for model in models]).to(device).requires_grad_()
+    momentum_bufs = [torch.zeros_like(weight), torch.zeros_like(bias)]
+    
+    # ragged per-track selections are padded to a common length, and the padding is masked out of every batch
+    sizes = torch.tensor([len(y) for x, y in train_sets], device=device)
+    data = torch.zeros((num_tracks, int(sizes.max())) + tuple(train_sets[0][0].shape[1:]), device=device)
+    targets = torch.zeros(num_tracks, int(sizes.max()), dtype=torch.long, device=device)
+    for k, (x, y) in enumerate(train_sets):
+        data[k,:len(y)] = x.to(device)
+        targets[k,:len(y)] = y.to(device).long()
+    
+    training = torch.ones(num_tracks, dtype=torch.bool, device=device)
+    epochs = torch.zeros(num_tracks, dtype=torch.long, device=device)
+    
+    # stop reasons as in train: 0 epoch cap, 1 train accuracy, 2 held-out patience, 3 time budget
+    stop_reasons = torch.zeros(num_tracks, dtype=torch.long, device=device)
+    
+    # every track keeps its own learning rate, plateau count and best held-out weights, as a sequential run with ReduceLROnPlateau would
+    lrs = torch.full((num_tracks,), 0.001, device=device)
+    if stop_patience > 0:
+        stop_x, stop_y = (torch.cat(tensors).to(device) for tensors in zip(*stop_loader))
+        plateau_losses = torch.full((num_tracks,), float('inf'), device=device)
+        plateau_epochs = torch.zeros(num_tracks, dtype=torch.long, device=device)
+        best_losses = torch.full((num_tracks,), float('inf'), device=device)
+        bad_epochs = torch.zeros(num_tracks, dtype=torch.long, device=device)
+        best_weight, best_bias = weight.detach().clone(), bias.detach().clone()
+        has_best = torch.zeros(num_tracks, dtype=torch.bool, device=device)
+    
+    train_start = time.time()
+    
+    for epoch in range(num_epochs):
+        
+        train_loss = torch.zeros(num_tracks, device=device)
+        train_acc = torch.zeros(num_tracks, device=device)
+        
+        # every track shuffles its own items, and padded positions sort last
+        order = torch.stack([torch.cat((torch.randperm(int(size)), torch.arange(int(size), data.shape[1]))) for size in sizes]).to(device)
+        
+        for start in range(0, data.shape[1], batch_size):
+            batch_idxs = order[:,start:start+batch_size]
+            mask = (batch_idxs < sizes.unsqueeze(1)) & training.unsqueeze(1)
+            active = mask.any(1)
+            if not active.any():
+                break
+            
+            # only tracks with items left in this batch are computed, so short and finished tracks cost nothing
+            tracks = active.nonzero()
+            batch_idxs, mask = batch_idxs[active], mask[active]
+            output = torch.baddbmm(bias[active].unsqueeze(1), data[tracks,batch_idxs], weight[active].transpose(1,2))
+            batch_targets = targets[tracks,batch_idxs]
+            losses = nn.functional.cross_entropy(output.flatten(0,1), batch_targets.flatten(), reduction='none').view(mask.shape)*mask
+            
+            # each track's loss is the mean over its own batch, as CrossEntropyLoss gives the sequential trainer
+            weight.grad, bias.grad = None, None
+            (losses.sum(1)/mask.sum(1)).sum().backward()
+            
+            # SGD with momentum and weight decay as in train, applied only to tracks with a batch in this step
+            with torch.no_grad():
+                for param, momentum_buf in zip((weight, bias), momentum_bufs):
+                    step_mask = active.view((-1,) + (1,)*(param.dim()-1))
+                    momentum_buf.copy_(torch.where(step_mask, 0.9*momentum_buf + param.grad + 0.0005*param, momentum_buf))
+                    param.sub_(lrs.view(step_mask.shape)*momentum_buf*step_mask)
+            
+            train_loss[active] += losses.detach().sum(1)/mask.sum(1)
+            train_acc[active] += ((output.detach().max(2)[1]==batch_targets) & mask).sum(1)
+        
+        train_loss = train_loss/sizes
+        train_acc = train_acc/sizes
+        
+        print(f'Epoch: {epoch} Tracks: {training.sum().item()}  Train Loss: {train_loss[training].mean().item():.6f}  Train Acc: {train_acc[training].mean().item():.6f}')
+        
+        # a track that reaches the accuracy the sequential trainer stops at drops out of the stacked job
+        epochs += training
+        fit = training & (train_acc >= 0.99)
+        stop_reasons[fit] = 1
+        training &= ~fit
+        
+        if stop_patience > 0:
+            with torch.no_grad():
+                stop_output = torch.baddbmm(bias.unsqueeze(1), stop_x.expand((num_tracks,) + stop_x.shape), weight.transpose(1,2))
+                stop_losses = nn.functional.cross_entropy(stop_output.flatten(0,1), stop_y.long().repeat(num_tracks), reduction='none').view(num_tracks, -1).mean(1)
+            
+            # the plateau step of ReduceLROnPlateau(factor=0.1, patience=stop_patience//2) for every track still training
+            plateaued = training & ~(stop_losses < plateau_losses*(1 - 1e-4))
+            plateau_losses = torch.where(training & ~plateaued, stop_losses, plateau_losses)
+            plateau_epochs = torch.where(plateaued, plateau_epochs + 1, torch.where(training, 0, plateau_epochs))
+            cut = plateau_epochs > stop_patience//2
+            lrs = torch.where(cut, 0.1*lrs, lrs)
+            plateau_epochs[cut] = 0
+            
+            improved = training & (stop_losses < best_losses)
+            best_losses = torch.where(improved, stop_losses, best_losses)
+            best_weight[improved], best_bias[improved] = weight.detach()[improved], bias.detach()[improved]
+            has_best |= improved
+            bad_epochs = torch.where(improved, 0, bad_epochs + (training & ~improved))
+            
+            patience_out = training & (bad_epochs >= stop_patience)
+            stop_reasons[patience_out] = 2
+            training &= ~patience_out
+        
+        if time_budget > 0 and time.time() - train_start >= time_budget:
+            stop_reasons[training] = 3
+            training[:] = False
+        
+        if not training.any():
+            break
+    
+    # unless a track's selection was fit, the weights with its best held-out loss are kept
+    if stop_patience > 0:
+        restore = has_best & (stop_reasons != 1)
+        with torch.no_grad():
+            weight[restore], bias[restore] = best_weight[restore], best_bias[restore]
+    
+    with torch.no_grad():
+        for k, model in enumerate(models):
+            model.linear.weight.copy_(weight[k])
+            model.linear.bias.copy_(bias[k])
+    
+    if train_stats is not None:
+        train_stats[:,0], train_stats[:,1] = epochs.cpu(), stop_reasons.cpu()
+    
+    return models
+
 def load_model(model,
                embed_dim,
                num_classes,
@@ -279,6 +952,74 @@ def load_model(model,
     
     return model_copy
 
+def update_model(device,
+                 num_epochs,
+                 buffer,
+                 batch_size,
+                 num_workers,
+                 class_dict,
+                 model,
+                 embed_dim,
+                 num_classes,
+                 fedavg,
+                 trainer,
+                 stop_embeds_loader,
+                 stop_patience,
+                 time_budget,
+                 train_stats):
+    
+    if fedavg == 'none':
+        start = time.time()
+        model = train(device,
+                      num_epochs,
+                      TensorLoader(TensorDataset(*buffer.view()),
+                                   batch_size=batch_size,
+                                   shuffle=True),
+                      class_dict,
+                      model,
+                      trainer,
+                      stop_embeds_loader,
+                      stop_patience,
+                      time_budget,
+                      train_stats)
+        return model, time.time() - start
+    
+    agent_sets = [(x, y) for x, y in buffer.segments() if len(y) > 0]
+    if len(agent_sets) == 0:
+        return model, 0.
+    
+    agent_states = []
+    agent_times = []
+    agent_stats = []
+    for x, y in agent_sets:
+        start = time.time()
+        agent_stats += [torch.zeros(2)]
+        agent_model = train(device,
+                            num_epochs,
+                            TensorLoader(TensorDataset(x, y),
+                                         batch_size=batch_size,
+                                         shuffle=True),
+                            class_dict,
+                            load_model(model, embed_dim, num_classes, device),
+                            trainer,
+                            stop_embeds_loader,
+                            stop_patience,
+                            time_budget,
+                            agent_stats[-1])
+        agent_times += [time.time() - start]
+        agent_states += [agent_model.state_dict()]
+    
+    # agents fine-tune side by side, so a round takes as long as the slowest agent plus the averaging at the center
+    start = time.time()
+    weights = torch.tensor([len(y) if fedavg == 'size' else 1 for x, y in agent_sets], dtype=torch.float)
+    weights = weights/weights.sum()
+    model.load_state_dict({key: sum(weight*agent_state[key] for weight, agent_state in zip(weights, agent_states)) for key in agent_states[0]})
+    
+    # the slowest agent's epochs and stop reason are reported, as its time is
+    train_stats.copy_(agent_stats[agent_times.index(max(agent_times))])
+    
+    return model, max(agent_times) + time.time() - start
+
 def calc_acc(model,
              test_loader,
              num_classes):
@@ -303,6 +1044,21 @@ def calc_acc(model,
 
     return rare_acc.float().mean().unsqueeze(0), all_acc.float().mean().unsqueeze(0)
 
+def calc_loss(model,
+              val_loader):
+
+    model.eval()
+    
+    criterion = nn.CrossEntropyLoss(reduction='sum')
+    val_loss = 0.0
+    
+    for val_x, val_y in val_loader:
+        val_x, val_y = val_x.to(device), val_y.to(device)
+        with torch.no_grad():
+            val_loss += criterion(model(val_x), val_y.long()).item()
+    
+    return val_loss/len(val_loader.dataset)
+
 def calc_cal_acc(is_isoreg,
                  rare_isoreg,
                  common_isoreg,
@@ -362,6 +1118,26 @@ def calc_cal_acc(is_isoreg,
     
     return cal_rare_acc, cal_common_acc, cal_all_acc
 
+class IsoTable:
+    def __init__(self, isoreg):
+        # piecewise-linear knots of the fitted isotonic regression; a single knot is repeated so every score has a segment
+        self.xs = torch.from_numpy(np.repeat(isoreg.X_thresholds_, 2) if len(isoreg.X_thresholds_) == 1 else isoreg.X_thresholds_).double()
+        self.ys = torch.from_numpy(np.repeat(isoreg.y_thresholds_, 2) if len(isoreg.y_thresholds_) == 1 else isoreg.y_thresholds_).double()
+    
+    def __call__(self, scores):
+        if self.xs.device != scores.device:
+            self.xs, self.ys = self.xs.to(scores.device), self.ys.to(scores.device)
+        
+        scores = scores.double().clamp(self.xs[0], self.xs[-1])
+        idxs = torch.searchsorted(self.xs, scores, right=True).clamp(1, len(self.xs) - 1)
+        x0, x1, y0, y1 = self.xs[idxs-1], self.xs[idxs], self.ys[idxs-1], self.ys[idxs]
+        
+        weights = torch.where(x1 > x0, (scores - x0)/(x1 - x0), torch.zeros_like(scores))
+        return y0 + weights*(y1 - y0)
+    
+    def predict(self, scores):
+        return self(torch.from_numpy(np.ravel(scores))).cpu().numpy()
+
 def train_isoreg(model, val_loader):
     model.eval()
 
@@ -383,7 +1159,7 @@ def train_isoreg(model, val_loader):
     preds_correct = torch.cat(preds_correct, dim=0)
     
     IsoReg = IsotonicRegression(y_min=0, y_max=1, increasing=True, out_of_bounds='clip').fit(top_scores.cpu(), preds_correct.cpu())
-    return IsoReg 
+    return IsoTable(IsoReg) 
 
 def get_embed_loader(data_dir,
                      class_dict,
@@ -514,7 +1290,8 @@ def get_test_embed_loader(embed_dim,
                           class_dict,
                           num_test_pts,
                           idx_conv_dict,
-                          device):
+                          device,
+                          stop_frac):
     
     if not (file_exists(test_embeds_path) and
             file_exists(test_embeds_labels_path)):
@@ -562,29 +1339,31 @@ def get_test_embed_loader(embed_dim,
     test_common_embeds_idxs, val_common_embeds_idxs = (common_embeds_idxs[:int(len(common_embeds_idxs)/2)],
                                                        common_embeds_idxs[int(len(common_embeds_idxs)/2):])
     
+    # a stop_frac slice of each calibration half is held out of the isoregs for early stopping
+    stop_rare_embeds_idxs, val_rare_embeds_idxs = (val_rare_embeds_idxs[:int(stop_frac*len(val_rare_embeds_idxs))],
+                                                   val_rare_embeds_idxs[int(stop_frac*len(val_rare_embeds_idxs)):])
+
+    stop_common_embeds_idxs, val_common_embeds_idxs = (val_common_embeds_idxs[:int(stop_frac*len(val_common_embeds_idxs))],
+                                                       val_common_embeds_idxs[int(stop_frac*len(val_common_embeds_idxs)):])
+    
     test_embeds_dataset = TensorDataset(test_embeds, test_embeds_labels)
 
-    test_embeds_loader = DataLoader(Subset(test_embeds_dataset, torch.cat((test_rare_embeds_idxs, test_common_embeds_idxs))),
-                                    batch_size=embed_batch_size,
-                                    num_workers=num_workers,
-                                    shuffle=True)
+    test_embeds_loader = TensorLoader(Subset(test_embeds_dataset, torch.cat((test_rare_embeds_idxs, test_common_embeds_idxs))),
+                                      batch_size=embed_batch_size,
+                                      shuffle=True)
 
-    rare_val_embeds_loader = DataLoader(Subset(test_embeds_dataset, val_rare_embeds_idxs),
-                                        batch_size=batch_size,
-                                        num_workers=num_workers,
-                                        shuffle=True)
-    
-    common_val_embeds_loader = DataLoader(Subset(test_embeds_dataset, val_common_embeds_idxs),
+    rare_val_embeds_loader = TensorLoader(Subset(test_embeds_dataset, val_rare_embeds_idxs),
                                           batch_size=batch_size,
-                                          num_workers=num_workers,
                                           shuffle=True)
     
-    val_embeds_loader = DataLoader(Subset(test_embeds_dataset, torch.cat((val_rare_embeds_idxs, val_common_embeds_idxs))),
-                                   batch_size=batch_size,
-                                   num_workers=num_workers,
-                                   shuffle=True)
+    common_val_embeds_loader = TensorLoader(Subset(test_embeds_dataset, val_common_embeds_idxs),
+                                            batch_size=batch_size,
+                                            shuffle=True)
+    
+    stop_embeds_loader = TensorLoader(Subset(test_embeds_dataset, torch.cat((stop_rare_embeds_idxs, stop_common_embeds_idxs))),
+                                      batch_size=batch_size)
     
-    return test_embeds_loader, rare_val_embeds_loader, common_val_embeds_loader, val_embeds_loader
+    return test_embeds_loader, rare_val_embeds_loader, common_val_embeds_loader, stop_embeds_loader
 
 def get_test_loader(test_dir,
                     test_label_file,
@@ -641,6 +1420,278 @@ class LogRegModel(nn.Module):
         x = self.linear(x)
         return x
 
+def encode_payload(x, y, idxs, encoding):
+    if encoding == 'index':
+        return idxs.int()
+    if encoding == 'fp16':
+        return x.half(), y
+    if encoding == 'int8':
+        scale = x.flatten(1).abs().amax(1).clamp(min=1e-12)/127
+        return (x/scale.view(-1, *[1]*(x.dim()-1))).round().to(torch.int8), scale, y
+    return x, y
+
+def decode_payload(payload, store_x, store_y, encoding):
+    if encoding == 'index':
+        return store_x[payload.long()], store_y[payload.long()]
+    if encoding == 'fp16':
+        x, y = payload
+        return x.float(), y
+    if encoding == 'int8':
+        x, scale, y = payload
+        return x.float()*scale.view(-1, *[1]*(x.dim()-1)), y
+    return payload
+
+def payload_bytes(payload):
+    if isinstance(payload, torch.Tensor):
+        return payload.numel()*payload.element_size()
+    return sum(payload_bytes(part) for part in payload)
+
+class ArrivalStream:
+    def __init__(self, x, arrival_times):
+        self.x = x
+        self.arrival_times = arrival_times
+    
+    def __len__(self):
+        return len(self.x)
+    
+    def wait(self, i):
+        time.sleep(max(0, self.arrival_times[i] - time.time()))
+    
+    def __getitem__(self, idx):
+        # a slice only waits for its first item and is cut to the items that have arrived, so chunked scoring keeps pace with the stream
+        if isinstance(idx, slice):
+            start, stop, _ = idx.indices(len(self.x))
+            self.wait(start)
+            arrived = int(np.searchsorted(self.arrival_times, time.time(), side='right'))
+            return self.x[start:max(min(stop, arrived), start+1)]
+        if isinstance(idx, (int, np.integer)):
+            self.wait(idx)
+        else:
+            self.wait(int(torch.as_tensor(idx).max()) if len(idx) > 0 else 0)
+        return self.x[idx]
+
+def select_agent(agent_stream_x,
+                 agent_stream_y,
+                 seed,
+                 unif_taus,
+                 dyn_taus,
+                 sel_round,
+                 DIST_DMGT_UNIF_model,
+                 DIST_DMGT_DYN_model,
+                 SIEVE_model,
+                 SIEVE_PLUS_model,
+                 THREE_SIEVES_model,
+                 num_classes,
+                 is_isoreg,
+                 rare_DIST_DMGT_UNIF_isoreg,
+                 common_DIST_DMGT_UNIF_isoreg,
+                 rare_DIST_DMGT_DYN_isoreg,
+                 common_DIST_DMGT_DYN_isoreg,
+                 rare_SIEVE_isoreg,
+                 common_SIEVE_isoreg,
+                 rare_SIEVE_PLUS_isoreg,
+                 common_SIEVE_PLUS_isoreg,
+                 rare_THREE_SIEVES_isoreg,
+                 common_THREE_SIEVES_isoreg,
+                 device,
+                 budget,
+                 epsilon,
+                 patience,
+                 score_batch_size,
+                 objective,
+                 encoding,
+                 sync_period,
+                 vectorized,
+                 arrival_times=None):
+
+    # with the async simulator the trackers read the stream as its items arrive
+    agent_stream = ArrivalStream(agent_stream_x, arrival_times) if arrival_times is not None else agent_stream_x
+    
+    agent_oracle_calls = torch.zeros(5,3)
+    
+    # RAND draws from a per-agent seed, so the selections do not depend on which process runs the agent
+    if sync_period > 0 or vectorized:
+        # the coordinator selects the DMGT tracks itself, so agents only draw RAND and send empty DMGT selections
+        with torch.random.fork_rng(devices=[]):
+            torch.manual_seed(seed)
+            rand_idxs = torch.randperm(len(agent_stream))[:budget]
+        agent_RAND_x = agent_stream[rand_idxs]
+        agent_RAND_y = agent_stream_y[rand_idxs]
+        agent_RAND_idxs = rand_idxs
+        agent_DIST_DMGT_UNIF_x, agent_DIST_DMGT_UNIF_y, agent_DIST_DMGT_UNIF_idxs = agent_stream_x[:0], agent_stream_y[:0], rand_idxs[:0]
+        agent_DIST_DMGT_DYN_x, agent_DIST_DMGT_DYN_y, agent_DIST_DMGT_DYN_idxs = agent_stream_x[:0], agent_stream_y[:0], rand_idxs[:0]
+    else:
+        with torch.random.fork_rng(devices=[]):
+            torch.manual_seed(seed)
+            agent_DIST_DMGT_UNIF_x, agent_DIST_DMGT_UNIF_y, agent_RAND_x, agent_RAND_y, agent_DIST_DMGT_UNIF_idxs, agent_RAND_idxs = get_DIST_DMGT_subsets(agent_stream,
+                                                                                                                                                           agent_stream_y,
+                                                                                                                                                           unif_taus,
+                                                                                                                                                           sel_round,
+                                                                                                                                                           DIST_DMGT_UNIF_model,
+                                                                                                                                                           num_classes,
+                                                                                                                                                           is_isoreg,
+                                                                                                                                                           rare_DIST_DMGT_UNIF_isoreg,
+                                                                                                                                                           common_DIST_DMGT_UNIF_isoreg,
+                                                                                                                                                           device,
+                                                                                                                                                           budget,
+                                                                                                                                                           score_batch_size,
+                                                                                                                                                           objective,
+                                                                                                                                                           agent_oracle_calls[0])
+    
+        agent_DIST_DMGT_DYN_x, agent_DIST_DMGT_DYN_y, _, _, agent_DIST_DMGT_DYN_idxs, _ = get_DIST_DMGT_subsets(agent_stream,
+                                                                                                                agent_stream_y,
+                                                                                                                dyn_taus,
+                                                                                                                sel_round,
+                                                                                                                DIST_DMGT_DYN_model,
+                                                                                                                num_classes,
+                                                                                                                is_isoreg,
+                                                                                                                rare_DIST_DMGT_DYN_isoreg,
+                                                                                                                common_DIST_DMGT_DYN_isoreg,
+                                                                                                                device,
+                                                                                                                budget,
+                                                                                                                score_batch_size,
+                                                                                                                objective,
+                                                                                                                agent_oracle_calls[1])
+    
+    agent_SIEVE_x, agent_SIEVE_y, agent_sieve_min_max_taus, agent_SIEVE_idxs = get_SIEVE_subsets(agent_stream,
+                                                                                                 agent_stream_y,
+                                                                                                 SIEVE_model,
+                                                                                                 num_classes,
+                                                                                                 is_isoreg,
+                                                                                                 rare_SIEVE_isoreg,
+                                                                                                 common_SIEVE_isoreg,
+                                                                                                 device,
+                                                                                                 budget,
+                                                                                                 epsilon,
+                                                                                                 score_batch_size,
+                                                                                                 objective,
+                                                                                                 agent_oracle_calls[2])
+    
+    agent_SIEVE_PLUS_x, agent_SIEVE_PLUS_y, _, agent_SIEVE_PLUS_idxs = get_SIEVE_PLUS_subsets(agent_stream,
+                                                                                              agent_stream_y,
+                                                                                              SIEVE_PLUS_model,
+                                                                                              num_classes,
+                                                                                              is_isoreg,
+                                                                                              rare_SIEVE_PLUS_isoreg,
+                                                                                              common_SIEVE_PLUS_isoreg,
+                                                                                              device,
+                                                                                              budget,
+                                                                                              epsilon,
+                                                                                              score_batch_size,
+                                                                                              objective,
+                                                                                              agent_oracle_calls[3])
+    
+    agent_THREE_SIEVES_x, agent_THREE_SIEVES_y, agent_THREE_SIEVES_idxs = get_THREE_SIEVES_subsets(agent_stream,
+                                                                                                   agent_stream_y,
+                                                                                                   THREE_SIEVES_model,
+                                                                                                   num_classes,
+                                                                                                   is_isoreg,
+                                                                                                   rare_THREE_SIEVES_isoreg,
+                                                                                                   common_THREE_SIEVES_isoreg,
+                                                                                                   device,
+                                                                                                   budget,
+                                                                                                   epsilon,
+                                                                                                   patience,
+                                                                                                   score_batch_size,
+                                                                                                   objective,
+                                                                                                   agent_oracle_calls[4])
+    
+    # the center decodes every track payload against its own copy of the agent stream
+    return encode_payload(agent_DIST_DMGT_UNIF_x, agent_DIST_DMGT_UNIF_y, agent_DIST_DMGT_UNIF_idxs, encoding), encode_payload(agent_RAND_x, agent_RAND_y, agent_RAND_idxs, encoding), encode_payload(agent_DIST_DMGT_DYN_x, agent_DIST_DMGT_DYN_y, agent_DIST_DMGT_DYN_idxs, encoding), encode_payload(agent_SIEVE_x, agent_SIEVE_y, agent_SIEVE_idxs, encoding), agent_sieve_min_max_taus, encode_payload(agent_SIEVE_PLUS_x, agent_SIEVE_PLUS_y, agent_SIEVE_PLUS_idxs, encoding), encode_payload(agent_THREE_SIEVES_x, agent_THREE_SIEVES_y, agent_THREE_SIEVES_idxs, encoding), agent_oracle_calls
+
+def agent_rank(rank,
+               world_size,
+               master_port,
+               embed_dim,
+               num_classes):
+
+    dist.init_process_group('gloo', init_method='tcp://127.0.0.1:%d' % master_port, rank=rank, world_size=world_size)
+    
+    agent_models = {}
+    
+    while True:
+        shard = [None]
+        dist.scatter_object_list(shard, None, src=0)
+        if shard[0] is None:
+            break
+        
+        model_idxs, agent_arg = shard[0]
+        agent_arg = [torch.device('cpu') if isinstance(arg, torch.device) else arg for arg in agent_arg]
+        for k in model_idxs:
+            agent_model = agent_models.setdefault(k, LogRegModel(embed_dim, num_classes))
+            flat_params = parameters_to_vector(agent_model.parameters()).detach()
+            dist.broadcast(flat_params, src=0)
+            vector_to_parameters(flat_params, agent_model.parameters())
+            agent_arg[k] = agent_model
+        
+        dist.gather_object(select_agent(*agent_arg), None, dst=0)
+    
+    dist.destroy_process_group()
+
+def gloo_select(agent_args):
+    
+    start = time.time()
+    
+    # ranks keep their own LogRegModel copies, so models are left out of the pickled shards and broadcast as flat weights
+    model_idxs = [k for k, arg in enumerate(agent_args[0]) if isinstance(arg, nn.Module)]
+    shards = [(model_idxs, tuple(None if k in model_idxs else arg for k, arg in enumerate(agent_arg))) for agent_arg in agent_args]
+    dist.scatter_object_list([None], shards, src=0)
+    for k in model_idxs:
+        dist.broadcast(parameters_to_vector(agent_args[0][k].parameters()).detach().cpu(), src=0)
+    
+    sent = time.time()
+    
+    # the coordinator is rank 0 and selects for agent 0 while the other ranks select for theirs
+    agent_selection = select_agent(*agent_args[0])
+    
+    selected = time.time()
+    
+    agent_selections = [None for agent_arg in agent_args]
+    dist.gather_object(agent_selection, agent_selections, dst=0)
+    
+    gathered = time.time()
+    
+    return agent_selections, torch.tensor([sent - start, selected - sent, gathered - selected])
+
+async def async_agent(agent, agent_selection, latency):
+    agent_selection = await agent_selection
+    selected = time.time()
+    await asyncio.sleep(latency)
+    return agent, agent_selection, selected
+
+async def async_select(agent_args,
+                       executor,
+                       arrival_rates,
+                       latencies,
+                       sim_stats):
+    
+    loop = asyncio.get_running_loop()
+    start = time.time()
+    
+    # items reach each agent as a Poisson stream at the agent's own rate, drawn from the agent's seed
+    agent_futures = []
+    first_arrivals = []
+    last_arrivals = []
+    for agent, agent_arg in enumerate(agent_args):
+        gaps = torch.empty(len(agent_arg[0]), dtype=torch.double).exponential_(arrival_rates[agent], generator=torch.Generator().manual_seed(agent_arg[2]))
+        arrival_times = start + torch.cumsum(gaps, 0).numpy()
+        first_arrivals += [arrival_times[0]]
+        last_arrivals += [arrival_times[-1]]
+        agent_selection = loop.run_in_executor(executor, select_agent, *agent_arg, arrival_times)
+        agent_futures += [asyncio.ensure_future(async_agent(agent, agent_selection, latencies[agent]))]
+    
+    # the coordinator takes selections as they land, after each agent's network latency, and merges them in agent order;
+    # only the first track waits on arrivals, so the lag is how long an agent's tracks run past its stream's last item,
+    # and the throughput counts the agent's stream items over the time from its first arrival until its selection lands
+    agent_selections = [None for agent_arg in agent_args]
+    for agent_future in asyncio.as_completed(agent_futures):
+        agent, agent_selection, selected = await agent_future
+        landed = time.time()
+        sim_stats[agent] = torch.tensor([landed - start, selected - last_arrivals[agent], len(agent_args[agent][0])/(landed - first_arrivals[agent])])
+        agent_selections[agent] = agent_selection
+    
+    return agent_selections
+
 def experiment(num_init_pts,
                imbals,
                unif_taus,
@@ -678,7 +1729,31 @@ def experiment(num_init_pts,
                device,
                budget,
                epsilon,
-               sieve_taus_path):
+               sieve_taus_path,
+               score_batch_size,
+               objective,
+               oracle_calls_path,
+               patience,
+               num_procs,
+               backend,
+               master_port,
+               comm_times_path,
+               encoding,
+               comm_bytes_path,
+               arrival_rates,
+               latencies,
+               sim_stats_path,
+               sync_objective,
+               sync_period,
+               sync_stats_path,
+               vectorized,
+               fedavg,
+               train_times_path,
+               trainer,
+               stop_frac,
+               stop_patience,
+               time_budget,
+               train_stats_path):
     
     if not file_exists(rare_acc_path):
         
@@ -689,6 +1764,13 @@ def experiment(num_init_pts,
         sum_sizes=torch.zeros(len(trials),num_sel_rounds+1,1)
         
         sieve_taus=torch.zeros(len(trials),num_sel_rounds,2*num_agents)
+        oracle_calls=torch.zeros(len(trials),num_sel_rounds,5,3)
+        comm_bytes=torch.zeros(len(trials),num_sel_rounds,num_agents)
+        sim_stats=torch.zeros(len(trials),num_sel_rounds,num_agents,3)
+        sync_stats=torch.zeros(len(trials),num_sel_rounds,2,3)
+        train_times=torch.zeros(len(trials),num_sel_rounds,6)
+        comm_times=torch.zeros(len(trials),num_sel_rounds,3)
+        train_stats=torch.zeros(len(trials),num_sel_rounds,6,2)
 
         classes = random.sample(list(np.arange(1000)), num_classes)
         
@@ -709,20 +1791,21 @@ def experiment(num_init_pts,
                                                    folder_to_class_file,
                                                    device)
         
-        test_embeds_loader, rare_val_embeds_loader, common_val_embeds_loader, val_embeds_loader = get_test_embed_loader(embed_dim,
-                                                                                                                        embed_batch_size,
-                                                                                                                        batch_size,
-                                                                                                                        num_classes,
-                                                                                                                        num_workers,
-                                                                                                                        weights_path,
-                                                                                                                        test_dir,
-                                                                                                                        test_embeds_path,
-                                                                                                                        test_embeds_labels_path,
-                                                                                                                        test_label_file,
-                                                                                                                        class_dict,
-                                                                                                                        num_test_pts,
-                                                                                                                        idx_conv_dict,
-                                                                                                                        device)
+        test_embeds_loader, rare_val_embeds_loader, common_val_embeds_loader, stop_embeds_loader = get_test_embed_loader(embed_dim,
+                                                                                                                         embed_batch_size,
+                                                                                                                         batch_size,
+                                                                                                                         num_classes,
+                                                                                                                         num_workers,
+                                                                                                                         weights_path,
+                                                                                                                         test_dir,
+                                                                                                                         test_embeds_path,
+                                                                                                                         test_embeds_labels_path,
+                                                                                                                         test_label_file,
+                                                                                                                         class_dict,
+                                                                                                                         num_test_pts,
+                                                                                                                         idx_conv_dict,
+                                                                                                                         device,
+                                                                                                                         stop_frac)
 
         init_x = torch.empty(0)
         init_y = torch.empty(0)
@@ -737,10 +1820,9 @@ def experiment(num_init_pts,
                                                                     num_init_pts,
                                                                     num_classes)
 
-            agent_init_loader = DataLoader(agent_init_dataset,
-                                           batch_size=num_init_pts,
-                                           num_workers=num_workers,
-                                           shuffle=True)
+            agent_init_loader = TensorLoader(agent_init_dataset,
+                                             batch_size=num_init_pts,
+                                             shuffle=True)
 
             agent_init_samples = enumerate(agent_init_loader)
             _, (agent_init_x, agent_init_y) = next(agent_init_samples)
@@ -751,16 +1833,17 @@ def experiment(num_init_pts,
             stream_datasets_dict[agent] = agent_stream_dataset
 
         sizes[:,0] = (torch.stack((torch.tensor([(init_y==i).sum() for i in range(num_classes)]),
+                                   torch.tensor([(init_y==i).sum() for i in range(num_classes)]),
+                                   torch.tensor([(init_y==i).sum() for i in range(num_classes)]),
                                    torch.tensor([(init_y==i).sum() for i in range(num_classes)]),
                                    torch.tensor([(init_y==i).sum() for i in range(num_classes)]),
                                    torch.tensor([(init_y==i).sum() for i in range(num_classes)]))))
 
         sum_sizes[:,0] = len(init_x)
 
-        init_loader = DataLoader(TensorDataset(init_x, init_y),
-                                 batch_size=batch_size,
-                                 num_workers=num_workers,
-                                 shuffle=True)
+        init_loader = TensorLoader(TensorDataset(init_x, init_y),
+                                   batch_size=batch_size,
+                                   shuffle=True)
 
         model = LogRegModel(embed_dim, num_classes) 
         
@@ -773,7 +1856,12 @@ def experiment(num_init_pts,
                           num_epochs,
                           init_loader,
                           class_dict,
-                          model)
+                          model,
+                          trainer,
+                          stop_embeds_loader,
+                          stop_patience,
+                          time_budget,
+                          None)
             
             torch.save(model.state_dict(), model_path)
 
@@ -783,10 +1871,16 @@ def experiment(num_init_pts,
         common_DIST_DMGT_DYN_isoreg = train_isoreg(model, common_val_embeds_loader) if is_isoreg else None
         rare_SIEVE_isoreg = train_isoreg(model, rare_val_embeds_loader) if is_isoreg else None
         common_SIEVE_isoreg = train_isoreg(model, common_val_embeds_loader) if is_isoreg else None
+        rare_SIEVE_PLUS_isoreg = train_isoreg(model, rare_val_embeds_loader) if is_isoreg else None
+        common_SIEVE_PLUS_isoreg = train_isoreg(model, common_val_embeds_loader) if is_isoreg else None
+        rare_THREE_SIEVES_isoreg = train_isoreg(model, rare_val_embeds_loader) if is_isoreg else None
+        common_THREE_SIEVES_isoreg = train_isoreg(model, common_val_embeds_loader) if is_isoreg else None
         
         rare_acc[:,0] = (
 
                 torch.cat((calc_acc(model, test_embeds_loader, num_classes)[0], 
+                           calc_acc(model, test_embeds_loader, num_classes)[0],
+                           calc_acc(model, test_embeds_loader, num_classes)[0],
                            calc_acc(model, test_embeds_loader, num_classes)[0],
                            calc_acc(model, test_embeds_loader, num_classes)[0],
                            calc_acc(model, test_embeds_loader, num_classes)[0])))
@@ -794,84 +1888,207 @@ def experiment(num_init_pts,
         all_acc[:,0] = (
                 
                 torch.cat((calc_acc(model, test_embeds_loader, num_classes)[1],
+                           calc_acc(model, test_embeds_loader, num_classes)[1],
+                           calc_acc(model, test_embeds_loader, num_classes)[1],
                            calc_acc(model, test_embeds_loader, num_classes)[1],
                            calc_acc(model, test_embeds_loader, num_classes)[1],
                            calc_acc(model, test_embeds_loader, num_classes)[1])))
         
+        DIST_DMGT_UNIF_buffer = SelectedBuffer(budget*num_agents)
+        DIST_DMGT_DYN_buffer = SelectedBuffer(budget*num_agents)
+        RAND_buffer = SelectedBuffer(budget*num_agents)
+        SIEVE_buffer = SelectedBuffer(budget*num_agents)
+        SIEVE_PLUS_buffer = SelectedBuffer(budget*num_agents)
+        THREE_SIEVES_buffer = SelectedBuffer(budget*num_agents)
+        
+        # embeddings, stream batches and model weights sent to the pool are moved to shared memory by torch.multiprocessing
+        pool = mp.get_context('spawn').Pool(num_procs, initializer=torch.set_num_threads, initargs=(1,)) if num_procs > 1 and backend == 'local' else None
+        
+        # the async simulator gives every agent its own worker and streams items to it in real time
+        executor = ProcessPoolExecutor(num_agents, mp_context=mp.get_context('spawn'), initializer=torch.set_num_threads, initargs=(1,)) if backend == 'async' else None
+        if executor is not None:
+            # workers are started up front so their start-up does not count towards the first round's latencies
+            list(executor.map(torch.set_num_threads, num_agents*[1]))
+        
+        # with the gloo backend every agent is a rank on this machine and rank 0 is the coordinator
+        if backend == 'gloo':
+            ranks = [mp.get_context('spawn').Process(target=agent_rank, args=(rank, num_agents, master_port, embed_dim, num_classes)) for rank in range(1, num_agents)]
+            for rank in ranks:
+                rank.start()
+            dist.init_process_group('gloo', init_method='tcp://127.0.0.1:%d' % master_port, rank=0, world_size=num_agents)
+        
         for trial in trials:
             
             DIST_DMGT_UNIF_model = load_model(model, embed_dim, num_classes, device)
             DIST_DMGT_DYN_model = load_model(model, embed_dim, num_classes, device)
             RAND_model = load_model(model, embed_dim, num_classes, device)
             SIEVE_model = load_model(model, embed_dim, num_classes, device)
+            SIEVE_PLUS_model = load_model(model, embed_dim, num_classes, device)
+            THREE_SIEVES_model = load_model(model, embed_dim, num_classes, device)
 
-            stream_loaders_dict = {agent: DataLoader(stream_datasets_dict[agent],
-                                                     batch_size=stream_size,
-                                                     num_workers=num_workers,
-                                                     shuffle=True) for agent in range(num_agents)}
+            stream_loaders_dict = {agent: TensorLoader(stream_datasets_dict[agent],
+                                                       batch_size=stream_size,
+                                                       shuffle=True) for agent in range(num_agents)}
             
             stream_samples_dict = {agent: enumerate(stream_loaders_dict[agent]) for agent in range(num_agents)}
             
             for sel_round in range(num_sel_rounds):
 
-                DIST_DMGT_UNIF_x = torch.empty(0)
-                DIST_DMGT_UNIF_y = torch.empty(0)
-                DIST_DMGT_DYN_x = torch.empty(0)
-                DIST_DMGT_DYN_y = torch.empty(0)
-                RAND_x = torch.empty(0)
-                RAND_y = torch.empty(0)
-                SIEVE_x = torch.empty(0)
-                SIEVE_y = torch.empty(0)
+                DIST_DMGT_UNIF_buffer.clear()
+                DIST_DMGT_DYN_buffer.clear()
+                RAND_buffer.clear()
+                SIEVE_buffer.clear()
+                SIEVE_PLUS_buffer.clear()
+                THREE_SIEVES_buffer.clear()
                 sieve_min_max_taus = torch.empty(0)
 
+                agent_seeds = torch.randint(2**31-1, (num_agents,))
+                
+                agent_args = []
                 for agent in range(num_agents):
 
                     _, (agent_stream_x, agent_stream_y) = next(stream_samples_dict[agent])
-
-                    agent_DIST_DMGT_UNIF_x, agent_DIST_DMGT_UNIF_y, agent_RAND_x, agent_RAND_y = get_DIST_DMGT_subsets(agent_stream_x,
-                                                                                                                       agent_stream_y,
-                                                                                                                       unif_taus,
-                                                                                                                       sel_round,
-                                                                                                                       DIST_DMGT_UNIF_model,
-                                                                                                                       num_classes,
-                                                                                                                       is_isoreg,
-                                                                                                                       rare_DIST_DMGT_UNIF_isoreg,
-                                                                                                                       common_DIST_DMGT_UNIF_isoreg,
-                                                                                                                       device,
-                                                                                                                       budget)
                     
-                    agent_DIST_DMGT_DYN_x, agent_DIST_DMGT_DYN_y, _, _ = get_DIST_DMGT_subsets(agent_stream_x,
-                                                                                               agent_stream_y,
-                                                                                               dyn_taus,
-                                                                                               sel_round,
-                                                                                               DIST_DMGT_DYN_model,
-                                                                                               num_classes,
-                                                                                               is_isoreg,
-                                                                                               rare_DIST_DMGT_DYN_isoreg,
-                                                                                               common_DIST_DMGT_DYN_isoreg,
-                                                                                               device,
-                                                                                               budget)
-                    
-                    agent_SIEVE_x, agent_SIEVE_y, agent_sieve_min_max_taus = get_SIEVE_subsets(agent_stream_x,
-                                                                                               agent_stream_y,
-                                                                                               SIEVE_model,
-                                                                                               num_classes,
-                                                                                               is_isoreg,
-                                                                                               rare_SIEVE_isoreg,
-                                                                                               common_SIEVE_isoreg,
-                                                                                               device,
-                                                                                               budget,
-                                                                                               epsilon)
+                    agent_args += [(agent_stream_x,
+                                    agent_stream_y,
+                                    int(agent_seeds[agent]),
+                                    unif_taus,
+                                    dyn_taus,
+                                    sel_round,
+                                    DIST_DMGT_UNIF_model,
+                                    DIST_DMGT_DYN_model,
+                                    SIEVE_model,
+                                    SIEVE_PLUS_model,
+                                    THREE_SIEVES_model,
+                                    num_classes,
+                                    is_isoreg,
+                                    rare_DIST_DMGT_UNIF_isoreg,
+                                    common_DIST_DMGT_UNIF_isoreg,
+                                    rare_DIST_DMGT_DYN_isoreg,
+                                    common_DIST_DMGT_DYN_isoreg,
+                                    rare_SIEVE_isoreg,
+                                    common_SIEVE_isoreg,
+                                    rare_SIEVE_PLUS_isoreg,
+                                    common_SIEVE_PLUS_isoreg,
+                                    rare_THREE_SIEVES_isoreg,
+                                    common_THREE_SIEVES_isoreg,
+                                    device,
+                                    budget,
+                                    epsilon,
+                                    patience,
+                                    score_batch_size,
+                                    objective,
+                                    encoding,
+                                    sync_period,
+                                    vectorized)]
+                
+                # agents run concurrently when there is a pool, a process group or the async simulator, and every backend returns their selections in agent order
+                if backend == 'gloo':
+                    agent_selections, comm_times[trial,sel_round] = gloo_select(agent_args)
+                elif backend == 'async':
+                    agent_selections = asyncio.run(async_select(agent_args, executor, arrival_rates, latencies, sim_stats[trial,sel_round]))
+                else:
+                    agent_selections = pool.starmap(select_agent, agent_args) if pool is not None else [select_agent(*agent_arg) for agent_arg in agent_args]
+                
+                for agent, agent_selection in enumerate(agent_selections):
+                    agent_DIST_DMGT_UNIF_payload, agent_RAND_payload, agent_DIST_DMGT_DYN_payload, agent_SIEVE_payload, agent_sieve_min_max_taus, agent_SIEVE_PLUS_payload, agent_THREE_SIEVES_payload, agent_oracle_calls = agent_selection
+                    agent_stream_x, agent_stream_y = agent_args[agent][:2]
+                    # the sieve thresholds and oracle-call stats are bookkeeping, so only the encoded selections are counted
+                    comm_bytes[trial,sel_round,agent] = payload_bytes((agent_DIST_DMGT_UNIF_payload, agent_RAND_payload, agent_DIST_DMGT_DYN_payload, agent_SIEVE_payload, agent_SIEVE_PLUS_payload, agent_THREE_SIEVES_payload))
                     
-                    DIST_DMGT_UNIF_x = torch.cat((DIST_DMGT_UNIF_x, agent_DIST_DMGT_UNIF_x))
-                    DIST_DMGT_UNIF_y = torch.cat((DIST_DMGT_UNIF_y, agent_DIST_DMGT_UNIF_y))
-                    DIST_DMGT_DYN_x = torch.cat((DIST_DMGT_DYN_x, agent_DIST_DMGT_DYN_x))
-                    DIST_DMGT_DYN_y = torch.cat((DIST_DMGT_DYN_y, agent_DIST_DMGT_DYN_y))
-                    RAND_x = torch.cat((RAND_x, agent_RAND_x))
-                    RAND_y = torch.cat((RAND_y, agent_RAND_y))
-                    SIEVE_x = torch.cat((SIEVE_x, agent_SIEVE_x))
-                    SIEVE_y = torch.cat((SIEVE_y, agent_SIEVE_y))
+                    DIST_DMGT_UNIF_buffer.extend(*decode_payload(agent_DIST_DMGT_UNIF_payload, agent_stream_x, agent_stream_y, encoding))
+                    DIST_DMGT_DYN_buffer.extend(*decode_payload(agent_DIST_DMGT_DYN_payload, agent_stream_x, agent_stream_y, encoding))
+                    RAND_buffer.extend(*decode_payload(agent_RAND_payload, agent_stream_x, agent_stream_y, encoding))
+                    SIEVE_buffer.extend(*decode_payload(agent_SIEVE_payload, agent_stream_x, agent_stream_y, encoding))
+                    SIEVE_PLUS_buffer.extend(*decode_payload(agent_SIEVE_PLUS_payload, agent_stream_x, agent_stream_y, encoding))
+                    THREE_SIEVES_buffer.extend(*decode_payload(agent_THREE_SIEVES_payload, agent_stream_x, agent_stream_y, encoding))
                     sieve_min_max_taus = torch.cat((sieve_min_max_taus, agent_sieve_min_max_taus))
+                    oracle_calls[trial,sel_round] += agent_oracle_calls
+                
+                # with a sync period the DMGT agents run here in lockstep and share their class counts every sync_period items
+                if sync_period > 0:
+                    agent_streams_x = [agent_arg[0] for agent_arg in agent_args]
+                    agent_streams_y = [agent_arg[1] for agent_arg in agent_args]
+                    
+                    for agent_x, agent_y in get_SYNC_DMGT_subsets(agent_streams_x,
+                                                                  agent_streams_y,
+                                                                  unif_taus,
+                                                                  sel_round,
+                                                                  DIST_DMGT_UNIF_model,
+                                                                  num_classes,
+                                                                  is_isoreg,
+                                                                  rare_DIST_DMGT_UNIF_isoreg,
+                                                                  common_DIST_DMGT_UNIF_isoreg,
+                                                                  device,
+                                                                  budget,
+                                                                  score_batch_size,
+                                                                  sync_objective,
+                                                                  sync_period,
+                                                                  oracle_calls[trial,sel_round,0],
+                                                                  sync_stats[trial,sel_round,0]):
+                        DIST_DMGT_UNIF_buffer.extend(agent_x, agent_y)
+                    
+                    for agent_x, agent_y in get_SYNC_DMGT_subsets(agent_streams_x,
+                                                                  agent_streams_y,
+                                                                  dyn_taus,
+                                                                  sel_round,
+                                                                  DIST_DMGT_DYN_model,
+                                                                  num_classes,
+                                                                  is_isoreg,
+                                                                  rare_DIST_DMGT_DYN_isoreg,
+                                                                  common_DIST_DMGT_DYN_isoreg,
+                                                                  device,
+                                                                  budget,
+                                                                  score_batch_size,
+                                                                  sync_objective,
+                                                                  sync_period,
+                                                                  oracle_calls[trial,sel_round,1],
+                                                                  sync_stats[trial,sel_round,1]):
+                        DIST_DMGT_DYN_buffer.extend(agent_x, agent_y)
+                
+                # vectorized agents share one count state and one forward pass per chunk of stream positions
+                elif vectorized:
+                    streams_x = torch.stack([agent_arg[0] for agent_arg in agent_args])
+                    streams_y = torch.stack([agent_arg[1] for agent_arg in agent_args])
+                    
+                    for agent_x, agent_y in get_VEC_DMGT_subsets(streams_x,
+                                                                 streams_y,
+                                                                 unif_taus,
+                                                                 sel_round,
+                                                                 DIST_DMGT_UNIF_model,
+                                                                 num_classes,
+                                                                 is_isoreg,
+                                                                 rare_DIST_DMGT_UNIF_isoreg,
+                                                                 common_DIST_DMGT_UNIF_isoreg,
+                                                                 device,
+                                                                 budget,
+                                                                 score_batch_size,
+                                                                 objective,
+                                                                 oracle_calls[trial,sel_round,0]):
+                        DIST_DMGT_UNIF_buffer.extend(agent_x, agent_y)
+                    
+                    for agent_x, agent_y in get_VEC_DMGT_subsets(streams_x,
+                                                                 streams_y,
+                                                                 dyn_taus,
+                                                                 sel_round,
+                                                                 DIST_DMGT_DYN_model,
+                                                                 num_classes,
+                                                                 is_isoreg,
+                                                                 rare_DIST_DMGT_DYN_isoreg,
+                                                                 common_DIST_DMGT_DYN_isoreg,
+                                                                 device,
+                                                                 budget,
+                                                                 score_batch_size,
+                                                                 objective,
+                                                                 oracle_calls[trial,sel_round,1]):
+                        DIST_DMGT_DYN_buffer.extend(agent_x, agent_y)
+                
+                DIST_DMGT_UNIF_x, DIST_DMGT_UNIF_y = DIST_DMGT_UNIF_buffer.view()
+                DIST_DMGT_DYN_x, DIST_DMGT_DYN_y = DIST_DMGT_DYN_buffer.view()
+                RAND_x, RAND_y = RAND_buffer.view()
+                SIEVE_x, SIEVE_y = SIEVE_buffer.view()
+                SIEVE_PLUS_x, SIEVE_PLUS_y = SIEVE_PLUS_buffer.view()
+                THREE_SIEVES_x, THREE_SIEVES_y = THREE_SIEVES_buffer.view()
                 
                 sieve_taus[trial,sel_round] = sieve_min_max_taus
 
@@ -881,69 +2098,171 @@ def experiment(num_init_pts,
                         torch.stack((torch.tensor([(DIST_DMGT_UNIF_y==i).sum() for i in range(num_classes)]),
                                      torch.tensor([(DIST_DMGT_DYN_y==i).sum() for i in range(num_classes)]),
                                      torch.tensor([(RAND_y==i).sum() for i in range(num_classes)]),
-                                     torch.tensor([(SIEVE_y==i).sum() for i in range(num_classes)]))))
+                                     torch.tensor([(SIEVE_y==i).sum() for i in range(num_classes)]),
+                                     torch.tensor([(SIEVE_PLUS_y==i).sum() for i in range(num_classes)]),
+                                     torch.tensor([(THREE_SIEVES_y==i).sum() for i in range(num_classes)]))))
 
                 sum_sizes[trial,sel_round+1] = (
 
                         torch.tensor([sum_sizes[trial,sel_round] + len(DIST_DMGT_UNIF_y)]))
                     
-                DIST_DMGT_UNIF_model = train(device,
-                                             num_epochs,
-                                             DataLoader(TensorDataset(DIST_DMGT_UNIF_x, DIST_DMGT_UNIF_y),
-                                                        batch_size=batch_size,
-                                                        num_workers=num_workers,
-                                                        shuffle=True),
-                                             class_dict,
-                                             DIST_DMGT_UNIF_model)
-
-                DIST_DMGT_DYN_model = train(device,
-                                            num_epochs,
-                                            DataLoader(TensorDataset(DIST_DMGT_DYN_x, DIST_DMGT_DYN_y),
-                                                       batch_size=batch_size,
-                                                       num_workers=num_workers,
-                                                       shuffle=True),
-                                            class_dict,
-                                            DIST_DMGT_DYN_model)
-                
-                RAND_model = train(device,
-                                   num_epochs,
-                                   DataLoader(TensorDataset(RAND_x, RAND_y),
-                                              batch_size=batch_size,
-                                              num_workers=num_workers,
-                                              shuffle=True),
-                                   class_dict,
-                                   RAND_model)
-                
-                SIEVE_model = train(device,
-                                    num_epochs,
-                                    DataLoader(TensorDataset(SIEVE_x, SIEVE_y),
-                                               batch_size=batch_size,
-                                               num_workers=num_workers,
-                                               shuffle=True),
-                                    class_dict,
-                                    SIEVE_model)
+                # all tracks' heads are trained together as one stacked model; fedavg keeps training per agent
+                if trainer == 'stacked' and fedavg == 'none':
+                    start = time.time()
+                    DIST_DMGT_UNIF_model, DIST_DMGT_DYN_model, RAND_model, SIEVE_model, SIEVE_PLUS_model, THREE_SIEVES_model = train_stacked(device,
+                                                                                                                                             num_epochs,
+                                                                                                                                             [DIST_DMGT_UNIF_buffer.view(),
+                                                                                                                                              DIST_DMGT_DYN_buffer.view(),
+                                                                                                                                              RAND_buffer.view(),
+                                                                                                                                              SIEVE_buffer.view(),
+                                                                                                                                              SIEVE_PLUS_buffer.view(),
+                                                                                                                                              THREE_SIEVES_buffer.view()],
+                                                                                                                                             batch_size,
+                                                                                                                                             [DIST_DMGT_UNIF_model, DIST_DMGT_DYN_model, RAND_model, SIEVE_model, SIEVE_PLUS_model, THREE_SIEVES_model],
+                                                                                                                                             stop_embeds_loader,
+                                                                                                                                             stop_patience,
+                                                                                                                                             time_budget,
+                                                                                                                                             train_stats[trial,sel_round])
+                    # the tracks share one training job, so each is charged its full time
+                    train_times[trial,sel_round] = time.time() - start
+                else:
+                    DIST_DMGT_UNIF_model, train_times[trial,sel_round,0] = update_model(device,
+                                                                                        num_epochs,
+                                                                                        DIST_DMGT_UNIF_buffer,
+                                                                                        batch_size,
+                                                                                        num_workers,
+                                                                                        class_dict,
+                                                                                        DIST_DMGT_UNIF_model,
+                                                                                        embed_dim,
+                                                                                        num_classes,
+                                                                                        fedavg,
+                                                                                        trainer,
+                                                                                        stop_embeds_loader,
+                                                                                        stop_patience,
+                                                                                        time_budget,
+                                                                                        train_stats[trial,sel_round,0])
+
+                    DIST_DMGT_DYN_model, train_times[trial,sel_round,1] = update_model(device,
+                                                                                       num_epochs,
+                                                                                       DIST_DMGT_DYN_buffer,
+                                                                                       batch_size,
+                                                                                       num_workers,
+                                                                                       class_dict,
+                                                                                       DIST_DMGT_DYN_model,
+                                                                                       embed_dim,
+                                                                                       num_classes,
+                                                                                       fedavg,
+                                                                                       trainer,
+                                                                                       stop_embeds_loader,
+                                                                                       stop_patience,
+                                                                                       time_budget,
+                                                                                       train_stats[trial,sel_round,1])
+                    
+                    RAND_model, train_times[trial,sel_round,2] = update_model(device,
+                                                                              num_epochs,
+                                                                              RAND_buffer,
+                                                                              batch_size,
+                                                                              num_workers,
+                                                                              class_dict,
+                                                                              RAND_model,
+                                                                              embed_dim,
+                                                                              num_classes,
+                                                                              fedavg,
+                                                                              trainer,
+                                                                              stop_embeds_loader,
+                                                                              stop_patience,
+                                                                              time_budget,
+                                                                              train_stats[trial,sel_round,2])
+                    
+                    SIEVE_model, train_times[trial,sel_round,3] = update_model(device,
+                                                                               num_epochs,
+                                                                               SIEVE_buffer,
+                                                                               batch_size,
+                                                                               num_workers,
+                                                                               class_dict,
+                                                                               SIEVE_model,
+                                                                               embed_dim,
+                                                                               num_classes,
+                                                                               fedavg,
+                                                                               trainer,
+                                                                               stop_embeds_loader,
+                                                                               stop_patience,
+                                                                               time_budget,
+                                                                               train_stats[trial,sel_round,3])
+
+                    SIEVE_PLUS_model, train_times[trial,sel_round,4] = update_model(device,
+                                                                                    num_epochs,
+                                                                                    SIEVE_PLUS_buffer,
+                                                                                    batch_size,
+                                                                                    num_workers,
+                                                                                    class_dict,
+                                                                                    SIEVE_PLUS_model,
+                                                                                    embed_dim,
+                                                                                    num_classes,
+                                                                                    fedavg,
+                                                                                    trainer,
+                                                                                    stop_embeds_loader,
+                                                                                    stop_patience,
+                                                                                    time_budget,
+                                                                                    train_stats[trial,sel_round,4])
+                    
+                    THREE_SIEVES_model, train_times[trial,sel_round,5] = update_model(device,
+                                                                                      num_epochs,
+                                                                                      THREE_SIEVES_buffer,
+                                                                                      batch_size,
+                                                                                      num_workers,
+                                                                                      class_dict,
+                                                                                      THREE_SIEVES_model,
+                                                                                      embed_dim,
+                                                                                      num_classes,
+                                                                                      fedavg,
+                                                                                      trainer,
+                                                                                      stop_embeds_loader,
+                                                                                      stop_patience,
+                                                                                      time_budget,
+                                                                                      train_stats[trial,sel_round,5])
                 
                 rare_DIST_DMGT_UNIF_isoreg = train_isoreg(DIST_DMGT_UNIF_model, rare_val_embeds_loader) if is_isoreg else None
                 common_DIST_DMGT_UNIF_isoreg = train_isoreg(DIST_DMGT_UNIF_model, common_val_embeds_loader) if is_isoreg else None
                 rare_DIST_DMGT_DYN_isoreg = train_isoreg(DIST_DMGT_DYN_model, rare_val_embeds_loader) if is_isoreg else None
                 common_DIST_DMGT_DYN_isoreg = train_isoreg(DIST_DMGT_DYN_model, common_val_embeds_loader) if is_isoreg else None
                 rare_SIEVE_isoreg = train_isoreg(SIEVE_model, rare_val_embeds_loader) if is_isoreg else None
-                rare_SIEVE_isoreg = train_isoreg(SIEVE_model, rare_val_embeds_loader) if is_isoreg else None
+                common_SIEVE_isoreg = train_isoreg(SIEVE_model, common_val_embeds_loader) if is_isoreg else None
+                rare_SIEVE_PLUS_isoreg = train_isoreg(SIEVE_PLUS_model, rare_val_embeds_loader) if is_isoreg else None
+                common_SIEVE_PLUS_isoreg = train_isoreg(SIEVE_PLUS_model, common_val_embeds_loader) if is_isoreg else None
+                rare_THREE_SIEVES_isoreg = train_isoreg(THREE_SIEVES_model, rare_val_embeds_loader) if is_isoreg else None
+                common_THREE_SIEVES_isoreg = train_isoreg(THREE_SIEVES_model, common_val_embeds_loader) if is_isoreg else None
                 
                 rare_acc[trial,sel_round+1] = (
 
                         torch.cat((calc_acc(DIST_DMGT_UNIF_model, test_embeds_loader, num_classes)[0], 
                                    calc_acc(DIST_DMGT_DYN_model, test_embeds_loader, num_classes)[0],
                                    calc_acc(RAND_model, test_embeds_loader, num_classes)[0],
-                                   calc_acc(SIEVE_model, test_embeds_loader, num_classes)[0])))
+                                   calc_acc(SIEVE_model, test_embeds_loader, num_classes)[0],
+                                   calc_acc(SIEVE_PLUS_model, test_embeds_loader, num_classes)[0],
+                                   calc_acc(THREE_SIEVES_model, test_embeds_loader, num_classes)[0])))
                 
                 all_acc[trial,sel_round+1] = (
                         
                         torch.cat((calc_acc(DIST_DMGT_UNIF_model, test_embeds_loader, num_classes)[1],
                                    calc_acc(DIST_DMGT_DYN_model, test_embeds_loader, num_classes)[1],
                                    calc_acc(RAND_model, test_embeds_loader, num_classes)[1],
-                                   calc_acc(SIEVE_model, test_embeds_loader, num_classes)[1])))
+                                   calc_acc(SIEVE_model, test_embeds_loader, num_classes)[1],
+                                   calc_acc(SIEVE_PLUS_model, test_embeds_loader, num_classes)[1],
+                                   calc_acc(THREE_SIEVES_model, test_embeds_loader, num_classes)[1])))
             
+        if pool is not None:
+            pool.close()
+        
+        if executor is not None:
+            executor.shutdown()
+        
+        if backend == 'gloo':
+            dist.scatter_object_list([None], [None for rank in range(num_agents)], src=0)
+            dist.destroy_process_group()
+            for rank in ranks:
+                rank.join()
+
         torch.save(rare_acc, rare_acc_path)
         torch.save(all_acc, all_acc_path)
 
@@ -951,6 +2270,13 @@ def experiment(num_init_pts,
         torch.save(sum_sizes, sum_sizes_path)
 
         torch.save(sieve_taus, sieve_taus_path)
+        torch.save(oracle_calls, oracle_calls_path)
+        torch.save(comm_bytes, comm_bytes_path)
+        torch.save(sim_stats, sim_stats_path)
+        torch.save(sync_stats, sync_stats_path)
+        torch.save(train_times, train_times_path)
+        torch.save(comm_times, comm_times_path)
+        torch.save(train_stats, train_stats_path)
         
     rare_acc = torch.load(rare_acc_path)
     all_acc = torch.load(all_acc_path)
@@ -973,18 +2299,26 @@ def dataframe(data,
                                'DIST_DMGT_DYN_all_acc',
                                'RAND_all_acc',
                                'SIEVE_all_acc',
+                               'SIEVE_PLUS_all_acc',
+                               'THREE_SIEVES_all_acc',
                                'DIST_DMGT_UNIF_rare_acc',
                                'DIST_DMGT_DYN_rare_acc',
                                'RAND_rare_acc',
                                'SIEVE_rare_acc',
+                               'SIEVE_PLUS_rare_acc',
+                               'THREE_SIEVES_rare_acc',
                                'DIST_DMGT_UNIF_rare_amnt',
                                'DIST_DMGT_DYN_rare_amnt',
                                'RAND_rare_amnt',
                                'SIEVE_rare_amnt',
+                               'SIEVE_PLUS_rare_amnt',
+                               'THREE_SIEVES_rare_amnt',
                                'DIST_DMGT_UNIF_common_amnt',
                                'DIST_DMGT_DYN_common_amnt',
                                'RAND_common_amnt',
                                'SIEVE_common_amnt',
+                               'SIEVE_PLUS_common_amnt',
+                               'THREE_SIEVES_common_amnt',
                                'sum_sizes',
                                'sum_sizes_perc'])
     
@@ -995,26 +2329,34 @@ def dataframe(data,
                                      'DIST_DMGT_DYN_all_acc':all_acc[trial,:,1].squeeze(),
                                      'RAND_all_acc':all_acc[trial,:,2].squeeze(),
                                      'SIEVE_all_acc':all_acc[trial,:,3].squeeze(),
+                                     'SIEVE_PLUS_all_acc':all_acc[trial,:,4].squeeze(),
+                                     'THREE_SIEVES_all_acc':all_acc[trial,:,5].squeeze(),
                                      'DIST_DMGT_UNIF_rare_acc':rare_acc[trial,:,0].squeeze(),
                                      'DIST_DMGT_DYN_rare_acc':rare_acc[trial,:,1].squeeze(),
                                      'RAND_rare_acc':rare_acc[trial,:,2].squeeze(),
                                      'SIEVE_rare_acc':rare_acc[trial,:,3].squeeze(),
+                                     'SIEVE_PLUS_rare_acc':rare_acc[trial,:,4].squeeze(),
+                                     'THREE_SIEVES_rare_acc':rare_acc[trial,:,5].squeeze(),
                                      'DIST_DMGT_UNIF_rare_amnt':(torch.stack([x[:5].sum().int() for x in sizes[trial,:,0]])),
                                      'DIST_DMGT_DYN_rare_amnt':(torch.stack([x[:5].sum().int() for x in sizes[trial,:,1]])),
                                      'RAND_rare_amnt':(torch.stack([x[:5].sum().int() for x in sizes[trial,:,2]])),
                                      'SIEVE_rare_amnt':(torch.stack([x[:5].sum().int() for x in sizes[trial,:,3]])),
+                                     'SIEVE_PLUS_rare_amnt':(torch.stack([x[:5].sum().int() for x in sizes[trial,:,4]])),
+                                     'THREE_SIEVES_rare_amnt':(torch.stack([x[:5].sum().int() for x in sizes[trial,:,5]])),
                                      'DIST_DMGT_UNIF_common_amnt':(torch.stack([x[5:].sum().int() for x in sizes[trial,:,0]])),
                                      'DIST_DMGT_DYN_common_amnt':(torch.stack([x[5:].sum().int() for x in sizes[trial,:,1]])),
                                      'RAND_common_amnt':(torch.stack([x[5:].sum().int() for x in sizes[trial,:,2]])),
                                      'SIEVE_common_amnt':(torch.stack([x[5:].sum().int() for x in sizes[trial,:,3]])),
+                                     'SIEVE_PLUS_common_amnt':(torch.stack([x[5:].sum().int() for x in sizes[trial,:,4]])),
+                                     'THREE_SIEVES_common_amnt':(torch.stack([x[5:].sum().int() for x in sizes[trial,:,5]])),
                                      'sum_sizes':sum_sizes[trial].squeeze().int(),
                                      'sum_sizes_perc':(sum_sizes[trial].squeeze().int()/(30*(num_sel_rounds+1)))}),
                                      ignore_index=True)
     
     return df
 
-def balance_plot(date_time,sizes,num_algs,num_classes,num_sel_rounds,unif_taus,dyn_taus):
-    alg_names = ['Dist. DMGT w/ Uniform Thresholds','Dist. DMGT w/ Increasing Thresholds','RAND','SIEVE']
+def balance_plot(date_time,sizes,num_algs,num_classes,num_sel_rounds,unif_taus,dyn_taus,objective):
+    alg_names = ['Dist. DMGT w/ Uniform Thresholds','Dist. DMGT w/ Increasing Thresholds','RAND','SIEVE','SIEVE++','ThreeSieves']
     avg_sizes = sizes.mean(dim=0)
     non_cum_sizes = torch.zeros(num_algs, num_classes, num_sel_rounds)
     for i in range(num_algs):
@@ -1040,16 +2382,14 @@ def balance_plot(date_time,sizes,num_algs,num_classes,num_sel_rounds,unif_taus,d
                      label=alg_names[i] + ' common classes',
                      linestyle='--')
     
-    n = Symbol('n')
-    unif_balanced_size = int(np.ceil(solve(sympy.sqrt(n+1) - sympy.sqrt(n) - unif_taus[0], n)[0]))
+    unif_balanced_size = objective.balanced_size(unif_taus[0])
     sns.lineplot(x=np.arange(num_sel_rounds),
                  y=unif_balanced_size,
                  color='gray',
                  label=r'Balanced Uniform $\tau$', 
                  linestyle='--')
     
-    n = Symbol('n')
-    dyn_balanced_sizes = [int(np.ceil(solve(sympy.sqrt(n+1) - sympy.sqrt(n) - dyn_taus[i], n)[0])) for i in range(len(dyn_taus))]
+    dyn_balanced_sizes = [objective.balanced_size(dyn_taus[i]) for i in range(len(dyn_taus))]
     sns.lineplot(x=np.arange(num_sel_rounds),
                  y=dyn_balanced_sizes,
                  color='black',
@@ -1069,18 +2409,22 @@ def accuracy_plot(df, date_time, num_algs, num_sel_rounds):
     fig, ax = plt.subplots()
     sns.despine()
     
-    all_acc_data_files = ['DIST_DMGT_UNIF_all_acc','DIST_DMGT_DYN_all_acc','RAND_all_acc','SIEVE_all_acc'] 
-    rare_acc_data_files = ['DIST_DMGT_UNIF_rare_acc','DIST_DMGT_DYN_rare_acc','RAND_rare_acc','SIEVE_rare_acc']
+    all_acc_data_files = ['DIST_DMGT_UNIF_all_acc','DIST_DMGT_DYN_all_acc','RAND_all_acc','SIEVE_all_acc','SIEVE_PLUS_all_acc','THREE_SIEVES_all_acc'] 
+    rare_acc_data_files = ['DIST_DMGT_UNIF_rare_acc','DIST_DMGT_DYN_rare_acc','RAND_rare_acc','SIEVE_rare_acc','SIEVE_PLUS_rare_acc','THREE_SIEVES_rare_acc']
     
     all_acc_labels = ['Dist. DMGT w/ Uniform Thresholds: all classes',
                       'Dist. DMGT w/ Increasing Thresholds: all classes',
                       'RAND: all classes',
-                      'SIEVE: all classes']
+                      'SIEVE: all classes',
+                      'SIEVE++: all classes',
+                      'ThreeSieves: all classes']
     
     rare_acc_labels = ['Dist. DMGT w/ Uniform Thresholds: rare classes',
                        'Dist. DMGT w/ Increasing Thresholds: rare classes',
                        'RAND: rare classes',
-                       'SIEVE: rare classes']
+                       'SIEVE: rare classes',
+                       'SIEVE++: rare classes',
+                       'ThreeSieves: rare classes']
 
     for i in range(num_algs):
         sns.lineplot(data=df[['sel_rnd', all_acc_data_files[i]]],
@@ -1106,12 +2450,6 @@ def accuracy_plot(df, date_time, num_algs, num_sel_rounds):
                      markerfacecolor='black',
                      markersize=8)
 
-    sizes_labels = [1000]
-    amount_cols = ['DIST_DMGT_UNIF_common_amnt', 'DIST_DMGT_DYN_rare_amnt',
-                   'DIST_DMGT_DYN_common_amnt', 'DIST_DMGT_DYN_rare_amnt',
-                   'RAND_common_amnt','RAND_rare_amnt',
-                   'SIEVE_common_amnt','SIEVE_rare_amnt']
-
     ax.legend(fontsize=6)
     ax.set_xlabel('Selection Round')
     ax.set_ylabel('Accuracy')
@@ -1132,7 +2470,7 @@ parser.add_argument('--unif_taus', nargs='+', type=float, default=6*[0.1])
 parser.add_argument('--dyn_taus', nargs='+', type=float, default=[0.1,0.1,0.13,0.13,0.15,0.15])
 parser.add_argument('--trials', nargs='+', type=int, default=np.arange(5))
 parser.add_argument('--num_sel_rounds', type=int, default=6)
-parser.add_argument('--num_algs', type=int, default=4)
+parser.add_argument('--num_algs', type=int, default=6)
 parser.add_argument('--num_agents', type=int, default=3)
 parser.add_argument('--stream_size', type=int, default=500)
 parser.add_argument('--num_test_pts', type=int, default=500)
@@ -1152,6 +2490,23 @@ parser.add_argument('--test_label_file', type=str, default='class index-labels f
 parser.add_argument('--seed', type=int, default=0)
 parser.add_argument('--budget', type=int, default=250)
 parser.add_argument('--epsilon', type=float, default=0.1)
+parser.add_argument('--patience', type=int, default=50)
+parser.add_argument('--num_procs', type=int, default=1)
+parser.add_argument('--backend', type=str, default='local', choices=['local', 'gloo', 'async'])
+parser.add_argument('--master_port', type=int, default=29500)
+parser.add_argument('--arrival_rates', nargs='+', type=float, default=None)
+parser.add_argument('--latencies', nargs='+', type=float, default=None)
+parser.add_argument('--sync_period', type=int, default=0)
+parser.add_argument('--vectorized', action='store_true')
+parser.add_argument('--fedavg', type=str, default='none', choices=['none', 'mean', 'size'])
+parser.add_argument('--encoding', type=str, default='full', choices=['full', 'fp16', 'int8', 'index'])
+parser.add_argument('--trainer', type=str, default='sgd', choices=['sgd', 'lbfgs', 'stacked'])
+parser.add_argument('--stop_patience', type=int, default=0)
+parser.add_argument('--stop_frac', type=float, default=0.2)
+parser.add_argument('--time_budget', type=float, default=0.)
+parser.add_argument('--objective', type=str, default='sqrt', choices=list(objectives.keys()))
+parser.add_argument('--objective_param', type=float, default=None)
+parser.add_argument('--score_batch_size', type=int, default=500)
 
 if __name__ == "__main__":
     
@@ -1198,7 +2553,43 @@ if __name__ == "__main__":
     
     # min and max thresholds from sieve algorithm
     sieve_taus_path=val_dir + 'sieve_taus.pkl'
+    
+    # scored and bound-skipped stream items, and peak stored selections, per selection track
+    oracle_calls_path=val_dir + 'oracle_calls.pkl'
+    
+    # bytes each agent sends to the center per selection round
+    comm_bytes_path=val_dir + 'comm_bytes.pkl'
+    
+    # with the async simulator, per agent: seconds until the coordinator holds its selection, seconds its selection ran past
+    # its stream's last item, and its throughput in stream items per second from its first arrival until its selection landed
+    sim_stats_path=val_dir + 'sim_stats.pkl'
+    
+    # count syncs, bytes they cost and pooled value redundancy for the two DMGT tracks with a sync period
+    sync_stats_path=val_dir + 'sync_stats.pkl'
+    
+    # seconds spent retraining each track per round, counting only the slowest agent with fedavg
+    train_times_path=val_dir + 'train_times.pkl'
+    
+    # coordinator seconds spent sending, selecting and gathering per round with the gloo backend
+    comm_times_path=val_dir + 'comm_times.pkl'
+    
+    # epochs each track trained for per round, and why it stopped
+    train_stats_path=val_dir + 'train_stats.pkl'
 
+    objective = Objective(args.objective, args.budget, args.objective_param)
+    
+    # synced counts cover every agent's selection, so their table runs up to the pooled budget
+    sync_objective = Objective(args.objective, args.budget*args.num_agents, args.objective_param)
+    
+    # the calibration halves are only split when early stopping is on
+    stop_frac = args.stop_frac if args.stop_patience > 0 else 0.
+    
+    # every agent gets the default arrival rate and latency unless one value per agent is given
+    arrival_rates = args.arrival_rates if args.arrival_rates is not None else args.num_agents*[1000.]
+    latencies = args.latencies if args.latencies is not None else args.num_agents*[0.01]
+    if len(arrival_rates) != args.num_agents or len(latencies) != args.num_agents:
+        parser.error(f'--arrival_rates and --latencies need one value per agent ({args.num_agents})')
+    
     input_args = [args.num_init_pts,
                   args.imbals,
                   args.unif_taus,
@@ -1236,7 +2627,31 @@ if __name__ == "__main__":
                   device,
                   args.budget,
                   args.epsilon,
-                  sieve_taus_path]
+                  sieve_taus_path,
+                  args.score_batch_size,
+                  objective,
+                  oracle_calls_path,
+                  args.patience,
+                  args.num_procs,
+                  args.backend,
+                  args.master_port,
+                  comm_times_path,
+                  args.encoding,
+                  comm_bytes_path,
+                  arrival_rates,
+                  latencies,
+                  sim_stats_path,
+                  sync_objective,
+                  args.sync_period,
+                  sync_stats_path,
+                  args.vectorized,
+                  args.fedavg,
+                  train_times_path,
+                  args.trainer,
+                  stop_frac,
+                  args.stop_patience,
+                  args.time_budget,
+                  train_stats_path]
     
     rare_acc, all_acc, sizes, sum_sizes, sieve_taus = experiment(*input_args)
     
@@ -1244,5 +2659,5 @@ if __name__ == "__main__":
                    args.trials,
                    args.num_sel_rounds)
     
-    balance_plot(date_time,sizes,args.num_algs,args.num_classes,args.num_sel_rounds,args.unif_taus,args.dyn_taus)
+    balance_plot(date_time,sizes,args.num_algs,args.num_classes,args.num_sel_rounds,args.unif_taus,args.dyn_taus,objective)
     accuracy_plot(df,date_time,args.num_algs,args.num_sel_rounds)
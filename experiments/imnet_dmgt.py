@@ -14,14 +14,12 @@ import matplotlib
 import matplotlib.pyplot as plt
 import matplotlib.ticker as ticker
 import math
+import time
 import pdb
 import os
 from os.path import exists as file_exists
 import seaborn as sns
 import pandas as pd
-import sympy
-from sympy.solvers import solve 
-from sympy import Symbol 
 import argparse
 from numpy import genfromtxt
 from datetime import datetime
@@ -31,37 +29,221 @@ from sklearn.isotonic import IsotonicRegression
 now = datetime.now()    
 date_time = now.strftime('%m.%d_%H.%M.%S')
 
-def class_card(prev_labels,
-               x,
-               num_classes,
-               model,
-               is_isoreg,
-               rare_isoreg,
-               common_isoreg,
-               device):
+def class_probs(x,
+                num_classes,
+                model,
+                is_isoreg,
+                rare_isoreg,
+                common_isoreg,
+                device):
     
     model.eval()
-    logits = model(x.unsqueeze(0).to(device))
+    with torch.no_grad():
+        logits = model(x.to(device))
     softmax = nn.functional.softmax(logits, dim=1)
     
-    top_score = softmax.max(1).values
-    pred = softmax.max(1).indices
+    top_scores, preds = softmax.max(1)
     
     if is_isoreg:
-        if pred < 5:
-            cal_top_score = rare_isoreg.predict(top_score.cpu().detach().numpy())
-            
-        else:
-            cal_top_score = common_isoreg.predict(top_score.cpu().detach().numpy())
-    
-        renorm_factor = (1 - torch.from_numpy(cal_top_score).to(device))/(softmax.sum() - top_score) if top_score < 1 else 0
-        softmax = torch.mul(renorm_factor*torch.ones(num_classes).to(device), softmax)
-        softmax.squeeze().double()[pred] = torch.from_numpy(cal_top_score).to(device)
+        cal_top_scores = torch.where(preds < 5, rare_isoreg(top_scores), common_isoreg(top_scores))
+        
+        # class_card's arithmetic row by row: the float32 mass off the top class sets the factor, and a row with a top score
+        # of 1 is zeroed, since class_card's factor of 0 kept it float32 and its calibrated top score went into a discarded copy
+        renorm_factors = torch.where(top_scores < 1, (1 - cal_top_scores)/(softmax.sum(1) - top_scores), torch.zeros_like(cal_top_scores))
+        softmax = renorm_factors.unsqueeze(1)*softmax
+        softmax[torch.arange(len(x), device=device), preds] = torch.where(top_scores < 1, cal_top_scores, torch.zeros_like(cal_top_scores))
     
-    softmax = softmax.squeeze()
-    label_counts = [(prev_labels==i).float().sum() for i in range(num_classes)]
+    return softmax.double().cpu()
+
+class StreamProbs:
+    def __init__(self,
+                 stream_x,
+                 num_classes,
+                 model,
+                 is_isoreg,
+                 rare_isoreg,
+                 common_isoreg,
+                 device,
+                 score_batch_size):
+        
+        self.stream_x = stream_x
+        self.score_batch_size = score_batch_size
+        self.score = lambda x: class_probs(x, num_classes, model, is_isoreg, rare_isoreg, common_isoreg, device)
+        
+        self.start = 0
+        self.probs = torch.empty(0)
+        self.calls = 0
+        self.saved = 0
+    
+    def __getitem__(self, i):
+        # chunks are scored lazily from the first item whose decision is not forced by the count bounds
+        if not self.start <= i < self.start + len(self.probs):
+            self.start = i
+            self.probs = self.score(self.stream_x[i:i+self.score_batch_size])
+        self.calls += 1
+        return self.probs[i - self.start]
+    
+    def refresh(self):
+        # once the model moves, later items are rescored on their next lookup
+        self.probs = torch.empty(0)
+
+objectives = {'sqrt': lambda n, param: torch.sqrt(n),
+              'log1p': lambda n, param: torch.log1p(n),
+              'capped_linear': lambda n, param: torch.clamp(n, max=param),
+              'power': lambda n, param: torch.pow(n, param)}
+
+class Objective:
+    def __init__(self, name, budget, param=None):
+        if name in ['capped_linear', 'power'] and param is None:
+            raise ValueError(f'objective {name} needs --objective_param')
+        
+        # outside (0, 1] the power objective is not concave, so its increments would not shrink
+        if name == 'power' and not 0 < param <= 1:
+            raise ValueError(f'objective power needs --objective_param in (0, 1], got {param}')
+        
+        n = torch.arange(budget+2, dtype=torch.double)
+        vals = objectives[name](n, param)
+        
+        self.name = name
+        self.inc = lambda n: (objectives[name](torch.tensor(n + 1., dtype=torch.double), param) - objectives[name](torch.tensor(float(n), dtype=torch.double), param)).item()
+        self.vals = vals[:-1]
+        self.incs = vals[1:] - vals[:-1]
+    
+    def balanced_size(self, tau):
+        # the size at which a class's increment drops to tau; the table only runs to the budget, so past it the first
+        # such size is found by doubling and then bisecting over the (non-increasing) increments
+        if self.incs[-1] <= tau:
+            return int((self.incs > tau).sum())
+        lo, hi = len(self.incs) - 1, 2*len(self.incs)
+        while self.inc(hi) > tau:
+            lo, hi = hi, 2*hi
+        while hi - lo > 1:
+            mid = (lo + hi)//2
+            lo, hi = (mid, hi) if self.inc(mid) > tau else (lo, mid)
+        return hi
+
+class SelectionState:
+    def __init__(self, num_classes, objective, is_isoreg):
+        self.counts = torch.zeros(num_classes, dtype=torch.long)
+        self.size = 0
+        
+        # calibrated rows do not keep a unit mass (rows with a top score of 1 are zeroed, and float32 renormalization can leave
+        # the rest slightly above 1), so they are never forced in and are only forced out below a padded mass
+        self.convex = not is_isoreg
+        self.max_mass = 1. if self.convex else 1.01
+        
+        self.vals = objective.vals
+        self.incs = objective.incs
+        
+        self.cur_vals = self.vals[self.counts]
+        self.cur_incs = self.incs[self.counts]
+    
+    def add(self, y):
+        y = int(y)
+        self.counts[y] += 1
+        self.size += 1
+        self.cur_vals[y] = self.vals[self.counts[y]]
+        self.cur_incs[y] = self.incs[self.counts[y]]
+    
+    def gain(self, softmax):
+        return softmax @ self.cur_incs
+    
+    def value(self, softmax=None):
+        return self.cur_vals.sum() if softmax is None else softmax @ self.cur_vals
+    
+    def forced(self, threshold, budget, weights=None):
+        # softmax @ weights is a convex combination, so it is decided without scoring once threshold is outside their range
+        weights = self.cur_incs if weights is None else weights
+        if self.size >= budget or weights.max()*self.max_mass < threshold:
+            return False
+        if self.convex and weights.min() >= threshold:
+            return True
+        return None
+
+class SelectionStates:
+    def __init__(self, num_states, num_classes, objective, is_isoreg):
+        self.counts = torch.zeros(num_states, num_classes, dtype=torch.long)
+        self.sizes = torch.zeros(num_states, dtype=torch.long)
+        self.convex = not is_isoreg
+        self.max_mass = 1. if self.convex else 1.01
+        
+        self.vals = objective.vals
+        self.incs = objective.incs
+        
+        self.cur_vals = self.vals[self.counts]
+        self.cur_incs = self.incs[self.counts]
+    
+    def add(self, y, mask=None):
+        # y is one label for every masked state, or one label per state
+        mask = torch.ones_like(self.sizes, dtype=torch.bool) if mask is None else mask
+        states = mask.nonzero().view(-1)
+        y = torch.as_tensor(y).long().expand(len(self.sizes))[states]
+        self.counts[states, y] += 1
+        self.sizes += mask
+        self.cur_vals[states, y] = self.vals[self.counts[states, y]]
+        self.cur_incs[states, y] = self.incs[self.counts[states, y]]
+    
+    def gains(self, softmax):
+        return self.cur_incs @ softmax
+    
+    def values(self, softmax=None):
+        return self.cur_vals.sum(1) if softmax is None else self.cur_vals @ softmax
+    
+    def forced(self, thresholds, budget, weights=None):
+        weights = self.cur_incs if weights is None else weights
+        reject = (self.sizes >= budget) | (weights.max(1).values*self.max_mass < thresholds)
+        accept = ~reject & self.convex & (weights.min(1).values >= thresholds)
+        return accept, reject
+    
+    def keep(self, mask):
+        self.counts = self.counts[mask]
+        self.sizes = self.sizes[mask]
+        self.cur_vals = self.cur_vals[mask]
+        self.cur_incs = self.cur_incs[mask]
+
+class SelectedBuffer:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.x = None
+        self.y = None
+        self.size = 0
+    
+    def extend(self, x, y):
+        # storage is allocated once the item shape is known and kept across clears
+        if self.x is None:
+            self.x = torch.empty((self.capacity,) + tuple(x.shape[1:]), dtype=x.dtype)
+            self.y = torch.empty(self.capacity, dtype=y.dtype)
+        self.x[self.size:self.size+len(x)] = x
+        self.y[self.size:self.size+len(y)] = y
+        self.size += len(x)
+    
+    def append(self, x, y):
+        self.extend(x.unsqueeze(0), y.unsqueeze(0))
+    
+    def clear(self):
+        self.size = 0
+    
+    def view(self):
+        return self.x[:self.size], self.y[:self.size]
+
+def online_update(model,
+                  x,
+                  y,
+                  num_steps,
+                  lr,
+                  device):
+    
+    # a few full-batch SGD steps on the newest selections, with train's weight decay
+    optimizer = optim.SGD(model.parameters(), lr=lr, weight_decay=0.0005)
+    criterion = nn.CrossEntropyLoss()
+    x, y = x.to(device), y.to(device).long()
     
-    return sum([softmax[i] * (np.sqrt(label_counts[i] + 1)) for i in range(num_classes)]), sum([softmax[i] * (np.sqrt(label_counts[i])) for i in range(num_classes)]) 
+    model.train()
+    for step in range(num_steps):
+        optimizer.zero_grad()
+        loss = criterion(model(x), y)
+        loss.backward()
+        optimizer.step()
 
 def get_DMGT_subsets(stream_x,
                      stream_y,
@@ -73,30 +255,94 @@ def get_DMGT_subsets(stream_x,
                      rare_isoreg,
                      common_isoreg,
                      device,
-                     budget):
+                     budget,
+                     score_batch_size,
+                     objective,
+                     oracle_calls,
+                     online_k,
+                     online_steps,
+                     online_lr):
 
-    DMGT_x = stream_x[0].unsqueeze(0)
-    DMGT_y = stream_y[0].unsqueeze(0)
+    DMGT_buffer = SelectedBuffer(budget)
+    DMGT_buffer.append(stream_x[0], stream_y[0])
     
-    for i in range(1, len(stream_x)):
-        f_values =  class_card(DMGT_y,
-                               stream_x[i],
+    DMGT_state = SelectionState(num_classes, objective, is_isoreg)
+    DMGT_state.add(stream_y[0])
+    
+    stream_probs = StreamProbs(stream_x,
                                num_classes,
                                DMGT_model,
                                is_isoreg,
                                rare_isoreg,
                                common_isoreg,
-                               device)
-        
-        if f_values[0] - f_values[1] >= taus[int(sel_round)] and len(DMGT_x) < budget:
-            DMGT_x = torch.cat((DMGT_x, stream_x[i].unsqueeze(0)))
-            DMGT_y = torch.cat((DMGT_y, stream_y[i].unsqueeze(0)))
+                               device,
+                               score_batch_size)
+    
+    for i in range(1, len(stream_x)):
+        decided = DMGT_state.forced(taus[int(sel_round)], budget)
+        if decided is None:
+            decided = bool(DMGT_state.gain(stream_probs[i]) >= taus[int(sel_round)])
+        else:
+            stream_probs.saved += 1
+        if decided:
+            DMGT_buffer.append(stream_x[i], stream_y[i])
+            DMGT_state.add(stream_y[i])
+            
+            # every online_k selections nudge the model towards them, so later scores follow the selection
+            if online_k > 0 and DMGT_state.size % online_k == 0:
+                online_update(DMGT_model, *(tensor[-online_k:] for tensor in DMGT_buffer.view()), online_steps, online_lr, device)
+                stream_probs.refresh()
     
+    oracle_calls += torch.tensor([stream_probs.calls, stream_probs.saved, DMGT_state.size])
+    
+    DMGT_x, DMGT_y = DMGT_buffer.view()
     rand_idxs = torch.randperm(len(stream_x))[:budget]
     RAND_x = stream_x[rand_idxs]
     RAND_y = stream_y[rand_idxs]
     return DMGT_x, DMGT_y, RAND_x, RAND_y
 
+def get_DMGT_sweep_subsets(stream_x,
+                           stream_y,
+                           costs,
+                           DMGT_model,
+                           num_classes,
+                           is_isoreg,
+                           rare_isoreg,
+                           common_isoreg,
+                           device,
+                           budget,
+                           score_batch_size,
+                           objective):
+    
+    costs = torch.tensor(costs, dtype=torch.double)
+    
+    sweep_states = SelectionStates(len(costs), num_classes, objective, is_isoreg)
+    sweep_states.add(stream_y[0])
+    
+    sweep_idxs = torch.zeros(len(costs), len(stream_x), dtype=torch.bool)
+    sweep_idxs[:,0] = True
+    
+    stream_probs = StreamProbs(stream_x,
+                               num_classes,
+                               DMGT_model,
+                               is_isoreg,
+                               rare_isoreg,
+                               common_isoreg,
+                               device,
+                               score_batch_size)
+    
+    for i in range(1, len(stream_x)):
+        accept, reject = sweep_states.forced(costs, budget)
+        undecided = ~(accept | reject)
+        if undecided.any():
+            accept |= undecided & (sweep_states.gains(stream_probs[i]) >= costs)
+        sweep_idxs[:,i] = accept
+        sweep_states.add(stream_y[i], accept)
+    
+    sweep_x = [stream_x[idxs] for idxs in sweep_idxs]
+    sweep_y = [stream_y[idxs] for idxs in sweep_idxs]
+    return sweep_x, sweep_y, sweep_states.counts
+
 def get_SIEVE_subsets(stream_x,
                       stream_y,
                       SIEVE_model,
@@ -106,71 +352,193 @@ def get_SIEVE_subsets(stream_x,
                       common_isoreg,
                       device,
                       budget,
-                      epsilon):
+                      epsilon,
+                      score_batch_size,
+                      objective,
+                      oracle_calls):
 
     SIEVE_x = stream_x[0].unsqueeze(0)
     SIEVE_y = stream_y[0].unsqueeze(0)
     
-    init_x = SIEVE_x[0]
     init_y = SIEVE_y[0]
 
-    m = 1
+    m = objective.incs[0].item()
     epsilon = 0.1
     j = 1
     O = []
     while (1+epsilon)**j >= m and (1+epsilon)**j <= 2*m*len(stream_x):
         O += [(1+epsilon)**j]
         j += 1
-    set_dict = {}
-    taus = torch.Tensor().to(device)
+    O = torch.tensor(O, dtype=torch.double)
+    
+    SIEVE_states = SelectionStates(len(O), num_classes, objective, is_isoreg)
+    SIEVE_states.add(init_y)
+    sieve_idxs = torch.zeros(len(O), budget, dtype=torch.int32)
+    taus = torch.full((len(O), len(stream_x)-2), np.nan, dtype=torch.double)
+    
+    stream_probs = StreamProbs(stream_x,
+                               num_classes,
+                               SIEVE_model,
+                               is_isoreg,
+                               rare_isoreg,
+                               common_isoreg,
+                               device,
+                               score_batch_size)
+    
+    # the second item only opens the sieves, as in the original per-threshold loop
+    for i in range(2, len(stream_x)):
+        remaining = budget - SIEVE_states.sizes
+        accept, reject = SIEVE_states.forced(O/2, budget, SIEVE_states.cur_incs*remaining.unsqueeze(1) + SIEVE_states.cur_vals)
+        undecided = ~(accept | reject)
+        if undecided.any():
+            probs = stream_probs[i]
+            taus[:,i-2] = (O/2 - SIEVE_states.values(probs))/remaining
+            accept |= undecided & (SIEVE_states.gains(probs) >= taus[:,i-2])
+        else:
+            stream_probs.saved += 1
+        sieve_idxs[accept, SIEVE_states.sizes[accept]] = i
+        SIEVE_states.add(stream_y[i], accept)
+
+    oracle_calls += torch.tensor([stream_probs.calls, stream_probs.saved, int(SIEVE_states.sizes.sum())])
+    
+    max_idx = int(SIEVE_states.values().argmax())
+    sel_idxs = sieve_idxs[max_idx,:SIEVE_states.sizes[max_idx]].long()
+    SIEVE_x = stream_x[sel_idxs]
+    SIEVE_y = stream_y[sel_idxs]
+    sel_taus = taus[max_idx]
+    SIEVE_min_max_taus = torch.tensor([np.nanmin(sel_taus.numpy()),np.nanmax(sel_taus.numpy())])
+    return SIEVE_x, SIEVE_y, SIEVE_min_max_taus
+
+def get_THREE_SIEVES_subsets(stream_x,
+                             stream_y,
+                             THREE_SIEVES_model,
+                             num_classes,
+                             is_isoreg,
+                             rare_isoreg,
+                             common_isoreg,
+                             device,
+                             budget,
+                             epsilon,
+                             patience,
+                             score_batch_size,
+                             objective,
+                             oracle_calls):
+
+    init_y = stream_y[0]
+    
+    # a single sieve walks down the thresholds, so only one selection of at most budget items is stored
+    m = objective.incs[0].item()
+    j = int(np.ceil(np.log(m)/np.log(1+epsilon)))
+    O = []
+    while (1+epsilon)**j <= budget*m:
+        O += [(1+epsilon)**j]
+        j += 1
+    O = O[::-1]
+    
+    THREE_SIEVES_state = SelectionState(num_classes, objective, is_isoreg)
+    THREE_SIEVES_state.add(init_y)
+    sel_idxs = [0]
+    v_idx = 0
+    t = 0
+    
+    stream_probs = StreamProbs(stream_x,
+                               num_classes,
+                               THREE_SIEVES_model,
+                               is_isoreg,
+                               rare_isoreg,
+                               common_isoreg,
+                               device,
+                               score_batch_size)
+    
     for i in range(1, len(stream_x)):
-        new_taus = torch.Tensor().to(device)
-        for idx,v in enumerate(O):
-            if v not in list(set_dict.keys()):
-                set_dict[v] = [(init_x,init_y)]
-                taus = torch.cat((taus,torch.tensor([[v]]).to(device)))
+        remaining = budget - THREE_SIEVES_state.size
+        decided = THREE_SIEVES_state.forced(O[v_idx]/2, budget, THREE_SIEVES_state.cur_incs*remaining + THREE_SIEVES_state.cur_vals)
+        if decided is None:
+            probs = stream_probs[i]
+            decided = bool(THREE_SIEVES_state.gain(probs) >= (O[v_idx]/2 - THREE_SIEVES_state.value(probs))/remaining)
+        else:
+            stream_probs.saved += 1
+        if decided:
+            sel_idxs += [i]
+            THREE_SIEVES_state.add(stream_y[i])
+            t = 0
+        else:
+            t += 1
+            # lower the threshold after patience consecutive rejections
+            if t >= patience and v_idx < len(O)-1:
+                v_idx += 1
+                t = 0
+    
+    oracle_calls += torch.tensor([stream_probs.calls, stream_probs.saved, THREE_SIEVES_state.size])
+    
+    THREE_SIEVES_x = stream_x[sel_idxs]
+    THREE_SIEVES_y = stream_y[sel_idxs]
+    return THREE_SIEVES_x, THREE_SIEVES_y
+
+class TensorLoader():
+    
+    def __init__(self,
+                 dataset,
+                 batch_size,
+                 shuffle=False):
+        
+        # Subset views, random_split's included, collapse to one index tensor into the backing TensorDataset
+        self.dataset = dataset
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.idxs = None
+        while isinstance(dataset, Subset):
+            idxs = torch.as_tensor(dataset.indices, dtype=torch.long)
+            self.idxs = idxs if self.idxs is None else idxs[self.idxs]
+            dataset = dataset.dataset
+        self.tensors = dataset.tensors
+    
+    def __len__(self):
+        return -(-len(self.dataset) // self.batch_size)
+    
+    def __iter__(self):
+        
+        # the permutation comes from the global generator, so a seeded run draws the same batches
+        idxs = torch.randperm(len(self.dataset)) if self.shuffle else None
+        if self.idxs is not None:
+            idxs = self.idxs if idxs is None else self.idxs[idxs]
+        
+        for start in range(0, len(self.dataset), self.batch_size):
+            if idxs is None:
+                yield tuple(tensor[start:start+self.batch_size] for tensor in self.tensors)
             else:
-                f_values = class_card(torch.tensor(list(zip(*set_dict[v]))[1]),
-                                      stream_x[i],
-                                      num_classes,
-                                      SIEVE_model,
-                                      is_isoreg,
-                                      rare_isoreg,
-                                      common_isoreg,
-                                      device)
-                tau = (v/2 - f_values[1])/(budget - len(set_dict[v]))
-                new_taus = torch.cat((new_taus,torch.tensor([tau]).to(device)))
-                if f_values[0] - f_values[1] >= tau and len(set_dict[v]) < budget:
-                    set_dict[v] += [(stream_x[i],stream_y[i])]
-        if len(new_taus) > 0:
-            taus = torch.cat((taus, new_taus.unsqueeze(1)),dim=1) 
-
-    max_value = -np.inf
-    max_key = None
-    max_idx = 0
-    for idx,key in enumerate(list(set_dict.keys())):
-        label_counts = [(torch.tensor(list(zip(*set_dict[key]))[1])==i).float().sum() for i in range(num_classes)]
-        if sum([np.sqrt(label_counts[i]) for i in range(num_classes)]) > max_value:
-            max_key = key
-            max_idx = idx
-            max_value = sum([np.sqrt(label_counts[i]) for i in range(num_classes)])
-    SIEVE_x = torch.stack(list(zip(*set_dict[max_key]))[0])
-    SIEVE_y = torch.stack(list(zip(*set_dict[max_key]))[1])
-    sel_taus = taus[max_idx][1:]
-    SIEVE_min_max_taus = torch.tensor([sel_taus.min(),sel_taus.max()])
-    return SIEVE_x, SIEVE_y, SIEVE_min_max_taus
+                yield tuple(tensor[idxs[start:start+self.batch_size]] for tensor in self.tensors)
 
 def train(device,
           num_epochs,
           train_loader,
           class_dict,
-          model):
+          model,
+          trainer,
+          stop_loader,
+          stop_patience,
+          time_budget,
+          train_stats):
    
+    # models are trained in place, so either trainer warm starts from the previous round's weights
+    if trainer == 'lbfgs':
+        return train_lbfgs(device, num_epochs, train_loader, model, stop_loader, stop_patience, time_budget, train_stats)
+    
     model = model.to(device)
     
     optimizer = optim.SGD(model.parameters(), lr=0.001, momentum=0.9, weight_decay=0.0005)
     criterion = nn.CrossEntropyLoss()
     
+    # a held-out loss that stops improving first cuts the learning rate, then ends training after stop_patience epochs
+    scheduler = optim.lr_scheduler.ReduceLROnPlateau(optimizer, factor=0.1, patience=stop_patience//2) if stop_patience > 0 else None
+    best_loss, best_state, bad_epochs = float('inf'), None, 0
+    
+    # stop reasons: 0 epoch cap, 1 train accuracy, 2 held-out patience, 3 time budget
+    stop_reason = 0
+    start = time.time()
+    
+    # a run of zero epochs reports zero epochs trained
+    epoch = -1
     for epoch in range(num_epochs):
         
         train_loss = 0.0
@@ -194,10 +562,241 @@ def train(device,
         print(f'Epoch: {epoch} Train Loss: {train_loss:.6f}  Train Acc: {train_acc:.6f}')
 
         if train_acc >= 0.99:
+            stop_reason = 1
+            break
+        
+        if stop_patience > 0:
+            stop_loss = calc_loss(model, stop_loader)
+            scheduler.step(stop_loss)
+            if stop_loss < best_loss:
+                best_loss, best_state, bad_epochs = stop_loss, {name: param.clone() for name, param in model.state_dict().items()}, 0
+            else:
+                bad_epochs += 1
+            if bad_epochs >= stop_patience:
+                stop_reason = 2
+                break
+        
+        if time_budget > 0 and time.time() - start >= time_budget:
+            stop_reason = 3
             break
+    
+    # unless the selection was fit, the weights with the best held-out loss are kept
+    if best_state is not None and stop_reason != 1:
+        model.load_state_dict(best_state)
+    
+    if train_stats is not None:
+        train_stats[0], train_stats[1] = epoch + 1, stop_reason
+    
+    return model
 
+def train_lbfgs(device,
+                num_epochs,
+                train_loader,
+                model,
+                stop_loader,
+                stop_patience,
+                time_budget,
+                train_stats):
+    
+    # the selection is small enough for one batch, so the loss SGD descends, weight decay included, is minimized over all of it
+    data, targets = (torch.cat(tensors).to(device) for tensors in zip(*train_loader))
+    model = model.to(device)
+    
+    # with a held-out check or a time budget, each step runs one iteration so both are checked between iterations
+    checked = stop_patience > 0 or time_budget > 0
+    optimizer = optim.LBFGS(model.parameters(), max_iter=1 if checked else num_epochs, tolerance_grad=1e-5, tolerance_change=1e-9, line_search_fn='strong_wolfe')
+    criterion = nn.CrossEntropyLoss()
+    
+    def closure():
+        optimizer.zero_grad()
+        loss = criterion(model(data), targets.long()) + 0.0005/2*sum(param.pow(2).sum() for param in model.parameters())
+        loss.backward()
+        return loss
+    
+    param_state = optimizer.state[optimizer.param_groups[0]["params"][0]]
+    best_loss, best_state, bad_iters = float('inf'), None, 0
+    
+    # stop reasons as in train: 0 iteration cap or convergence, 2 held-out patience, 3 time budget
+    stop_reason = 0
+    start = time.time()
+    
+    for _ in range(num_epochs if checked else 1):
+        num_iters = param_state.get("n_iter", 0)
+        model.train()
+        optimizer.step(closure)
+        
+        # a step that runs no iteration means the tolerances were met
+        if param_state.get("n_iter", 0) == num_iters:
+            break
+        
+        if stop_patience > 0:
+            stop_loss = calc_loss(model, stop_loader)
+            if stop_loss < best_loss:
+                best_loss, best_state, bad_iters = stop_loss, {name: param.clone() for name, param in model.state_dict().items()}, 0
+            else:
+                bad_iters += 1
+            if bad_iters >= stop_patience:
+                stop_reason = 2
+                break
+        
+        if time_budget > 0 and time.time() - start >= time_budget:
+            stop_reason = 3
+            break
+    
+    # the weights with the best held-out loss are kept
+    if best_state is not None:
+        model.load_state_dict(best_state)
+    
+    with torch.no_grad():
+        output = model(data)
+        train_loss = criterion(output, targets.long()).item()
+        train_acc = (output.max(1)[1]==targets).float().mean().item()
+    
+    num_iters = param_state.get("n_iter", 0)
+    print(f'Iterations: {num_iters} Train Loss: {train_loss:.6f}  Train Acc: {train_acc:.6f}')
+    
+    if train_stats is not None:
+        train_stats[0], train_stats[1] = num_iters, stop_reason
+    
     return model
 
+def train_stacked(device,
+                  num_epochs,
+                  train_sets,
+                  batch_size,
+                  models,
+                  stop_loader,
+                  stop_patience,
+                  time_budget,
+                  train_stats):
+    
+    num_tracks = len(models)
+    
+    # the tracks' linear heads are stacked, so one batched step updates every track that is still training
+    weight = torch.stack([model.linear.weight.detach() for model in models]).to(device).requires_grad_()
+    bias = torch.stack([model.linear.bias.detach() for model in models]).to(device).requires_grad_()
+    momentum_bufs = [torch.zeros_like(weight), torch.zeros_like(bias)]
+    
+    # ragged per-track selections are padded to a common length, and the padding is masked out of every batch
+    sizes = torch.tensor([len(y) for x, y in train_sets], device=device)
+    data = torch.zeros((num_tracks, int(sizes.max())) + tuple(train_sets[0][0].shape[1:]), device=device)
+    targets = torch.zeros(num_tracks, int(sizes.max()), dtype=torch.long, device=device)
+    for k, (x, y) in enumerate(train_sets):
+        data[k,:len(y)] = x.to(device)
+        targets[k,:len(y)] = y.to(device).long()
+    
+    training = torch.ones(num_tracks, dtype=torch.bool, device=device)
+    epochs = torch.zeros(num_tracks, dtype=torch.long, device=device)
+    
+    # stop reasons as in train: 0 epoch cap, 1 train accuracy, 2 held-out patience, 3 time budget
+    stop_reasons = torch.zeros(num_tracks, dtype=torch.long, device=device)
+    
+    # every track keeps its own learning rate, plateau count and best held-out weights, as a sequential run with ReduceLROnPlateau would
+    lrs = torch.full((num_tracks,), 0.001, device=device)
+    if stop_patience > 0:
+        stop_x, stop_y = (torch.cat(tensors).to(device) for tensors in zip(*stop_loader))
+        plateau_losses = torch.full((num_tracks,), float('inf'), device=device)
+        plateau_epochs = torch.zeros(num_tracks, dtype=torch.long, device=device)
+        best_losses = torch.full((num_tracks,), float('inf'), device=device)
+        bad_epochs = torch.zeros(num_tracks, dtype=torch.long, device=device)
+        best_weight, best_bias = weight.detach().clone(), bias.detach().clone()
+        has_best = torch.zeros(num_tracks, dtype=torch.bool, device=device)
+    
+    train_start = time.time()
+    
+    for epoch in range(num_epochs):
+        
+        train_loss = torch.zeros(num_tracks, device=device)
+        train_acc = torch.zeros(num_tracks, device=device)
+        
+        # every track shuffles its own items, and padded positions sort last
+        order = torch.stack([torch.cat((torch.randperm(int(size)), torch.arange(int(size), data.shape[1]))) for size in sizes]).to(device)
+        
+        for start in range(0, data.shape[1], batch_size):
+            batch_idxs = order[:,start:start+batch_size]
+            mask = (batch_idxs < sizes.unsqueeze(1)) & training.unsqueeze(1)
+            active = mask.any(1)
+            if not active.any():
+                break
+            
+            # only tracks with items left in this batch are computed, so short and finished tracks cost nothing
+            tracks = active.nonzero()
+            batch_idxs, mask = batch_idxs[active], mask[active]
+            output = torch.baddbmm(bias[active].unsqueeze(1), data[tracks,batch_idxs], weight[active].transpose(1,2))
+            batch_targets = targets[tracks,batch_idxs]
+            losses = nn.functional.cross_entropy(output.flatten(0,1), batch_targets.flatten(), reduction='none').view(mask.shape)*mask
+            
+            # each track's loss is the mean over its own batch, as CrossEntropyLoss gives the sequential trainer
+            weight.grad, bias.grad = None, None
+            (losses.sum(1)/mask.sum(1)).sum().backward()
+            
+            # SGD with momentum and weight decay as in train, applied only to tracks with a batch in this step
+            with torch.no_grad():
+                for param, momentum_buf in zip((weight, bias), momentum_bufs):
+                    step_mask = active.view((-1,) + (1,)*(param.dim()-1))
+                    momentum_buf.copy_(torch.where(step_mask, 0.9*momentum_buf + param.grad + 0.0005*param, momentum_buf))
+                    param.sub_(lrs.view(step_mask.shape)*momentum_buf*step_mask)
+            
+            train_loss[active] += losses.detach().sum(1)/mask.sum(1)
+            train_acc[active] += ((output.detach().max(2)[1]==batch_targets) & mask).sum(1)
+        
+        train_loss = train_loss/sizes
+        train_acc = train_acc/sizes
+        
+        print(f'Epoch: {epoch} Tracks: {training.sum().item()}  Train Loss: {train_loss[training].mean().item():.6f}  Train Acc: {train_acc[training].mean().item():.6f}')
+        
+        # a track that reaches the accuracy the sequential trainer stops at drops out of the stacked job
+        epochs += training
+        fit = training & (train_acc >= 0.99)
+        stop_reasons[fit] = 1
+        training &= ~fit
+        
+        if stop_patience > 0:
+            with torch.no_grad():
+                stop_output = torch.baddbmm(bias.unsqueeze(1), stop_x.expand((num_tracks,) + stop_x.shape), weight.transpose(1,2))
+                stop_losses = nn.functional.cross_entropy(stop_output.flatten(0,1), stop_y.long().repeat(num_tracks), reduction='none').view(num_tracks, -1).mean(1)
+            
+            # the plateau step of ReduceLROnPlateau(factor=0.1, patience=stop_patience//2) for every track still training
+            plateaued = training & ~(stop_losses < plateau_losses*(1 - 1e-4))
+            plateau_losses = torch.where(training & ~plateaued, stop_losses, plateau_losses)
+            plateau_epochs = torch.where(plateaued, plateau_epochs + 1, torch.where(training, 0, plateau_epochs))
+            cut = plateau_epochs > stop_patience//2
+            lrs = torch.where(cut, 0.1*lrs, lrs)
+            plateau_epochs[cut] = 0
+            
+            improved = training & (stop_losses < best_losses)
+            best_losses = torch.where(improved, stop_losses, best_losses)
+            best_weight[improved], best_bias[improved] = weight.detach()[improved], bias.detach()[improved]
+            has_best |= improved
+            bad_epochs = torch.where(improved, 0, bad_epochs + (training & ~improved))
+            
+            patience_out = training & (bad_epochs >= stop_patience)
+            stop_reasons[patience_out] = 2
+            training &= ~patience_out
+        
+        if time_budget > 0 and time.time() - train_start >= time_budget:
+            stop_reasons[training] = 3
+            training[:] = False
+        
+        if not training.any():
+            break
+    
+    # unless a track's selection was fit, the weights with its best held-out loss are kept
+    if stop_patience > 0:
+        restore = has_best & (stop_reasons != 1)
+        with torch.no_grad():
+            weight[restore], bias[restore] = best_weight[restore], best_bias[restore]
+    
+    with torch.no_grad():
+        for k, model in enumerate(models):
+            model.linear.weight.copy_(weight[k])
+            model.linear.bias.copy_(bias[k])
+    
+    if train_stats is not None:
+        train_stats[:,0], train_stats[:,1] = epochs.cpu(), stop_reasons.cpu()
+    
+    return models
+
 def load_model(model,
                embed_dim,
                num_classes,
@@ -233,6 +832,21 @@ def calc_acc(model,
 
     return rare_acc.float().mean().unsqueeze(0), all_acc.float().mean().unsqueeze(0)
 
+def calc_loss(model,
+              val_loader):
+
+    model.eval()
+    
+    criterion = nn.CrossEntropyLoss(reduction='sum')
+    val_loss = 0.0
+    
+    for val_x, val_y in val_loader:
+        val_x, val_y = val_x.to(device), val_y.to(device)
+        with torch.no_grad():
+            val_loss += criterion(model(val_x), val_y.long()).item()
+    
+    return val_loss/len(val_loader.dataset)
+
 def calc_cal_acc(is_isoreg,
                  rare_isoreg,
                  common_isoreg,
@@ -292,6 +906,26 @@ def calc_cal_acc(is_isoreg,
     
     return cal_rare_acc, cal_common_acc, cal_all_acc
 
+class IsoTable:
+    def __init__(self, isoreg):
+        # piecewise-linear knots of the fitted isotonic regression; a single knot is repeated so every score has a segment
+        self.xs = torch.from_numpy(np.repeat(isoreg.X_thresholds_, 2) if len(isoreg.X_thresholds_) == 1 else isoreg.X_thresholds_).double()
+        self.ys = torch.from_numpy(np.repeat(isoreg.y_thresholds_, 2) if len(isoreg.y_thresholds_) == 1 else isoreg.y_thresholds_).double()
+    
+    def __call__(self, scores):
+        if self.xs.device != scores.device:
+            self.xs, self.ys = self.xs.to(scores.device), self.ys.to(scores.device)
+        
+        scores = scores.double().clamp(self.xs[0], self.xs[-1])
+        idxs = torch.searchsorted(self.xs, scores, right=True).clamp(1, len(self.xs) - 1)
+        x0, x1, y0, y1 = self.xs[idxs-1], self.xs[idxs], self.ys[idxs-1], self.ys[idxs]
+        
+        weights = torch.where(x1 > x0, (scores - x0)/(x1 - x0), torch.zeros_like(scores))
+        return y0 + weights*(y1 - y0)
+    
+    def predict(self, scores):
+        return self(torch.from_numpy(np.ravel(scores))).cpu().numpy()
+
 def train_isoreg(model, val_loader):
     model.eval()
 
@@ -313,7 +947,7 @@ def train_isoreg(model, val_loader):
     preds_correct = torch.cat(preds_correct, dim=0)
     
     IsoReg = IsotonicRegression(y_min=0, y_max=1, increasing=True, out_of_bounds='clip').fit(top_scores.cpu(), preds_correct.cpu())
-    return IsoReg 
+    return IsoTable(IsoReg) 
 
 def get_embed_loader(data_dir,
                      class_dict,
@@ -444,7 +1078,8 @@ def get_test_embed_loader(embed_dim,
                           class_dict,
                           num_test_pts,
                           idx_conv_dict,
-                          device):
+                          device,
+                          stop_frac):
     
     if not (file_exists(test_embeds_path) and
             file_exists(test_embeds_labels_path)):
@@ -492,29 +1127,31 @@ def get_test_embed_loader(embed_dim,
     test_common_embeds_idxs, val_common_embeds_idxs = (common_embeds_idxs[:int(len(common_embeds_idxs)/2)],
                                                        common_embeds_idxs[int(len(common_embeds_idxs)/2):])
     
+    # a stop_frac slice of each calibration half is held out of the isoregs for early stopping
+    stop_rare_embeds_idxs, val_rare_embeds_idxs = (val_rare_embeds_idxs[:int(stop_frac*len(val_rare_embeds_idxs))],
+                                                   val_rare_embeds_idxs[int(stop_frac*len(val_rare_embeds_idxs)):])
+
+    stop_common_embeds_idxs, val_common_embeds_idxs = (val_common_embeds_idxs[:int(stop_frac*len(val_common_embeds_idxs))],
+                                                       val_common_embeds_idxs[int(stop_frac*len(val_common_embeds_idxs)):])
+    
     test_embeds_dataset = TensorDataset(test_embeds, test_embeds_labels)
 
-    test_embeds_loader = DataLoader(Subset(test_embeds_dataset, torch.cat((test_rare_embeds_idxs, test_common_embeds_idxs))),
-                                    batch_size=embed_batch_size,
-                                    num_workers=num_workers,
-                                    shuffle=True)
+    test_embeds_loader = TensorLoader(Subset(test_embeds_dataset, torch.cat((test_rare_embeds_idxs, test_common_embeds_idxs))),
+                                      batch_size=embed_batch_size,
+                                      shuffle=True)
 
-    rare_val_embeds_loader = DataLoader(Subset(test_embeds_dataset, val_rare_embeds_idxs),
-                                        batch_size=batch_size,
-                                        num_workers=num_workers,
-                                        shuffle=True)
-    
-    common_val_embeds_loader = DataLoader(Subset(test_embeds_dataset, val_common_embeds_idxs),
+    rare_val_embeds_loader = TensorLoader(Subset(test_embeds_dataset, val_rare_embeds_idxs),
                                           batch_size=batch_size,
-                                          num_workers=num_workers,
                                           shuffle=True)
     
-    val_embeds_loader = DataLoader(Subset(test_embeds_dataset, torch.cat((val_rare_embeds_idxs, val_common_embeds_idxs))),
-                                   batch_size=batch_size,
-                                   num_workers=num_workers,
-                                   shuffle=True)
+    common_val_embeds_loader = TensorLoader(Subset(test_embeds_dataset, val_common_embeds_idxs),
+                                            batch_size=batch_size,
+                                            shuffle=True)
+    
+    stop_embeds_loader = TensorLoader(Subset(test_embeds_dataset, torch.cat((stop_rare_embeds_idxs, stop_common_embeds_idxs))),
+                                      batch_size=batch_size)
     
-    return test_embeds_loader, rare_val_embeds_loader, common_val_embeds_loader, val_embeds_loader
+    return test_embeds_loader, rare_val_embeds_loader, common_val_embeds_loader, stop_embeds_loader
 
 def get_test_loader(test_dir,
                     test_label_file,
@@ -590,7 +1227,11 @@ def train_init_model(test_embeds_loader,
                      class_dict,
                      embeds,
                      labels,
-                     device):
+                     device,
+                     stop_embeds_loader,
+                     stop_patience,
+                     time_budget,
+                     trainer):
 
     init_dataset, stream_dataset = get_datasets(embeds,
                                                 labels,
@@ -598,10 +1239,9 @@ def train_init_model(test_embeds_loader,
                                                 imbal,
                                                 num_classes)
 
-    init_loader = DataLoader(init_dataset,
-                             batch_size=num_init_pts,
-                             num_workers=num_workers,
-                             shuffle=True)
+    init_loader = TensorLoader(init_dataset,
+                               batch_size=num_init_pts,
+                               shuffle=True)
 
     init_samples = enumerate(init_loader)
     _, (init_x, init_y) = next(init_samples)
@@ -609,16 +1249,16 @@ def train_init_model(test_embeds_loader,
     sizes[:,:,:,0] = (
             
             torch.stack((torch.tensor([(init_y==i).float().sum() for i in range(num_classes)]),
+                         torch.tensor([(init_y==i).float().sum() for i in range(num_classes)]),
                          torch.tensor([(init_y==i).float().sum() for i in range(num_classes)]),
                          torch.tensor([(init_y==i).float().sum() for i in range(num_classes)]),
                          torch.tensor([(init_y==i).float().sum() for i in range(num_classes)]))))
 
     sum_sizes[:,:,:,:,0] = num_init_pts
 
-    init_loader = DataLoader(TensorDataset(init_x, init_y),
-                             batch_size=batch_size,
-                             num_workers=num_workers,
-                             shuffle=True)
+    init_loader = TensorLoader(TensorDataset(init_x, init_y),
+                               batch_size=batch_size,
+                               shuffle=True)
 
     model = LogRegModel(embed_dim, num_classes) 
 
@@ -631,13 +1271,19 @@ def train_init_model(test_embeds_loader,
                       num_epochs,
                       init_loader,
                       class_dict,
-                      model)
+                      model,
+                      trainer,
+                      stop_embeds_loader,
+                      stop_patience,
+                      time_budget,
+                      None)
 
         torch.save(model.state_dict(), model_path)
 
     rare_acc[:,:,:,0] = (
 
             torch.cat((calc_acc(model, test_embeds_loader, num_classes)[0], 
+                       calc_acc(model, test_embeds_loader, num_classes)[0],
                        calc_acc(model, test_embeds_loader, num_classes)[0],
                        calc_acc(model, test_embeds_loader, num_classes)[0],
                        calc_acc(model, test_embeds_loader, num_classes)[0])))
@@ -645,6 +1291,7 @@ def train_init_model(test_embeds_loader,
     all_acc[:,:,:,0] = (
             
             torch.cat((calc_acc(model, test_embeds_loader, num_classes)[1],
+                       calc_acc(model, test_embeds_loader, num_classes)[1],
                        calc_acc(model, test_embeds_loader, num_classes)[1],
                        calc_acc(model, test_embeds_loader, num_classes)[1],
                        calc_acc(model, test_embeds_loader, num_classes)[1])))
@@ -655,6 +1302,7 @@ def update_models(DMGT_UNIF_model,
                   DMGT_DYN_model,
                   RAND_model,
                   SIEVE_model,
+                  THREE_SIEVES_model,
                   rare_val_embeds_loader,
                   common_val_embeds_loader,
                   test_embeds_loader,
@@ -679,7 +1327,22 @@ def update_models(DMGT_UNIF_model,
                   device,
                   budget,
                   epsilon,
-                  sieve_taus):
+                  sieve_taus,
+                  score_batch_size,
+                  objective,
+                  oracle_calls,
+                  sweep_costs,
+                  sweep_sizes,
+                  patience,
+                  trainer,
+                  stop_embeds_loader,
+                  stop_patience,
+                  time_budget,
+                  train_stats,
+                  online_k,
+                  online_steps,
+                  online_lr,
+                  skip_retrain):
 
 
     rare_DMGT_UNIF_isoreg = train_isoreg(DMGT_UNIF_model, rare_val_embeds_loader) if is_isoreg else None
@@ -688,6 +1351,23 @@ def update_models(DMGT_UNIF_model,
     common_DMGT_DYN_isoreg = train_isoreg(DMGT_DYN_model, common_val_embeds_loader) if is_isoreg else None
     rare_SIEVE_isoreg = train_isoreg(SIEVE_model, rare_val_embeds_loader) if is_isoreg else None
     common_SIEVE_isoreg = train_isoreg(SIEVE_model, common_val_embeds_loader) if is_isoreg else None
+    rare_THREE_SIEVES_isoreg = train_isoreg(THREE_SIEVES_model, rare_val_embeds_loader) if is_isoreg else None
+    common_THREE_SIEVES_isoreg = train_isoreg(THREE_SIEVES_model, common_val_embeds_loader) if is_isoreg else None
+    
+    # the sweep scores with the round's starting model, before online updates move it
+    if sweep_costs is not None:
+        _, _, sweep_sizes[init_pts_idx,imbal_idx,trial,sel_round] = get_DMGT_sweep_subsets(stream_x,
+                                                                                           stream_y,
+                                                                                           sweep_costs,
+                                                                                           DMGT_UNIF_model,
+                                                                                           num_classes,
+                                                                                           is_isoreg,
+                                                                                           rare_DMGT_UNIF_isoreg,
+                                                                                           common_DMGT_UNIF_isoreg,
+                                                                                           device,
+                                                                                           budget,
+                                                                                           score_batch_size,
+                                                                                           objective)
     
     DMGT_UNIF_x, DMGT_UNIF_y, RAND_x, RAND_y = get_DMGT_subsets(stream_x,
                                                                 stream_y,
@@ -699,7 +1379,13 @@ def update_models(DMGT_UNIF_model,
                                                                 rare_DMGT_UNIF_isoreg,
                                                                 common_DMGT_UNIF_isoreg,
                                                                 device,
-                                                                budget)
+                                                                budget,
+                                                                score_batch_size,
+                                                                objective,
+                                                                oracle_calls[init_pts_idx,imbal_idx,trial,sel_round,0],
+                                                                online_k,
+                                                                online_steps,
+                                                                online_lr)
     
     DMGT_DYN_x, DMGT_DYN_y, _, _ = get_DMGT_subsets(stream_x,
                                                     stream_y,
@@ -711,7 +1397,13 @@ def update_models(DMGT_UNIF_model,
                                                     rare_DMGT_DYN_isoreg,
                                                     common_DMGT_DYN_isoreg,
                                                     device,
-                                                    budget)
+                                                    budget,
+                                                    score_batch_size,
+                                                    objective,
+                                                    oracle_calls[init_pts_idx,imbal_idx,trial,sel_round,1],
+                                                    online_k,
+                                                    online_steps,
+                                                    online_lr)
 
     SIEVE_x, SIEVE_y, max_min_taus = get_SIEVE_subsets(stream_x,
                                                        stream_y,
@@ -722,70 +1414,138 @@ def update_models(DMGT_UNIF_model,
                                                        common_SIEVE_isoreg,
                                                        device,
                                                        budget,
-                                                       epsilon)
+                                                       epsilon,
+                                                       score_batch_size,
+                                                       objective,
+                                                       oracle_calls[init_pts_idx,imbal_idx,trial,sel_round,2])
+    
+    THREE_SIEVES_x, THREE_SIEVES_y = get_THREE_SIEVES_subsets(stream_x,
+                                                              stream_y,
+                                                              THREE_SIEVES_model,
+                                                              num_classes,
+                                                              is_isoreg,
+                                                              rare_THREE_SIEVES_isoreg,
+                                                              common_THREE_SIEVES_isoreg,
+                                                              device,
+                                                              budget,
+                                                              epsilon,
+                                                              patience,
+                                                              score_batch_size,
+                                                              objective,
+                                                              oracle_calls[init_pts_idx,imbal_idx,trial,sel_round,3])
 
     sizes[init_pts_idx,imbal_idx,trial,sel_round+1] = (
             
             torch.stack((torch.tensor([(DMGT_UNIF_y==i).float().sum() for i in range(num_classes)]),
                          torch.tensor([(DMGT_DYN_y==i).float().sum() for i in range(num_classes)]),
                          torch.tensor([(RAND_y==i).float().sum() for i in range(num_classes)]),
-                         torch.tensor([(SIEVE_y==i).float().sum() for i in range(num_classes)]))))
+                         torch.tensor([(SIEVE_y==i).float().sum() for i in range(num_classes)]),
+                         torch.tensor([(THREE_SIEVES_y==i).float().sum() for i in range(num_classes)]))))
     
     sum_sizes[init_pts_idx,imbal_idx,trial,sel_round+1] = (
             
             torch.tensor([sum_sizes[init_pts_idx,imbal_idx,trial,sel_round] + len(DMGT_UNIF_y)]))
         
-    DMGT_UNIF_model = train(device,
-                     num_epochs,
-                     DataLoader(TensorDataset(DMGT_UNIF_x, DMGT_UNIF_y),
-                                batch_size=batch_size,
-                                num_workers=num_workers,
-                                shuffle=True),
-                     class_dict,
-                     DMGT_UNIF_model)
-    
-    DMGT_DYN_model = train(device,
-                     num_epochs,
-                     DataLoader(TensorDataset(DMGT_DYN_x, DMGT_DYN_y),
-                                batch_size=batch_size,
-                                num_workers=num_workers,
-                                shuffle=True),
-                     class_dict,
-                     DMGT_DYN_model)
-    
-    RAND_model = train(device,
-                       num_epochs,
-                       DataLoader(TensorDataset(RAND_x, RAND_y),
-                                  batch_size=batch_size,
-                                  num_workers=num_workers,
-                                  shuffle=True),
-                       class_dict,
-                       RAND_model)
-    
-    SIEVE_model = train(device,
-                     num_epochs,
-                     DataLoader(TensorDataset(SIEVE_x, SIEVE_y),
-                                batch_size=batch_size,
-                                num_workers=num_workers,
-                                shuffle=True),
-                     class_dict,
-                     SIEVE_model)
+    # all tracks' heads are trained together as one stacked model
+    if trainer == 'stacked':
+        DMGT_UNIF_model, DMGT_DYN_model, RAND_model, SIEVE_model, THREE_SIEVES_model = train_stacked(device,
+                                                                                                     num_epochs,
+                                                                                                     [(DMGT_UNIF_x, DMGT_UNIF_y),
+                                                                                                      (DMGT_DYN_x, DMGT_DYN_y),
+                                                                                                      (RAND_x, RAND_y),
+                                                                                                      (SIEVE_x, SIEVE_y),
+                                                                                                      (THREE_SIEVES_x, THREE_SIEVES_y)],
+                                                                                                     batch_size,
+                                                                                                     [DMGT_UNIF_model, DMGT_DYN_model, RAND_model, SIEVE_model, THREE_SIEVES_model],
+                                                                                                     stop_embeds_loader,
+                                                                                                     stop_patience,
+                                                                                                     time_budget,
+                                                                                                     train_stats[init_pts_idx,imbal_idx,trial,sel_round])
+    else:
+        # online updates already follow the DMGT selections, so their retrain can be dropped
+        if not (online_k > 0 and skip_retrain):
+            DMGT_UNIF_model = train(device,
+                             num_epochs,
+                             TensorLoader(TensorDataset(DMGT_UNIF_x, DMGT_UNIF_y),
+                                          batch_size=batch_size,
+                                          shuffle=True),
+                             class_dict,
+                             DMGT_UNIF_model,
+                             trainer,
+                             stop_embeds_loader,
+                             stop_patience,
+                             time_budget,
+                             train_stats[init_pts_idx,imbal_idx,trial,sel_round,0])
+            
+            DMGT_DYN_model = train(device,
+                             num_epochs,
+                             TensorLoader(TensorDataset(DMGT_DYN_x, DMGT_DYN_y),
+                                          batch_size=batch_size,
+                                          shuffle=True),
+                             class_dict,
+                             DMGT_DYN_model,
+                             trainer,
+                             stop_embeds_loader,
+                             stop_patience,
+                             time_budget,
+                             train_stats[init_pts_idx,imbal_idx,trial,sel_round,1])
+        
+        RAND_model = train(device,
+                           num_epochs,
+                           TensorLoader(TensorDataset(RAND_x, RAND_y),
+                                        batch_size=batch_size,
+                                        shuffle=True),
+                           class_dict,
+                           RAND_model,
+                           trainer,
+                           stop_embeds_loader,
+                           stop_patience,
+                           time_budget,
+                           train_stats[init_pts_idx,imbal_idx,trial,sel_round,2])
+        
+        SIEVE_model = train(device,
+                         num_epochs,
+                         TensorLoader(TensorDataset(SIEVE_x, SIEVE_y),
+                                      batch_size=batch_size,
+                                      shuffle=True),
+                         class_dict,
+                         SIEVE_model,
+                         trainer,
+                         stop_embeds_loader,
+                         stop_patience,
+                         time_budget,
+                         train_stats[init_pts_idx,imbal_idx,trial,sel_round,3])
+        
+        THREE_SIEVES_model = train(device,
+                                   num_epochs,
+                                   TensorLoader(TensorDataset(THREE_SIEVES_x, THREE_SIEVES_y),
+                                                batch_size=batch_size,
+                                                shuffle=True),
+                                   class_dict,
+                                   THREE_SIEVES_model,
+                                   trainer,
+                                   stop_embeds_loader,
+                                   stop_patience,
+                                   time_budget,
+                                   train_stats[init_pts_idx,imbal_idx,trial,sel_round,4])
 
     rare_acc[init_pts_idx,imbal_idx,trial,sel_round+1] = (
 
             torch.cat((calc_acc(DMGT_UNIF_model, test_embeds_loader, num_classes)[0], 
                        calc_acc(DMGT_DYN_model, test_embeds_loader, num_classes)[0],
                        calc_acc(RAND_model, test_embeds_loader, num_classes)[0],
-                       calc_acc(SIEVE_model, test_embeds_loader, num_classes)[0])))
+                       calc_acc(SIEVE_model, test_embeds_loader, num_classes)[0],
+                       calc_acc(THREE_SIEVES_model, test_embeds_loader, num_classes)[0])))
     
     all_acc[init_pts_idx,imbal_idx,trial,sel_round+1] = (
             
             torch.cat((calc_acc(DMGT_UNIF_model, test_embeds_loader, num_classes)[1],
                        calc_acc(DMGT_DYN_model, test_embeds_loader, num_classes)[1],
                        calc_acc(RAND_model, test_embeds_loader, num_classes)[1],
-                       calc_acc(SIEVE_model, test_embeds_loader, num_classes)[1])))
+                       calc_acc(SIEVE_model, test_embeds_loader, num_classes)[1],
+                       calc_acc(THREE_SIEVES_model, test_embeds_loader, num_classes)[1])))
     
-    return DMGT_UNIF_model, DMGT_DYN_model, RAND_model, SIEVE_model, sizes, sum_sizes, rare_acc, all_acc, sieve_taus
+    return DMGT_UNIF_model, DMGT_DYN_model, RAND_model, SIEVE_model, THREE_SIEVES_model, sizes, sum_sizes, rare_acc, all_acc, sieve_taus, oracle_calls, sweep_sizes, train_stats
 
 def experiment(init_pts,
                imbals,
@@ -823,7 +1583,22 @@ def experiment(init_pts,
                device,
                budget,
                epsilon,
-               sieve_taus_path):
+               sieve_taus_path,
+               score_batch_size,
+               objective,
+               oracle_calls_path,
+               sweep_costs,
+               sweep_sizes_path,
+               patience,
+               trainer,
+               stop_frac,
+               stop_patience,
+               time_budget,
+               train_stats_path,
+               online_k,
+               online_steps,
+               online_lr,
+               skip_retrain):
     
     if not file_exists(rare_acc_path):
         
@@ -834,6 +1609,9 @@ def experiment(init_pts,
         sum_sizes=torch.zeros(len(init_pts),len(imbals),len(trials),num_sel_rounds+1,1)
         
         sieve_taus=torch.zeros(len(init_pts),len(imbals),len(trials),num_sel_rounds,2)
+        oracle_calls=torch.zeros(len(init_pts),len(imbals),len(trials),num_sel_rounds,4,3)
+        sweep_sizes=torch.zeros(len(init_pts),len(imbals),len(trials),num_sel_rounds,len(sweep_costs),num_classes) if sweep_costs is not None else None
+        train_stats=torch.zeros(len(init_pts),len(imbals),len(trials),num_sel_rounds,num_algs,2)
         
         classes = random.sample(list(np.arange(1000)), num_classes)
         
@@ -854,20 +1632,21 @@ def experiment(init_pts,
                                                    folder_to_class_file,
                                                    device)
         
-        test_embeds_loader, rare_val_embeds_loader, common_val_embeds_loader, val_embeds_loader = get_test_embed_loader(embed_dim,
-                                                                                                                        embed_batch_size,
-                                                                                                                        batch_size,
-                                                                                                                        num_classes,
-                                                                                                                        num_workers,
-                                                                                                                        weights_path,
-                                                                                                                        test_dir,
-                                                                                                                        test_embeds_path,
-                                                                                                                        test_embeds_labels_path,
-                                                                                                                        test_label_file,
-                                                                                                                        class_dict,
-                                                                                                                        num_test_pts,
-                                                                                                                        idx_conv_dict,
-                                                                                                                        device)
+        test_embeds_loader, rare_val_embeds_loader, common_val_embeds_loader, stop_embeds_loader = get_test_embed_loader(embed_dim,
+                                                                                                                         embed_batch_size,
+                                                                                                                         batch_size,
+                                                                                                                         num_classes,
+                                                                                                                         num_workers,
+                                                                                                                         weights_path,
+                                                                                                                         test_dir,
+                                                                                                                         test_embeds_path,
+                                                                                                                         test_embeds_labels_path,
+                                                                                                                         test_label_file,
+                                                                                                                         class_dict,
+                                                                                                                         num_test_pts,
+                                                                                                                         idx_conv_dict,
+                                                                                                                         device,
+                                                                                                                         stop_frac)
         for init_pts_idx, num_init_pts in enumerate(init_pts):
             for imbal_idx, imbal in enumerate(imbals):
                 
@@ -890,7 +1669,11 @@ def experiment(init_pts,
                                                                                               class_dict,
                                                                                               embeds,
                                                                                               labels,
-                                                                                              device)
+                                                                                              device,
+                                                                                              stop_embeds_loader,
+                                                                                              stop_patience,
+                                                                                              time_budget,
+                                                                                              trainer)
                 
                 
                 
@@ -900,22 +1683,23 @@ def experiment(init_pts,
                     DMGT_DYN_model = load_model(model, embed_dim, num_classes, device)
                     RAND_model = load_model(model, embed_dim, num_classes, device)
                     SIEVE_model = load_model(model, embed_dim, num_classes, device)
+                    THREE_SIEVES_model = load_model(model, embed_dim, num_classes, device)
 
-                    stream_loader = DataLoader(stream_dataset,
-                                               batch_size=stream_size,
-                                               num_workers=num_workers,
-                                               shuffle=True)
+                    stream_loader = TensorLoader(stream_dataset,
+                                                 batch_size=stream_size,
+                                                 shuffle=True)
                     
                     stream_samples = enumerate(stream_loader)
                     
                     for sel_round in range(num_sel_rounds):
                         _, (stream_x, stream_y) = next(stream_samples)
                             
-                        DMGT_UNIF_model, DMGT_DYN_model, RAND_model, SIEVE_model, sizes, sum_sizes, rare_acc, all_acc, sieve_taus = update_models(
+                        DMGT_UNIF_model, DMGT_DYN_model, RAND_model, SIEVE_model, THREE_SIEVES_model, sizes, sum_sizes, rare_acc, all_acc, sieve_taus, oracle_calls, sweep_sizes, train_stats = update_models(
                                                                                                       DMGT_UNIF_model,
                                                                                                       DMGT_DYN_model,
                                                                                                       RAND_model,
                                                                                                       SIEVE_model,
+                                                                                                      THREE_SIEVES_model,
                                                                                                       rare_val_embeds_loader,
                                                                                                       common_val_embeds_loader,
                                                                                                       test_embeds_loader,
@@ -940,7 +1724,22 @@ def experiment(init_pts,
                                                                                                       device,
                                                                                                       budget,
                                                                                                       epsilon,
-                                                                                                      sieve_taus)
+                                                                                                      sieve_taus,
+                                                                                                      score_batch_size,
+                                                                                                      objective,
+                                                                                                      oracle_calls,
+                                                                                                      sweep_costs,
+                                                                                                      sweep_sizes,
+                                                                                                      patience,
+                                                                                                      trainer,
+                                                                                                      stop_embeds_loader,
+                                                                                                      stop_patience,
+                                                                                                      time_budget,
+                                                                                                      train_stats,
+                                                                                                      online_k,
+                                                                                                      online_steps,
+                                                                                                      online_lr,
+                                                                                                      skip_retrain)
                             
         torch.save(rare_acc, rare_acc_path)
         torch.save(all_acc, all_acc_path)
@@ -949,6 +1748,10 @@ def experiment(init_pts,
         torch.save(sum_sizes, sum_sizes_path)
 
         torch.save(sieve_taus, sieve_taus_path)
+        torch.save(oracle_calls, oracle_calls_path)
+        if sweep_costs is not None:
+            torch.save(sweep_sizes, sweep_sizes_path)
+        torch.save(train_stats, train_stats_path)
         
     rare_acc = torch.load(rare_acc_path)
     all_acc = torch.load(all_acc_path)
@@ -976,18 +1779,22 @@ def dataframe(data,
                                'DMGT_DYN_all_acc',
                                'RAND_all_acc',
                                'SIEVE_all_acc',
+                               'THREE_SIEVES_all_acc',
                                'DMGT_UNIF_rare_acc',
                                'DMGT_DYN_rare_acc',
                                'RAND_rare_acc',
                                'SIEVE_rare_acc',
+                               'THREE_SIEVES_rare_acc',
                                'DMGT_UNIF_rare_amnt',
                                'DMGT_DYN_rare_amnt',
                                'RAND_rare_amnt',
                                'SIEVE_rare_amnt',
+                               'THREE_SIEVES_rare_amnt',
                                'DMGT_UNIF_common_amnt',
                                'DMGT_DYN_common_amnt',
                                'RAND_common_amnt',
                                'SIEVE_common_amnt',
+                               'THREE_SIEVES_common_amnt',
                                'sum_sizes',
                                'sum_sizes_perc'])
     
@@ -1002,10 +1809,12 @@ def dataframe(data,
                                              'DMGT_DYN_all_acc':all_acc[init_pts_idx,imbal_idx,trial,:,1].squeeze(),
                                              'RAND_all_acc':all_acc[init_pts_idx,imbal_idx,trial,:,2].squeeze(),
                                              'SIEVE_all_acc':all_acc[init_pts_idx,imbal_idx,trial,:,3].squeeze(),
+                                             'THREE_SIEVES_all_acc':all_acc[init_pts_idx,imbal_idx,trial,:,4].squeeze(),
                                              'DMGT_UNIF_rare_acc':rare_acc[init_pts_idx,imbal_idx,trial,:,0].squeeze(),
                                              'DMGT_DYN_rare_acc':rare_acc[init_pts_idx,imbal_idx,trial,:,1].squeeze(),
                                              'RAND_rare_acc':rare_acc[init_pts_idx,imbal_idx,trial,:,2].squeeze(),
                                              'SIEVE_rare_acc':rare_acc[init_pts_idx,imbal_idx,trial,:,3].squeeze(),
+                                             'THREE_SIEVES_rare_acc':rare_acc[init_pts_idx,imbal_idx,trial,:,4].squeeze(),
                                              'DMGT_UNIF_rare_amnt':(torch.stack([x[:5].sum().int()
                                                  for x in sizes[init_pts_idx,imbal_idx,trial,:,0]])),
                                              'DMGT_DYN_rare_amnt':(torch.stack([x[:5].sum().int()
@@ -1014,6 +1823,8 @@ def dataframe(data,
                                                  for x in sizes[init_pts_idx,imbal_idx,trial,:,2]])),
                                              'SIEVE_rare_amnt':(torch.stack([x[:5].sum().int()
                                                  for x in sizes[init_pts_idx,imbal_idx,trial,:,3]])),
+                                             'THREE_SIEVES_rare_amnt':(torch.stack([x[:5].sum().int()
+                                                 for x in sizes[init_pts_idx,imbal_idx,trial,:,4]])),
                                              'DMGT_UNIF_common_amnt':(torch.stack([x[5:].sum().int()
                                                  for x in sizes[init_pts_idx,imbal_idx,trial,:,0]])),
                                              'DMGT_DYN_common_amnt':(torch.stack([x[5:].sum().int()
@@ -1022,22 +1833,54 @@ def dataframe(data,
                                                  for x in sizes[init_pts_idx,imbal_idx,trial,:,2]])),
                                              'SIEVE_common_amnt':(torch.stack([x[5:].sum().int()
                                                  for x in sizes[init_pts_idx,imbal_idx,trial,:,3]])),
+                                             'THREE_SIEVES_common_amnt':(torch.stack([x[5:].sum().int()
+                                                 for x in sizes[init_pts_idx,imbal_idx,trial,:,4]])),
                                              'sum_sizes':sum_sizes[init_pts_idx,imbal_idx,trial,:].squeeze().int(),
                                              'sum_sizes_perc':(sum_sizes[init_pts_idx,imbal_idx,trial,:].squeeze().int()/
                                                  (10*(num_sel_rounds+1)))}),
                                              ignore_index=True)
     return df
 
+def sweep_dataframe(sweep_sizes,
+                    init_pts,
+                    imbals,
+                    trials,
+                    num_sel_rounds,
+                    costs):
+    
+    df = pd.DataFrame(columns=['num_init_pts',
+                               'imbal',
+                               'trial',
+                               'sel_rnd',
+                               'cost',
+                               'DMGT_rare_amnt',
+                               'DMGT_common_amnt'])
+    
+    for init_pts_idx, num_init_pts in enumerate(init_pts):
+        for imbal_idx, imbal in enumerate(imbals):
+            for trial in trials:
+                for sel_rnd in range(num_sel_rounds):
+                    df = df.append(pd.DataFrame({'num_init_pts':num_init_pts*torch.ones(len(costs)),
+                                                 'imbal':imbal*torch.ones(len(costs)),
+                                                 'trial':trial*torch.ones(len(costs)),
+                                                 'sel_rnd':sel_rnd*torch.ones(len(costs)),
+                                                 'cost':torch.tensor(costs),
+                                                 'DMGT_rare_amnt':sweep_sizes[init_pts_idx,imbal_idx,trial,sel_rnd,:,:5].sum(1).int(),
+                                                 'DMGT_common_amnt':sweep_sizes[init_pts_idx,imbal_idx,trial,sel_rnd,:,5:].sum(1).int()}),
+                                                 ignore_index=True)
+    return df
+
 def balance_plot(date_time,
                  sizes,
                  num_algs,
                  num_classes,
                  num_sel_rounds,
                  unif_taus,
-                 dyn_taus):
+                 dyn_taus,
+                 objective):
 
     sizes = sizes[0,0]
-    alg_names = ['DMGT w/ Uniform Thresholds','DMGT w/ Increasing Thresholds','RAND','SIEVE']
+    alg_names = ['DMGT w/ Uniform Thresholds','DMGT w/ Increasing Thresholds','RAND','SIEVE','ThreeSieves']
     avg_sizes = sizes.mean(dim=0)
 
     rare_avg_sizes = avg_sizes[:,:,:5].mean(dim=2)
@@ -1062,16 +1905,14 @@ def balance_plot(date_time,
                      markerfacecolor='black',
                      markersize=8)
     
-    n = Symbol('n')
-    unif_balanced_size = int(np.ceil(solve(sympy.sqrt(n+1) - sympy.sqrt(n) - unif_taus[0], n)[0]))
+    unif_balanced_size = objective.balanced_size(unif_taus[0])
     sns.lineplot(x=np.arange(num_sel_rounds),
                  y=unif_balanced_size,
                  color='gray',
                  label=r'Balanced Uniform $\tau$', 
                  linestyle='--')
     
-    n = Symbol('n')
-    dyn_balanced_sizes = [int(np.ceil(solve(sympy.sqrt(n+1) - sympy.sqrt(n) - dyn_taus[i], n)[0])) for i in range(len(dyn_taus))]
+    dyn_balanced_sizes = [objective.balanced_size(dyn_taus[i]) for i in range(len(dyn_taus))]
     sns.lineplot(x=np.arange(num_sel_rounds),
                  y=dyn_balanced_sizes,
                  color='black',
@@ -1091,18 +1932,20 @@ def accuracy_plot(df, date_time, num_algs, num_sel_rounds):
     fig, ax = plt.subplots()
     sns.despine()
     
-    all_acc_data_files = ['DMGT_UNIF_all_acc','DMGT_DYN_all_acc','RAND_all_acc','SIEVE_all_acc'] 
-    rare_acc_data_files = ['DMGT_UNIF_rare_acc','DMGT_DYN_rare_acc','RAND_rare_acc','SIEVE_rare_acc']
+    all_acc_data_files = ['DMGT_UNIF_all_acc','DMGT_DYN_all_acc','RAND_all_acc','SIEVE_all_acc','THREE_SIEVES_all_acc'] 
+    rare_acc_data_files = ['DMGT_UNIF_rare_acc','DMGT_DYN_rare_acc','RAND_rare_acc','SIEVE_rare_acc','THREE_SIEVES_rare_acc']
     
     all_acc_labels = ['DMGT w/ Uniform Thresholds: all classes',
                       'DMGT w/ Increasing Thresholds: all classes',
                       'RAND: all classes',
-                      'SIEVE: all classes']
+                      'SIEVE: all classes',
+                      'ThreeSieves: all classes']
     
     rare_acc_labels = ['DMGT w/ Uniform Thresholds: rare classes',
                        'DMGT w/ Increasing Thresholds: rare classes',
                        'RAND: rare classes',
-                       'SIEVE: rare classes']
+                       'SIEVE: rare classes',
+                       'ThreeSieves: rare classes']
 
     for i in range(num_algs):
         sns.lineplot(data=df[['sel_rnd', all_acc_data_files[i]]],
@@ -1140,7 +1983,8 @@ def tau_lineplot(df,
                  trial,
                  costs,
                  sel_rnd,
-                 num_classes):
+                 num_classes,
+                 objective):
     
     fig, ax = plt.subplots()
     
@@ -1164,9 +2008,7 @@ def tau_lineplot(df,
                  y='DMGT_rare_amnt',
                  color='orange')
 
-    n = Symbol('n')
-    
-    ideal_sizes = np.asarray(list(map(lambda cost: int((num_classes/2)*np.ceil(solve(sympy.sqrt(n+1) - sympy.sqrt(n) - cost, n)[0])), costs)))
+    ideal_sizes = np.asarray(list(map(lambda cost: int((num_classes/2)*objective.balanced_size(cost)), costs)))
     
     sns.lineplot(x=costs,
                  y=ideal_sizes,
@@ -1176,7 +2018,7 @@ def tau_lineplot(df,
     plot.set(xlabel='Treshold values', ylabel='Sizes of labeled rare and common sets')
     plot.legend(labels=['common', 'rare', 'ideal'], bbox_to_anchor=(0.7,0.3), prop={'size':8})
     
-    fig.savefig(img_dir + date_time + f'_tau_lineplot.pdf', bbox_inches = "tight")
+    fig.savefig(img_dir + date_time + '_tau_lineplot.pdf', bbox_inches = "tight")
 
 #def extract_data(orig_dir, data_dir):
 #    for root, dirs, _ in os.walk(orig_dir):
@@ -1192,7 +2034,7 @@ parser.add_argument('--unif_taus', nargs='+', type=float, default=6*[0.1])
 parser.add_argument('--dyn_taus', nargs='+', type=float, default=[0.1,0.1,0.13,0.13,0.15,0.15])
 parser.add_argument('--trials', nargs='+', type=int, default=np.arange(5))
 parser.add_argument('--num_sel_rounds', type=int, default=6)
-parser.add_argument('--num_algs', type=int, default=4)
+parser.add_argument('--num_algs', type=int, default=5)
 parser.add_argument('--stream_size', type=int, default=500)
 parser.add_argument('--num_test_pts', type=int, default=500)
 parser.add_argument('--num_epochs', type=int, default=200)
@@ -1211,6 +2053,19 @@ parser.add_argument('--test_label_file', type=str, default='/home/eecs/.../IMNET
 parser.add_argument('--seed', type=int, default=0)
 parser.add_argument('--budget', type=int, default=250)
 parser.add_argument('--epsilon', type=float, default=0.1)
+parser.add_argument('--patience', type=int, default=50)
+parser.add_argument('--trainer', type=str, default='sgd', choices=['sgd', 'lbfgs', 'stacked'])
+parser.add_argument('--stop_patience', type=int, default=0)
+parser.add_argument('--stop_frac', type=float, default=0.2)
+parser.add_argument('--time_budget', type=float, default=0.)
+parser.add_argument('--online_k', type=int, default=0)
+parser.add_argument('--online_steps', type=int, default=1)
+parser.add_argument('--online_lr', type=float, default=0.01)
+parser.add_argument('--skip_retrain', action='store_true')
+parser.add_argument('--objective', type=str, default='sqrt', choices=list(objectives.keys()))
+parser.add_argument('--objective_param', type=float, default=None)
+parser.add_argument('--score_batch_size', type=int, default=500)
+parser.add_argument('--sweep_costs', nargs='+', type=float, default=None)
 
 if __name__ == "__main__":
     
@@ -1258,6 +2113,20 @@ if __name__ == "__main__":
     # min and max thresholds from sieve algorithm
     sieve_taus_path=val_dir + 'sieve_taus.pkl'
     
+    # scored and bound-skipped stream items, and peak stored selections, per selection track
+    oracle_calls_path=val_dir + 'oracle_calls.pkl'
+    
+    # DMGT class sizes over a sweep of thresholds, selected in one pass per round
+    sweep_sizes_path=val_dir + 'sweep_sizes.pkl'
+    
+    # epochs each track trained for per round, and why it stopped
+    train_stats_path=val_dir + 'train_stats.pkl'
+    
+    objective = Objective(args.objective, args.budget, args.objective_param)
+    
+    # the calibration halves are only split when early stopping is on
+    stop_frac = args.stop_frac if args.stop_patience > 0 else 0.
+    
     input_args = [args.init_pts,
                   args.imbals,
                   args.unif_taus,
@@ -1294,7 +2163,22 @@ if __name__ == "__main__":
                   device,
                   args.budget,
                   args.epsilon,
-                  sieve_taus_path]
+                  sieve_taus_path,
+                  args.score_batch_size,
+                  objective,
+                  oracle_calls_path,
+                  args.sweep_costs,
+                  sweep_sizes_path,
+                  args.patience,
+                  args.trainer,
+                  stop_frac,
+                  args.stop_patience,
+                  args.time_budget,
+                  train_stats_path,
+                  args.online_k,
+                  args.online_steps,
+                  args.online_lr,
+                  args.skip_retrain]
     
     rare_acc, all_acc, sizes, sum_sizes, sieve_taus = experiment(*input_args)
     df = dataframe(experiment(*input_args),
@@ -1303,5 +2187,15 @@ if __name__ == "__main__":
                    args.trials,
                    args.num_sel_rounds)
     
-    balance_plot(date_time,sizes,args.num_algs,args.num_classes,args.num_sel_rounds,args.unif_taus,args.dyn_taus)
+    balance_plot(date_time,sizes,args.num_algs,args.num_classes,args.num_sel_rounds,args.unif_taus,args.dyn_taus,objective)
     accuracy_plot(df,date_time,args.num_algs,args.num_sel_rounds)
+    
+    if args.sweep_costs is not None:
+        sweep_df = sweep_dataframe(torch.load(sweep_sizes_path),
+                                   args.init_pts,
+                                   args.imbals,
+                                   args.trials,
+                                   args.num_sel_rounds,
+                                   args.sweep_costs)
+        
+        tau_lineplot(sweep_df,args.init_pts[0],args.imbals[0],args.trials[0],args.sweep_costs,0,args.num_classes,objective)
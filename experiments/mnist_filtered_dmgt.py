@@ -1,4 +1,5 @@
 import torch 
+import torch.multiprocessing as mp
 import pdb
 from torch import nn, optim
 from torch.utils.data import DataLoader, TensorDataset, Subset, random_split
@@ -18,11 +19,9 @@ import os
 from os.path import exists as file_exists
 import seaborn as sns
 import pandas as pd
-import sympy
-from sympy.solvers import solve 
-from sympy import Symbol 
 import argparse
 from datetime import datetime
+import time
 from sklearn.isotonic import IsotonicRegression
 
 now = datetime.now()    
@@ -36,35 +35,208 @@ class MnistResNet(ResNet):
             stride=2, 
             padding=3, bias=False)
 
-def class_card(prev_labels,
-               x,
-               num_classes,
-               model,
-               is_isoreg,
-               rare_isoreg,
-               common_isoreg,
-               device):
+def class_probs(x,
+                num_classes,
+                model,
+                is_isoreg,
+                rare_isoreg,
+                common_isoreg,
+                device):
     
     model.eval()
-    logits = model(x.unsqueeze(0).to(device))
+    with torch.no_grad():
+        logits = model(x.to(device))
     softmax = nn.functional.softmax(logits, dim=1)
-    top_score = softmax.max(1).values
-    pred = softmax.max(1).indices
+    
+    top_scores, preds = softmax.max(1)
     
     if is_isoreg:
-        if pred < 5:
-            cal_top_score = rare_isoreg.predict(top_score.cpu().detach().numpy())
-        else:
-            cal_top_score = common_isoreg.predict(top_score.cpu().detach().numpy())
+        cal_top_scores = torch.where(preds < 5, rare_isoreg(top_scores), common_isoreg(top_scores))
+        
+        # class_card's arithmetic row by row: the float32 mass off the top class sets the factor, and a row with a top score
+        # of 1 is zeroed, since class_card's factor of 0 kept it float32 and its calibrated top score went into a discarded copy
+        renorm_factors = torch.where(top_scores < 1, (1 - cal_top_scores)/(softmax.sum(1) - top_scores), torch.zeros_like(cal_top_scores))
+        softmax = renorm_factors.unsqueeze(1)*softmax
+        softmax[torch.arange(len(x), device=device), preds] = torch.where(top_scores < 1, cal_top_scores, torch.zeros_like(cal_top_scores))
+    
+    return softmax.double().cpu()
+
+class StreamProbs:
+    def __init__(self,
+                 stream_x,
+                 num_classes,
+                 model,
+                 is_isoreg,
+                 rare_isoreg,
+                 common_isoreg,
+                 device,
+                 score_batch_size,
+                 cached_probs=None):
+        
+        self.stream_x = stream_x
+        self.score_batch_size = score_batch_size
+        self.score = lambda x: class_probs(x, num_classes, model, is_isoreg, rare_isoreg, common_isoreg, device)
+        
+        # probabilities shipped with the items are used as they are, so such a stream is never scored
+        self.cached_probs = cached_probs
+        self.start = 0
+        self.probs = torch.empty(0)
+        self.calls = 0
+        self.saved = 0
+    
+    def __getitem__(self, i):
+        self.calls += 1
+        if self.cached_probs is not None:
+            return self.cached_probs[i]
+        
+        # chunks are scored lazily from the first item whose decision is not forced by the count bounds
+        if not self.start <= i < self.start + len(self.probs):
+            self.start = i
+            self.probs = self.score(self.stream_x[i:i+self.score_batch_size])
+        return self.probs[i - self.start]
+    
+    def at(self, idxs):
+        # the selected items are scored in one pass, which covers those whose decisions were forced by the count bounds
+        return self.cached_probs[idxs] if self.cached_probs is not None else self.score(self.stream_x[idxs])
+
+objectives = {'sqrt': lambda n, param: torch.sqrt(n),
+              'log1p': lambda n, param: torch.log1p(n),
+              'capped_linear': lambda n, param: torch.clamp(n, max=param),
+              'power': lambda n, param: torch.pow(n, param)}
+
+class Objective:
+    def __init__(self, name, budget, param=None):
+        if name in ['capped_linear', 'power'] and param is None:
+            raise ValueError(f'objective {name} needs --objective_param')
+        
+        # outside (0, 1] the power objective is not concave, so its increments would not shrink
+        if name == 'power' and not 0 < param <= 1:
+            raise ValueError(f'objective power needs --objective_param in (0, 1], got {param}')
+        
+        n = torch.arange(budget+2, dtype=torch.double)
+        vals = objectives[name](n, param)
+        
+        self.name = name
+        self.inc = lambda n: (objectives[name](torch.tensor(n + 1., dtype=torch.double), param) - objectives[name](torch.tensor(float(n), dtype=torch.double), param)).item()
+        self.vals = vals[:-1]
+        self.incs = vals[1:] - vals[:-1]
+    
+    def balanced_size(self, tau):
+        # the size at which a class's increment drops to tau; the table only runs to the budget, so past it the first
+        # such size is found by doubling and then bisecting over the (non-increasing) increments
+        if self.incs[-1] <= tau:
+            return int((self.incs > tau).sum())
+        lo, hi = len(self.incs) - 1, 2*len(self.incs)
+        while self.inc(hi) > tau:
+            lo, hi = hi, 2*hi
+        while hi - lo > 1:
+            mid = (lo + hi)//2
+            lo, hi = (mid, hi) if self.inc(mid) > tau else (lo, mid)
+        return hi
+
+class SelectionState:
+    def __init__(self, num_classes, objective, is_isoreg):
+        self.counts = torch.zeros(num_classes, dtype=torch.long)
+        self.size = 0
+        
+        # calibrated rows do not keep a unit mass (rows with a top score of 1 are zeroed, and float32 renormalization can leave
+        # the rest slightly above 1), so they are never forced in and are only forced out below a padded mass
+        self.convex = not is_isoreg
+        self.max_mass = 1. if self.convex else 1.01
+        
+        self.vals = objective.vals
+        self.incs = objective.incs
+        
+        self.cur_vals = self.vals[self.counts]
+        self.cur_incs = self.incs[self.counts]
+    
+    def add(self, y):
+        y = int(y)
+        self.counts[y] += 1
+        self.size += 1
+        self.cur_vals[y] = self.vals[self.counts[y]]
+        self.cur_incs[y] = self.incs[self.counts[y]]
+    
+    def gain(self, softmax):
+        return softmax @ self.cur_incs
+    
+    def value(self, softmax=None):
+        return self.cur_vals.sum() if softmax is None else softmax @ self.cur_vals
+    
+    def forced(self, threshold, budget, weights=None):
+        # softmax @ weights is a convex combination, so it is decided without scoring once threshold is outside their range
+        weights = self.cur_incs if weights is None else weights
+        if self.size >= budget or weights.max()*self.max_mass < threshold:
+            return False
+        if self.convex and weights.min() >= threshold:
+            return True
+        return None
+
+class SelectionStates:
+    def __init__(self, num_states, num_classes, objective, is_isoreg):
+        self.counts = torch.zeros(num_states, num_classes, dtype=torch.long)
+        self.sizes = torch.zeros(num_states, dtype=torch.long)
+        self.convex = not is_isoreg
+        self.max_mass = 1. if self.convex else 1.01
+        
+        self.vals = objective.vals
+        self.incs = objective.incs
+        
+        self.cur_vals = self.vals[self.counts]
+        self.cur_incs = self.incs[self.counts]
+    
+    def add(self, y, mask=None):
+        # y is one label for every masked state, or one label per state
+        mask = torch.ones_like(self.sizes, dtype=torch.bool) if mask is None else mask
+        states = mask.nonzero().view(-1)
+        y = torch.as_tensor(y).long().expand(len(self.sizes))[states]
+        self.counts[states, y] += 1
+        self.sizes += mask
+        self.cur_vals[states, y] = self.vals[self.counts[states, y]]
+        self.cur_incs[states, y] = self.incs[self.counts[states, y]]
+    
+    def gains(self, softmax):
+        return self.cur_incs @ softmax
+    
+    def values(self, softmax=None):
+        return self.cur_vals.sum(1) if softmax is None else self.cur_vals @ softmax
+    
+    def forced(self, thresholds, budget, weights=None):
+        weights = self.cur_incs if weights is None else weights
+        reject = (self.sizes >= budget) | (weights.max(1).values*self.max_mass < thresholds)
+        accept = ~reject & self.convex & (weights.min(1).values >= thresholds)
+        return accept, reject
+    
+    def keep(self, mask):
+        self.counts = self.counts[mask]
+        self.sizes = self.sizes[mask]
+        self.cur_vals = self.cur_vals[mask]
+        self.cur_incs = self.cur_incs[mask]
+
+class SelectedBuffer:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.x = None
+        self.y = None
+        self.size = 0
+    
+    def extend(self, x, y):
+        # storage is allocated once the item shape is known and kept across clears
+        if self.x is None:
+            self.x = torch.empty((self.capacity,) + tuple(x.shape[1:]), dtype=x.dtype)
+            self.y = torch.empty(self.capacity, dtype=y.dtype)
+        self.x[self.size:self.size+len(x)] = x
+        self.y[self.size:self.size+len(y)] = y
+        self.size += len(x)
+    
+    def append(self, x, y):
+        self.extend(x.unsqueeze(0), y.unsqueeze(0))
     
-        renorm_factor = (1 - torch.from_numpy(cal_top_score).to(device))/(softmax.sum() - top_score) if top_score < 1 else 0
-        softmax = torch.mul(renorm_factor*torch.ones(num_classes).to(device), softmax)
-        softmax.squeeze().double()[pred] = torch.from_numpy(cal_top_score).to(device)
+    def clear(self):
+        self.size = 0
     
-    softmax = softmax.squeeze()
-    label_counts = [(prev_labels==i).float().sum() for i in range(num_classes)]
-     
-    return sum([softmax[i] * np.sqrt(label_counts[i] + 1) for i in range(num_classes)]), sum([softmax[i] * np.sqrt(label_counts[i]) for i in range(num_classes)])
+    def view(self):
+        return self.x[:self.size], self.y[:self.size]
 
 def get_DIST_DMGT_subsets(stream_x,
                           stream_y,
@@ -76,26 +248,48 @@ def get_DIST_DMGT_subsets(stream_x,
                           rare_isoreg,
                           common_isoreg,
                           device,
-                          budget):
+                          budget,
+                          score_batch_size,
+                          objective,
+                          oracle_calls,
+                          cached_probs=None):
     
-    DIST_DMGT_x = stream_x[0].unsqueeze(0)
-    DIST_DMGT_y = stream_y[0].unsqueeze(0)
+    DIST_DMGT_buffer = SelectedBuffer(budget)
+    DIST_DMGT_buffer.append(stream_x[0], stream_y[0])
+    sel_idxs = [0]
     
-    for i in range(1, len(stream_x)):
-        f_values =  class_card(DIST_DMGT_y,
-                               stream_x[i],
+    DIST_DMGT_state = SelectionState(num_classes, objective, is_isoreg)
+    DIST_DMGT_state.add(stream_y[0])
+    
+    stream_probs = StreamProbs(stream_x,
                                num_classes,
                                DIST_DMGT_model,
                                is_isoreg,
                                rare_isoreg,
                                common_isoreg,
-                               device)
-        
-        if f_values[0] - f_values[1] >= taus[sel_round] and len(DIST_DMGT_x) < budget:
-            DIST_DMGT_x = torch.cat((DIST_DMGT_x, stream_x[i].unsqueeze(0)))
-            DIST_DMGT_y = torch.cat((DIST_DMGT_y, stream_y[i].unsqueeze(0)))
+                               device,
+                               score_batch_size,
+                               cached_probs)
     
-    return DIST_DMGT_x, DIST_DMGT_y
+    for i in range(1, len(stream_x)):
+        decided = DIST_DMGT_state.forced(taus[sel_round], budget)
+        if decided is None:
+            decided = bool(DIST_DMGT_state.gain(stream_probs[i]) >= taus[sel_round])
+        else:
+            stream_probs.saved += 1
+        if decided:
+            DIST_DMGT_buffer.append(stream_x[i], stream_y[i])
+            sel_idxs += [i]
+            DIST_DMGT_state.add(stream_y[i])
+    
+    oracle_calls += torch.tensor([stream_probs.calls, stream_probs.saved, DIST_DMGT_state.size])
+    
+    DIST_DMGT_x, DIST_DMGT_y = DIST_DMGT_buffer.view()
+    sel_idxs = torch.tensor(sel_idxs)
+    
+    # the calibrated probabilities travel with the selection, so the next filter does not score it again,
+    # and its stream positions are what the index encoding sends
+    return DIST_DMGT_x, DIST_DMGT_y, stream_probs.at(sel_idxs), sel_idxs
 
 def get_SIEVE_subsets(stream_x,
                       stream_y,
@@ -106,71 +300,188 @@ def get_SIEVE_subsets(stream_x,
                       common_isoreg,
                       device,
                       budget,
-                      epsilon):
+                      epsilon,
+                      score_batch_size,
+                      objective,
+                      oracle_calls):
 
     SIEVE_x = stream_x[0].unsqueeze(0)
     SIEVE_y = stream_y[0].unsqueeze(0)
     
-    init_x = SIEVE_x[0]
     init_y = SIEVE_y[0]
 
-    m = 1
+    m = objective.incs[0].item()
     epsilon = 0.1
     j = 1
     O = []
     while (1+epsilon)**j >= m and (1+epsilon)**j <= 2*m*len(stream_x):
         O += [(1+epsilon)**j]
         j += 1
-    set_dict = {}
-    taus = torch.Tensor().to(device)
+    O = torch.tensor(O, dtype=torch.double)
+    
+    SIEVE_states = SelectionStates(len(O), num_classes, objective, is_isoreg)
+    SIEVE_states.add(init_y)
+    sieve_idxs = torch.zeros(len(O), budget, dtype=torch.int32)
+    taus = torch.full((len(O), len(stream_x)-2), np.nan, dtype=torch.double)
+    
+    stream_probs = StreamProbs(stream_x,
+                               num_classes,
+                               SIEVE_model,
+                               is_isoreg,
+                               rare_isoreg,
+                               common_isoreg,
+                               device,
+                               score_batch_size)
+    
+    # the second item only opens the sieves, as in the original per-threshold loop
+    for i in range(2, len(stream_x)):
+        remaining = budget - SIEVE_states.sizes
+        accept, reject = SIEVE_states.forced(O/2, budget, SIEVE_states.cur_incs*remaining.unsqueeze(1) + SIEVE_states.cur_vals)
+        undecided = ~(accept | reject)
+        if undecided.any():
+            probs = stream_probs[i]
+            taus[:,i-2] = (O/2 - SIEVE_states.values(probs))/remaining
+            accept |= undecided & (SIEVE_states.gains(probs) >= taus[:,i-2])
+        else:
+            stream_probs.saved += 1
+        sieve_idxs[accept, SIEVE_states.sizes[accept]] = i
+        SIEVE_states.add(stream_y[i], accept)
+
+    oracle_calls += torch.tensor([stream_probs.calls, stream_probs.saved, int(SIEVE_states.sizes.sum())])
+    
+    max_idx = int(SIEVE_states.values().argmax())
+    sel_idxs = sieve_idxs[max_idx,:SIEVE_states.sizes[max_idx]].long()
+    SIEVE_x = stream_x[sel_idxs]
+    SIEVE_y = stream_y[sel_idxs]
+    sel_taus = taus[max_idx]
+    SIEVE_min_max_taus = torch.tensor([np.nanmin(sel_taus.numpy()),np.nanmax(sel_taus.numpy())])
+    
+    return SIEVE_x, SIEVE_y, SIEVE_min_max_taus, sel_idxs
+
+def get_THREE_SIEVES_subsets(stream_x,
+                             stream_y,
+                             THREE_SIEVES_model,
+                             num_classes,
+                             is_isoreg,
+                             rare_isoreg,
+                             common_isoreg,
+                             device,
+                             budget,
+                             epsilon,
+                             patience,
+                             score_batch_size,
+                             objective,
+                             oracle_calls):
+
+    init_y = stream_y[0]
+    
+    # a single sieve walks down the thresholds, so only one selection of at most budget items is stored
+    m = objective.incs[0].item()
+    j = int(np.ceil(np.log(m)/np.log(1+epsilon)))
+    O = []
+    while (1+epsilon)**j <= budget*m:
+        O += [(1+epsilon)**j]
+        j += 1
+    O = O[::-1]
+    
+    THREE_SIEVES_state = SelectionState(num_classes, objective, is_isoreg)
+    THREE_SIEVES_state.add(init_y)
+    sel_idxs = [0]
+    v_idx = 0
+    t = 0
+    
+    stream_probs = StreamProbs(stream_x,
+                               num_classes,
+                               THREE_SIEVES_model,
+                               is_isoreg,
+                               rare_isoreg,
+                               common_isoreg,
+                               device,
+                               score_batch_size)
+    
     for i in range(1, len(stream_x)):
-        new_taus = torch.Tensor().to(device)
-        for idx,v in enumerate(O):
-            if v not in list(set_dict.keys()):
-                set_dict[v] = [(init_x,init_y)]
-                taus = torch.cat((taus,torch.tensor([[v]]).to(device)))
+        remaining = budget - THREE_SIEVES_state.size
+        decided = THREE_SIEVES_state.forced(O[v_idx]/2, budget, THREE_SIEVES_state.cur_incs*remaining + THREE_SIEVES_state.cur_vals)
+        if decided is None:
+            probs = stream_probs[i]
+            decided = bool(THREE_SIEVES_state.gain(probs) >= (O[v_idx]/2 - THREE_SIEVES_state.value(probs))/remaining)
+        else:
+            stream_probs.saved += 1
+        if decided:
+            sel_idxs += [i]
+            THREE_SIEVES_state.add(stream_y[i])
+            t = 0
+        else:
+            t += 1
+            # lower the threshold after patience consecutive rejections
+            if t >= patience and v_idx < len(O)-1:
+                v_idx += 1
+                t = 0
+    
+    oracle_calls += torch.tensor([stream_probs.calls, stream_probs.saved, THREE_SIEVES_state.size])
+    
+    THREE_SIEVES_x = stream_x[sel_idxs]
+    THREE_SIEVES_y = stream_y[sel_idxs]
+    return THREE_SIEVES_x, THREE_SIEVES_y, torch.tensor(sel_idxs)
+
+class TensorLoader():
+    
+    def __init__(self,
+                 dataset,
+                 batch_size,
+                 shuffle=False):
+        
+        # Subset views, random_split's included, collapse to one index tensor into the backing TensorDataset
+        self.dataset = dataset
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.idxs = None
+        while isinstance(dataset, Subset):
+            idxs = torch.as_tensor(dataset.indices, dtype=torch.long)
+            self.idxs = idxs if self.idxs is None else idxs[self.idxs]
+            dataset = dataset.dataset
+        self.tensors = dataset.tensors
+    
+    def __len__(self):
+        return -(-len(self.dataset) // self.batch_size)
+    
+    def __iter__(self):
+        
+        # the permutation comes from the global generator, so a seeded run draws the same batches
+        idxs = torch.randperm(len(self.dataset)) if self.shuffle else None
+        if self.idxs is not None:
+            idxs = self.idxs if idxs is None else self.idxs[idxs]
+        
+        for start in range(0, len(self.dataset), self.batch_size):
+            if idxs is None:
+                yield tuple(tensor[start:start+self.batch_size] for tensor in self.tensors)
             else:
-                f_values = class_card(torch.tensor(list(zip(*set_dict[v]))[1]),
-                                      stream_x[i],
-                                      num_classes,
-                                      SIEVE_model,
-                                      is_isoreg,
-                                      rare_isoreg,
-                                      common_isoreg,
-                                      device)
-                tau = (v/2 - f_values[1])/(budget - len(set_dict[v]))
-                new_taus = torch.cat((new_taus,torch.tensor([tau]).to(device)))
-                if f_values[0] - f_values[1] >= tau and len(set_dict[v]) < budget:
-                    set_dict[v] += [(stream_x[i],stream_y[i])]
-        if len(new_taus) > 0:
-            taus = torch.cat((taus, new_taus.unsqueeze(1)),dim=1) 
-
-    max_value = -np.inf
-    max_key = None
-    max_idx = 0
-    for idx,key in enumerate(list(set_dict.keys())):
-        label_counts = [(torch.tensor(list(zip(*set_dict[key]))[1])==i).float().sum() for i in range(num_classes)]
-        if sum([np.sqrt(label_counts[i]) for i in range(num_classes)]) > max_value:
-            max_key = key
-            max_idx = idx
-            max_value = sum([np.sqrt(label_counts[i]) for i in range(num_classes)])
-    SIEVE_x = torch.stack(list(zip(*set_dict[max_key]))[0])
-    SIEVE_y = torch.stack(list(zip(*set_dict[max_key]))[1])
-    sel_taus = taus[max_idx][1:]
-    SIEVE_min_max_taus = torch.tensor([sel_taus.min(),sel_taus.max()])
-    
-    return SIEVE_x, SIEVE_y, SIEVE_min_max_taus
+                yield tuple(tensor[idxs[start:start+self.batch_size]] for tensor in self.tensors)
 
 def train(device,
           num_epochs,
           train_loader,
-          model):
+          model,
+          stop_loader,
+          stop_patience,
+          time_budget,
+          train_stats):
     
     model = model.to(device)
     
     optimizer = optim.SGD(model.parameters(), lr=0.001, momentum=0.9, weight_decay=0.0005)
     criterion = nn.CrossEntropyLoss()
     
+    # a held-out loss that stops improving first cuts the learning rate, then ends training after stop_patience epochs
+    scheduler = optim.lr_scheduler.ReduceLROnPlateau(optimizer, factor=0.1, patience=stop_patience//2) if stop_patience > 0 else None
+    best_loss, best_state, bad_epochs = float('inf'), None, 0
+    
+    # stop reasons: 0 epoch cap, 1 train accuracy, 2 held-out patience, 3 time budget
+    stop_reason = 0
+    start = time.time()
+    
+    # a run of zero epochs reports zero epochs trained
+    epoch = -1
     for epoch in range(num_epochs):
         
         train_loss = 0.0
@@ -199,8 +510,31 @@ def train(device,
             ))
    
         if train_acc >= 0.99:
+            stop_reason = 1
+            break
+        
+        if stop_patience > 0:
+            stop_loss = calc_loss(model, stop_loader)
+            scheduler.step(stop_loss)
+            if stop_loss < best_loss:
+                best_loss, best_state, bad_epochs = stop_loss, {name: param.clone() for name, param in model.state_dict().items()}, 0
+            else:
+                bad_epochs += 1
+            if bad_epochs >= stop_patience:
+                stop_reason = 2
+                break
+        
+        if time_budget > 0 and time.time() - start >= time_budget:
+            stop_reason = 3
             break
     
+    # unless the selection was fit, the weights with the best held-out loss are kept
+    if best_state is not None and stop_reason != 1:
+        model.load_state_dict(best_state)
+    
+    if train_stats is not None:
+        train_stats[0], train_stats[1] = epoch + 1, stop_reason
+    
     return model
 
 def load_model(model, device):
@@ -234,6 +568,21 @@ def calc_acc(model,
     
     return rare_acc.float().mean().unsqueeze(0), all_acc.float().mean().unsqueeze(0)
 
+def calc_loss(model,
+              val_loader):
+
+    model.eval()
+    
+    criterion = nn.CrossEntropyLoss(reduction='sum')
+    val_loss = 0.0
+    
+    for val_x, val_y in val_loader:
+        val_x, val_y = val_x.to(device), val_y.to(device)
+        with torch.no_grad():
+            val_loss += criterion(model(val_x), val_y.long()).item()
+    
+    return val_loss/len(val_loader.dataset)
+
 def calc_cal_acc(is_isoreg,
                  rare_isoreg,
                  common_isoreg,
@@ -292,6 +641,26 @@ def calc_cal_acc(is_isoreg,
     
     return cal_rare_acc, cal_common_acc, cal_all_acc
 
+class IsoTable:
+    def __init__(self, isoreg):
+        # piecewise-linear knots of the fitted isotonic regression; a single knot is repeated so every score has a segment
+        self.xs = torch.from_numpy(np.repeat(isoreg.X_thresholds_, 2) if len(isoreg.X_thresholds_) == 1 else isoreg.X_thresholds_).double()
+        self.ys = torch.from_numpy(np.repeat(isoreg.y_thresholds_, 2) if len(isoreg.y_thresholds_) == 1 else isoreg.y_thresholds_).double()
+    
+    def __call__(self, scores):
+        if self.xs.device != scores.device:
+            self.xs, self.ys = self.xs.to(scores.device), self.ys.to(scores.device)
+        
+        scores = scores.double().clamp(self.xs[0], self.xs[-1])
+        idxs = torch.searchsorted(self.xs, scores, right=True).clamp(1, len(self.xs) - 1)
+        x0, x1, y0, y1 = self.xs[idxs-1], self.xs[idxs], self.ys[idxs-1], self.ys[idxs]
+        
+        weights = torch.where(x1 > x0, (scores - x0)/(x1 - x0), torch.zeros_like(scores))
+        return y0 + weights*(y1 - y0)
+    
+    def predict(self, scores):
+        return self(torch.from_numpy(np.ravel(scores))).cpu().numpy()
+
 def train_isoreg(model, val_loader):
     model.eval()
 
@@ -313,7 +682,7 @@ def train_isoreg(model, val_loader):
     preds_correct = torch.cat(preds_correct, dim=0)
     
     IsoReg = IsotonicRegression(y_min=0, y_max=1, increasing=True, out_of_bounds='clip').fit(top_scores.cpu(), preds_correct.cpu())
-    return IsoReg 
+    return IsoTable(IsoReg) 
 
 def get_datasets(num_init_pts,
                  imbal,
@@ -349,7 +718,8 @@ def get_val_loaders(dataset_name,
                     num_test_pts,
                     batch_size,
                     num_workers,
-                    num_classes):
+                    num_classes,
+                    stop_frac):
 
     transform = Compose([Resize((224, 224)), 
                          ToTensor(), 
@@ -366,6 +736,10 @@ def get_val_loaders(dataset_name,
     test_rare_idxs, val_rare_idxs = rare_idxs[:int(len(rare_idxs)/2)], rare_idxs[int(len(rare_idxs)/2):]
     test_common_idxs, val_common_idxs = common_idxs[:int(len(common_idxs)/2)], common_idxs[int(len(common_idxs)/2):]
     
+    # a stop_frac slice of each calibration half is held out of the isoregs for early stopping
+    stop_rare_idxs, val_rare_idxs = val_rare_idxs[:int(stop_frac*len(val_rare_idxs))], val_rare_idxs[int(stop_frac*len(val_rare_idxs)):]
+    stop_common_idxs, val_common_idxs = val_common_idxs[:int(stop_frac*len(val_common_idxs))], val_common_idxs[int(stop_frac*len(val_common_idxs)):]
+    
     test_loader = DataLoader(Subset(mnist_test, torch.cat((test_rare_idxs, test_common_idxs))),
                              batch_size=batch_size,
                              num_workers=num_workers,
@@ -381,12 +755,174 @@ def get_val_loaders(dataset_name,
                                    num_workers=num_workers,
                                    shuffle=True)
     
-    val_loader = DataLoader(Subset(mnist_test, torch.cat((val_rare_idxs, val_common_idxs))),
-                            batch_size=batch_size,
-                            num_workers=num_workers,
-                            shuffle=True)
+    stop_loader = DataLoader(Subset(mnist_test, torch.cat((stop_rare_idxs, stop_common_idxs))),
+                             batch_size=batch_size,
+                             num_workers=num_workers)
+
+    return test_loader, rare_val_loader, common_val_loader, stop_loader
+
+def tree_levels(num_sets, fanout):
+    levels = 1
+    while fanout > 1 and num_sets > fanout:
+        num_sets = int(np.ceil(num_sets/fanout))
+        levels += 1
+    return levels
+
+def tree_aggregate(sets,
+                   buffer,
+                   fanout,
+                   select,
+                   select_args,
+                   tree_stats):
 
-    return test_loader, rare_val_loader, common_val_loader, val_loader
+    level = 0
+    
+    # aggregators re-filter groups of fanout candidate sets until a single group is left for the root
+    while True:
+        is_root = fanout < 2 or len(sets) <= fanout
+        groups = [sets] if is_root else [sets[i:i+fanout] for i in range(0, len(sets), fanout)]
+        next_sets = []
+        
+        for group in groups:
+            buffer.clear()
+            for x, y, *_ in group:
+                buffer.extend(x, y)
+            
+            # probabilities cached with every candidate of the group stand in for scoring the group again
+            cached_probs = (torch.cat([candidates[2] for candidates in group]),) if all(len(candidates) > 2 for candidates in group) else ()
+            
+            start = time.time()
+            selection = select(*buffer.view(), *select_args, *cached_probs)
+            
+            # aggregators on a level run side by side, so the level takes as long as its slowest one
+            tree_stats[level,0] = max(tree_stats[level,0], time.time() - start)
+            tree_stats[level,1] += buffer.size
+            tree_stats[level,2] += len(selection[0])
+            next_sets += [selection[:3] if cached_probs else selection[:2]]
+        
+        if is_root:
+            return selection
+        
+        sets = next_sets
+        level += 1
+
+def encode_payload(x, y, idxs, encoding):
+    if encoding == 'index':
+        return idxs.int()
+    if encoding == 'fp16':
+        return x.half(), y
+    if encoding == 'int8':
+        scale = x.flatten(1).abs().amax(1).clamp(min=1e-12)/127
+        return (x/scale.view(-1, *[1]*(x.dim()-1))).round().to(torch.int8), scale, y
+    return x, y
+
+def decode_payload(payload, store_x, store_y, encoding):
+    if encoding == 'index':
+        return store_x[payload.long()], store_y[payload.long()]
+    if encoding == 'fp16':
+        x, y = payload
+        return x.float(), y
+    if encoding == 'int8':
+        x, scale, y = payload
+        return x.float()*scale.view(-1, *[1]*(x.dim()-1)), y
+    return payload
+
+def payload_bytes(payload):
+    if isinstance(payload, torch.Tensor):
+        return payload.numel()*payload.element_size()
+    return sum(payload_bytes(part) for part in payload)
+
+def select_agent(agent_stream_x,
+                 agent_stream_y,
+                 unif_taus,
+                 dyn_taus,
+                 sel_round,
+                 DIST_DMGT_UNIF_model,
+                 DIST_DMGT_DYN_model,
+                 SIEVE_model,
+                 THREE_SIEVES_model,
+                 num_classes,
+                 is_isoreg,
+                 rare_DIST_DMGT_UNIF_isoreg,
+                 common_DIST_DMGT_UNIF_isoreg,
+                 rare_DIST_DMGT_DYN_isoreg,
+                 common_DIST_DMGT_DYN_isoreg,
+                 rare_SIEVE_isoreg,
+                 common_SIEVE_isoreg,
+                 rare_THREE_SIEVES_isoreg,
+                 common_THREE_SIEVES_isoreg,
+                 device,
+                 budget,
+                 epsilon,
+                 patience,
+                 score_batch_size,
+                 objective,
+                 encoding,
+                 model_version):
+
+    agent_oracle_calls = torch.zeros(4,3)
+    
+    agent_DIST_DMGT_UNIF_x, agent_DIST_DMGT_UNIF_y, agent_DIST_DMGT_UNIF_probs, agent_DIST_DMGT_UNIF_idxs = get_DIST_DMGT_subsets(agent_stream_x,
+                                                                                                                        agent_stream_y,
+                                                                                                                        unif_taus,
+                                                                                                                        sel_round,
+                                                                                                                        DIST_DMGT_UNIF_model,
+                                                                                                                        num_classes,
+                                                                                                                        is_isoreg,
+                                                                                                                        rare_DIST_DMGT_UNIF_isoreg,
+                                                                                                                        common_DIST_DMGT_UNIF_isoreg,
+                                                                                                                        device,
+                                                                                                                        budget,
+                                                                                                                        score_batch_size,
+                                                                                                                        objective,
+                                                                                                                        agent_oracle_calls[0])
+    
+    agent_DIST_DMGT_DYN_x, agent_DIST_DMGT_DYN_y, agent_DIST_DMGT_DYN_probs, agent_DIST_DMGT_DYN_idxs = get_DIST_DMGT_subsets(agent_stream_x,
+                                                                                                                      agent_stream_y,
+                                                                                                                      dyn_taus,
+                                                                                                                      sel_round,
+                                                                                                                      DIST_DMGT_DYN_model,
+                                                                                                                      num_classes,
+                                                                                                                      is_isoreg,
+                                                                                                                      rare_DIST_DMGT_DYN_isoreg,
+                                                                                                                      common_DIST_DMGT_DYN_isoreg,
+                                                                                                                      device,
+                                                                                                                      budget,
+                                                                                                                      score_batch_size,
+                                                                                                                      objective,
+                                                                                                                      agent_oracle_calls[1])
+    
+    agent_SIEVE_x, agent_SIEVE_y, _, agent_SIEVE_idxs = get_SIEVE_subsets(agent_stream_x,
+                                                                          agent_stream_y,
+                                                                          SIEVE_model,
+                                                                          num_classes,
+                                                                          is_isoreg,
+                                                                          rare_SIEVE_isoreg,
+                                                                          common_SIEVE_isoreg,
+                                                                          device,
+                                                                          budget,
+                                                                          epsilon,
+                                                                          score_batch_size,
+                                                                          objective,
+                                                                          agent_oracle_calls[2])
+    
+    agent_THREE_SIEVES_x, agent_THREE_SIEVES_y, agent_THREE_SIEVES_idxs = get_THREE_SIEVES_subsets(agent_stream_x,
+                                                                                                   agent_stream_y,
+                                                                                                   THREE_SIEVES_model,
+                                                                                                   num_classes,
+                                                                                                   is_isoreg,
+                                                                                                   rare_THREE_SIEVES_isoreg,
+                                                                                                   common_THREE_SIEVES_isoreg,
+                                                                                                   device,
+                                                                                                   budget,
+                                                                                                   epsilon,
+                                                                                                   patience,
+                                                                                                   score_batch_size,
+                                                                                                   objective,
+                                                                                                   agent_oracle_calls[3])
+    
+    # the center decodes every track payload against its own copy of the agent stream
+    return encode_payload(agent_DIST_DMGT_UNIF_x, agent_DIST_DMGT_UNIF_y, agent_DIST_DMGT_UNIF_idxs, encoding), agent_DIST_DMGT_UNIF_probs, encode_payload(agent_DIST_DMGT_DYN_x, agent_DIST_DMGT_DYN_y, agent_DIST_DMGT_DYN_idxs, encoding), agent_DIST_DMGT_DYN_probs, encode_payload(agent_SIEVE_x, agent_SIEVE_y, agent_SIEVE_idxs, encoding), encode_payload(agent_THREE_SIEVES_x, agent_THREE_SIEVES_y, agent_THREE_SIEVES_idxs, encoding), torch.tensor(model_version), agent_oracle_calls
 
 def experiment(num_init_pts,
                imbals,
@@ -413,7 +949,20 @@ def experiment(num_init_pts,
                device,
                budget,
                epsilon,
-               sieve_taus_path):
+               sieve_taus_path,
+               score_batch_size,
+               objective,
+               oracle_calls_path,
+               patience,
+               num_procs,
+               fanout,
+               tree_stats_path,
+               encoding,
+               comm_bytes_path,
+               stop_frac,
+               stop_patience,
+               time_budget,
+               train_stats_path):
     
     if not file_exists(rare_acc_path):
         
@@ -424,12 +973,17 @@ def experiment(num_init_pts,
         sum_sizes=torch.zeros(len(trials),num_sel_rounds+1,1)
         
         sieve_taus=torch.zeros(len(trials),num_sel_rounds,2)
-
-        test_loader, rare_val_loader, common_val_loader, val_loader = get_val_loaders(dataset_name,
-                                                                                      num_test_pts,
-                                                                                      batch_size,
-                                                                                      num_workers,
-                                                                                      num_classes)
+        oracle_calls=torch.zeros(len(trials),num_sel_rounds,4,3)
+        comm_bytes=torch.zeros(len(trials),num_sel_rounds,num_agents)
+        tree_stats=torch.zeros(len(trials),num_sel_rounds,4,tree_levels(num_agents, fanout),3)
+        train_stats=torch.zeros(len(trials),num_sel_rounds,5,2)
+
+        test_loader, rare_val_loader, common_val_loader, stop_loader = get_val_loaders(dataset_name,
+                                                                                       num_test_pts,
+                                                                                       batch_size,
+                                                                                       num_workers,
+                                                                                       num_classes,
+                                                                                       stop_frac)
         
         init_x = torch.empty(0)
         init_y = torch.empty(0)
@@ -457,16 +1011,16 @@ def experiment(num_init_pts,
             stream_datasets_dict[agent] = agent_stream_dataset
         
         sizes[:,0] = (torch.stack((torch.tensor([(init_y==i).float().sum() for i in range(num_classes)]),
+                                   torch.tensor([(init_y==i).float().sum() for i in range(num_classes)]),
                                    torch.tensor([(init_y==i).float().sum() for i in range(num_classes)]),
                                    torch.tensor([(init_y==i).float().sum() for i in range(num_classes)]),
                                    torch.tensor([(init_y==i).float().sum() for i in range(num_classes)]))))
                 
         sum_sizes[:,0] = len(init_x)
                     
-        init_loader = DataLoader(TensorDataset(init_x, init_y),
-                                 batch_size=batch_size,
-                                 num_workers=num_workers,
-                                 shuffle=True)
+        init_loader = TensorLoader(TensorDataset(init_x, init_y),
+                                   batch_size=batch_size,
+                                   shuffle=True)
 
         model = MnistResNet()
         
@@ -478,7 +1032,11 @@ def experiment(num_init_pts,
             model = train(device,
                           num_epochs,
                           init_loader,
-                          model)
+                          model,
+                          stop_loader,
+                          stop_patience,
+                          time_budget,
+                          None)
 
             torch.save(model.state_dict(), model_path)
             
@@ -488,10 +1046,13 @@ def experiment(num_init_pts,
         common_DIST_DMGT_DYN_isoreg = train_isoreg(model, common_val_loader) if is_isoreg else None
         rare_SIEVE_isoreg = train_isoreg(model, rare_val_loader) if is_isoreg else None
         common_SIEVE_isoreg = train_isoreg(model, common_val_loader) if is_isoreg else None
+        rare_THREE_SIEVES_isoreg = train_isoreg(model, rare_val_loader) if is_isoreg else None
+        common_THREE_SIEVES_isoreg = train_isoreg(model, common_val_loader) if is_isoreg else None
         
         rare_acc[:,0] = (
 
             torch.cat((calc_acc(model, test_loader, num_classes)[0], 
+                       calc_acc(model, test_loader, num_classes)[0],
                        calc_acc(model, test_loader, num_classes)[0],
                        calc_acc(model, test_loader, num_classes)[0],
                        calc_acc(model, test_loader, num_classes)[0])))
@@ -499,16 +1060,27 @@ def experiment(num_init_pts,
         all_acc[:,0] = (
                 
             torch.cat((calc_acc(model, test_loader, num_classes)[1],
+                       calc_acc(model, test_loader, num_classes)[1],
                        calc_acc(model, test_loader, num_classes)[1],
                        calc_acc(model, test_loader, num_classes)[1],
                        calc_acc(model, test_loader, num_classes)[1])))
         
+        DIST_DMGT_UNIF_buffer = SelectedBuffer(budget*num_agents)
+        DIST_DMGT_DYN_buffer = SelectedBuffer(budget*num_agents)
+        SIEVE_buffer = SelectedBuffer(budget*num_agents)
+        THREE_SIEVES_buffer = SelectedBuffer(budget*num_agents)
+        stream_buffer = SelectedBuffer(stream_size*num_agents)
+        
+        # embeddings, stream batches and model weights sent to the pool are moved to shared memory by torch.multiprocessing
+        pool = mp.get_context('spawn').Pool(num_procs, initializer=torch.set_num_threads, initargs=(1,)) if num_procs > 1 else None
+        
         for trial in trials: 
             
             DIST_DMGT_UNIF_model = load_model(model, device)
             DIST_DMGT_DYN_model = load_model(model, device)
             RAND_model = load_model(model, device)
             SIEVE_model = load_model(model, device)
+            THREE_SIEVES_model = load_model(model, device)
             
             stream_loaders_dict = {agent: DataLoader(stream_datasets_dict[agent],
                                                      batch_size=stream_size,
@@ -517,100 +1089,144 @@ def experiment(num_init_pts,
 
             stream_samples_dict = {agent: enumerate(stream_loaders_dict[agent]) for agent in range(num_agents)}
             
+            # bumped each time the models and their isotonic regressions are retrained, and shipped with every agent's candidates
+            model_version = 0
+            
             for sel_round in range(num_sel_rounds):
                 
-                DIST_DMGT_UNIF_x = torch.empty(0)
-                DIST_DMGT_UNIF_y = torch.empty(0)
-                DIST_DMGT_DYN_x = torch.empty(0)
-                DIST_DMGT_DYN_y = torch.empty(0)
-                SIEVE_x = torch.empty(0)
-                SIEVE_y = torch.empty(0)
+                DIST_DMGT_UNIF_sets = []
+                DIST_DMGT_DYN_sets = []
+                SIEVE_sets = []
+                THREE_SIEVES_sets = []
                 
-                stream_x = torch.empty(0)
-                stream_y = torch.empty(0)
+                stream_buffer.clear()
 
+                agent_args = []
                 for agent in range(num_agents):
                     
                     _, (agent_stream_x, agent_stream_y) = next(stream_samples_dict[agent])
-
-                    agent_DIST_DMGT_UNIF_x, agent_DIST_DMGT_UNIF_y = get_DIST_DMGT_subsets(agent_stream_x,
-                                                                                 agent_stream_y,
-                                                                                 unif_taus,
-                                                                                 sel_round,
-                                                                                 DIST_DMGT_UNIF_model,
-                                                                                 num_classes,
-                                                                                 is_isoreg,
-                                                                                 rare_DIST_DMGT_UNIF_isoreg,
-                                                                                 common_DIST_DMGT_UNIF_isoreg,
-                                                                                 device,
-                                                                                 budget)
-                        
-                    agent_DIST_DMGT_DYN_x, agent_DIST_DMGT_DYN_y = get_DIST_DMGT_subsets(agent_stream_x,
-                                                                                 agent_stream_y,
-                                                                                 dyn_taus,
-                                                                                 sel_round,
-                                                                                 DIST_DMGT_DYN_model,
-                                                                                 num_classes,
-                                                                                 is_isoreg,
-                                                                                 rare_DIST_DMGT_DYN_isoreg,
-                                                                                 common_DIST_DMGT_DYN_isoreg,
-                                                                                 device,
-                                                                                 budget)
+                    stream_buffer.extend(agent_stream_x, agent_stream_y)
                     
-                    agent_SIEVE_x, agent_SIEVE_y, _ = get_SIEVE_subsets(agent_stream_x,
-                                                                        agent_stream_y,
-                                                                        SIEVE_model,
-                                                                        num_classes,
-                                                                        is_isoreg,
-                                                                        rare_SIEVE_isoreg,
-                                                                        common_SIEVE_isoreg,
-                                                                        device,
-                                                                        budget,
-                                                                        epsilon)
-
-                    DIST_DMGT_UNIF_x = torch.cat((DIST_DMGT_UNIF_x, agent_DIST_DMGT_UNIF_x))                
-                    DIST_DMGT_UNIF_y = torch.cat((DIST_DMGT_UNIF_y, agent_DIST_DMGT_UNIF_y))
-                    DIST_DMGT_DYN_x = torch.cat((DIST_DMGT_DYN_x, agent_DIST_DMGT_DYN_x))                
-                    DIST_DMGT_DYN_y = torch.cat((DIST_DMGT_DYN_y, agent_DIST_DMGT_DYN_y))
-                    SIEVE_x = torch.cat((SIEVE_x, agent_SIEVE_x))                
-                    SIEVE_y = torch.cat((SIEVE_y, agent_SIEVE_y))
-                    stream_x = torch.cat((stream_x, agent_stream_x))
-                    stream_y = torch.cat((stream_y, agent_stream_y))
-
-                cent_DIST_DMGT_UNIF_x, cent_DIST_DMGT_UNIF_y = get_DIST_DMGT_subsets(DIST_DMGT_UNIF_x,
-                                                                           DIST_DMGT_UNIF_y,
-                                                                           unif_taus,
-                                                                           sel_round,
-                                                                           DIST_DMGT_UNIF_model,
-                                                                           num_classes,
-                                                                           is_isoreg,
-                                                                           rare_DIST_DMGT_UNIF_isoreg,
-                                                                           common_DIST_DMGT_UNIF_isoreg,
-                                                                           device,
-                                                                           budget)
+                    agent_args += [(agent_stream_x,
+                                    agent_stream_y,
+                                    unif_taus,
+                                    dyn_taus,
+                                    sel_round,
+                                    DIST_DMGT_UNIF_model,
+                                    DIST_DMGT_DYN_model,
+                                    SIEVE_model,
+                                    THREE_SIEVES_model,
+                                    num_classes,
+                                    is_isoreg,
+                                    rare_DIST_DMGT_UNIF_isoreg,
+                                    common_DIST_DMGT_UNIF_isoreg,
+                                    rare_DIST_DMGT_DYN_isoreg,
+                                    common_DIST_DMGT_DYN_isoreg,
+                                    rare_SIEVE_isoreg,
+                                    common_SIEVE_isoreg,
+                                    rare_THREE_SIEVES_isoreg,
+                                    common_THREE_SIEVES_isoreg,
+                                    device,
+                                    budget,
+                                    epsilon,
+                                    patience,
+                                    score_batch_size,
+                                    objective,
+                                    encoding,
+                                    model_version)]
+                
+                # agents run concurrently when there is a pool, and starmap returns their selections in agent order
+                agent_selections = pool.starmap(select_agent, agent_args) if pool is not None else [select_agent(*agent_arg) for agent_arg in agent_args]
+                
+                for agent, agent_selection in enumerate(agent_selections):
+                    agent_DIST_DMGT_UNIF_payload, agent_DIST_DMGT_UNIF_probs, agent_DIST_DMGT_DYN_payload, agent_DIST_DMGT_DYN_probs, agent_SIEVE_payload, agent_THREE_SIEVES_payload, agent_model_version, agent_oracle_calls = agent_selection
+                    agent_stream_x, agent_stream_y = agent_args[agent][:2]
+                    # the model version and oracle-call stats are bookkeeping, so only the selected data and its probabilities are counted
+                    comm_bytes[trial,sel_round,agent] = payload_bytes(agent_selection[:-2])
+                    
+                    # cached probabilities are only used for candidates selected with the center's current models
+                    if agent_model_version == model_version:
+                        DIST_DMGT_UNIF_sets += [decode_payload(agent_DIST_DMGT_UNIF_payload, agent_stream_x, agent_stream_y, encoding) + (agent_DIST_DMGT_UNIF_probs,)]
+                        DIST_DMGT_DYN_sets += [decode_payload(agent_DIST_DMGT_DYN_payload, agent_stream_x, agent_stream_y, encoding) + (agent_DIST_DMGT_DYN_probs,)]
+                    else:
+                        DIST_DMGT_UNIF_sets += [decode_payload(agent_DIST_DMGT_UNIF_payload, agent_stream_x, agent_stream_y, encoding)]
+                        DIST_DMGT_DYN_sets += [decode_payload(agent_DIST_DMGT_DYN_payload, agent_stream_x, agent_stream_y, encoding)]
+                    SIEVE_sets += [decode_payload(agent_SIEVE_payload, agent_stream_x, agent_stream_y, encoding)]
+                    THREE_SIEVES_sets += [decode_payload(agent_THREE_SIEVES_payload, agent_stream_x, agent_stream_y, encoding)]
+                    oracle_calls[trial,sel_round] += agent_oracle_calls
+                
+                stream_x, stream_y = stream_buffer.view()
+
+                cent_DIST_DMGT_UNIF_x, cent_DIST_DMGT_UNIF_y, _, _ = tree_aggregate(DIST_DMGT_UNIF_sets,
+                                                                                    DIST_DMGT_UNIF_buffer,
+                                                                                    fanout,
+                                                                                    get_DIST_DMGT_subsets,
+                                                                                    (unif_taus,
+                                                                                     sel_round,
+                                                                                     DIST_DMGT_UNIF_model,
+                                                                                     num_classes,
+                                                                                     is_isoreg,
+                                                                                     rare_DIST_DMGT_UNIF_isoreg,
+                                                                                     common_DIST_DMGT_UNIF_isoreg,
+                                                                                     device,
+                                                                                     budget,
+                                                                                     score_batch_size,
+                                                                                     objective,
+                                                                                     oracle_calls[trial,sel_round,0]),
+                                                                                    tree_stats[trial,sel_round,0])
+                
+                cent_DIST_DMGT_DYN_x, cent_DIST_DMGT_DYN_y, _, _ = tree_aggregate(DIST_DMGT_DYN_sets,
+                                                                                  DIST_DMGT_DYN_buffer,
+                                                                                  fanout,
+                                                                                  get_DIST_DMGT_subsets,
+                                                                                  (dyn_taus,
+                                                                                   sel_round,
+                                                                                   DIST_DMGT_DYN_model,
+                                                                                   num_classes,
+                                                                                   is_isoreg,
+                                                                                   rare_DIST_DMGT_DYN_isoreg,
+                                                                                   common_DIST_DMGT_DYN_isoreg,
+                                                                                   device,
+                                                                                   budget,
+                                                                                   score_batch_size,
+                                                                                   objective,
+                                                                                   oracle_calls[trial,sel_round,1]),
+                                                                                  tree_stats[trial,sel_round,1])
+
+                cent_SIEVE_x, cent_SIEVE_y, cent_min_max_taus, _ = tree_aggregate(SIEVE_sets,
+                                                                                  SIEVE_buffer,
+                                                                                  fanout,
+                                                                                  get_SIEVE_subsets,
+                                                                                  (SIEVE_model,
+                                                                                   num_classes,
+                                                                                   is_isoreg,
+                                                                                   rare_SIEVE_isoreg,
+                                                                                   common_SIEVE_isoreg,
+                                                                                   device,
+                                                                                   budget,
+                                                                                   epsilon,
+                                                                                   score_batch_size,
+                                                                                   objective,
+                                                                                   oracle_calls[trial,sel_round,2]),
+                                                                                  tree_stats[trial,sel_round,2])
                 
-                cent_DIST_DMGT_DYN_x, cent_DIST_DMGT_DYN_y = get_DIST_DMGT_subsets(DIST_DMGT_DYN_x,
-                                                                           DIST_DMGT_DYN_y,
-                                                                           dyn_taus,
-                                                                           sel_round,
-                                                                           DIST_DMGT_DYN_model,
-                                                                           num_classes,
-                                                                           is_isoreg,
-                                                                           rare_DIST_DMGT_DYN_isoreg,
-                                                                           common_DIST_DMGT_DYN_isoreg,
-                                                                           device,
-                                                                           budget)
-
-                cent_SIEVE_x, cent_SIEVE_y, cent_min_max_taus = get_SIEVE_subsets(SIEVE_x,
-                                                                                  SIEVE_y,
-                                                                                  SIEVE_model,
-                                                                                  num_classes,
-                                                                                  is_isoreg,
-                                                                                  rare_SIEVE_isoreg,
-                                                                                  common_SIEVE_isoreg,
-                                                                                  device,
-                                                                                  budget,
-                                                                                  epsilon)
+                cent_THREE_SIEVES_x, cent_THREE_SIEVES_y, _ = tree_aggregate(THREE_SIEVES_sets,
+                                                                             THREE_SIEVES_buffer,
+                                                                             fanout,
+                                                                             get_THREE_SIEVES_subsets,
+                                                                             (THREE_SIEVES_model,
+                                                                              num_classes,
+                                                                              is_isoreg,
+                                                                              rare_THREE_SIEVES_isoreg,
+                                                                              common_THREE_SIEVES_isoreg,
+                                                                              device,
+                                                                              budget,
+                                                                              epsilon,
+                                                                              patience,
+                                                                              score_batch_size,
+                                                                              objective,
+                                                                              oracle_calls[trial,sel_round,3]),
+                                                                             tree_stats[trial,sel_round,3])
 
                 rand_idxs = torch.randperm(len(stream_x))[:budget]
                 cent_RAND_x = stream_x[rand_idxs]
@@ -623,42 +1239,66 @@ def experiment(num_init_pts,
                       torch.stack((torch.tensor([(cent_DIST_DMGT_UNIF_y==i).float().sum() for i in range(num_classes)]),
                                    torch.tensor([(cent_DIST_DMGT_DYN_y==i).float().sum() for i in range(num_classes)]),
                                    torch.tensor([(cent_RAND_y==i).float().sum() for i in range(num_classes)]),
-                                   torch.tensor([(cent_RAND_y==i).float().sum() for i in range(num_classes)]))))
+                                   torch.tensor([(cent_SIEVE_y==i).float().sum() for i in range(num_classes)]),
+                                   torch.tensor([(cent_THREE_SIEVES_y==i).float().sum() for i in range(num_classes)]))))
                       
                 sum_sizes[trial,sel_round+1] = (
                           torch.tensor([sum_sizes[trial,sel_round] + len(cent_DIST_DMGT_UNIF_y)]))
 
                 DIST_DMGT_UNIF_model = train(device,
                                         num_epochs,
-                                        DataLoader(TensorDataset(cent_DIST_DMGT_UNIF_x, cent_DIST_DMGT_UNIF_y),
-                                                   batch_size=batch_size,
-                                                   num_workers=num_workers,
-                                                   shuffle=True),
-                                        DIST_DMGT_UNIF_model)
+                                        TensorLoader(TensorDataset(cent_DIST_DMGT_UNIF_x, cent_DIST_DMGT_UNIF_y),
+                                                     batch_size=batch_size,
+                                                     shuffle=True),
+                                        DIST_DMGT_UNIF_model,
+                                        stop_loader,
+                                        stop_patience,
+                                        time_budget,
+                                        train_stats[trial,sel_round,0])
                 
                 DIST_DMGT_DYN_model = train(device,
                                         num_epochs,
-                                        DataLoader(TensorDataset(cent_DIST_DMGT_DYN_x, cent_DIST_DMGT_DYN_y),
-                                                   batch_size=batch_size,
-                                                   num_workers=num_workers,
-                                                   shuffle=True),
-                                        DIST_DMGT_DYN_model)
+                                        TensorLoader(TensorDataset(cent_DIST_DMGT_DYN_x, cent_DIST_DMGT_DYN_y),
+                                                     batch_size=batch_size,
+                                                     shuffle=True),
+                                        DIST_DMGT_DYN_model,
+                                        stop_loader,
+                                        stop_patience,
+                                        time_budget,
+                                        train_stats[trial,sel_round,1])
                 
                 RAND_model = train(device,
                                    num_epochs,
-                                   DataLoader(TensorDataset(cent_RAND_x, cent_RAND_y),
-                                              batch_size=batch_size,
-                                              num_workers=num_workers,
-                                              shuffle=True),
-                                   RAND_model)
+                                   TensorLoader(TensorDataset(cent_RAND_x, cent_RAND_y),
+                                                batch_size=batch_size,
+                                                shuffle=True),
+                                   RAND_model,
+                                   stop_loader,
+                                   stop_patience,
+                                   time_budget,
+                                   train_stats[trial,sel_round,2])
                             
                 SIEVE_model = train(device,
                                     num_epochs,
-                                    DataLoader(TensorDataset(cent_SIEVE_x, cent_SIEVE_y),
-                                               batch_size=batch_size,
-                                               num_workers=num_workers,
-                                               shuffle=True),
-                                    SIEVE_model)
+                                    TensorLoader(TensorDataset(cent_SIEVE_x, cent_SIEVE_y),
+                                                 batch_size=batch_size,
+                                                 shuffle=True),
+                                    SIEVE_model,
+                                    stop_loader,
+                                    stop_patience,
+                                    time_budget,
+                                    train_stats[trial,sel_round,3])
+                
+                THREE_SIEVES_model = train(device,
+                                           num_epochs,
+                                           TensorLoader(TensorDataset(cent_THREE_SIEVES_x, cent_THREE_SIEVES_y),
+                                                        batch_size=batch_size,
+                                                        shuffle=True),
+                                           THREE_SIEVES_model,
+                                           stop_loader,
+                                           stop_patience,
+                                           time_budget,
+                                           train_stats[trial,sel_round,4])
 
                 rare_DIST_DMGT_UNIF_isoreg = train_isoreg(DIST_DMGT_UNIF_model, rare_val_loader) if is_isoreg else None
                 common_DIST_DMGT_UNIF_isoreg = train_isoreg(DIST_DMGT_UNIF_model, common_val_loader) if is_isoreg else None
@@ -666,18 +1306,26 @@ def experiment(num_init_pts,
                 common_DIST_DMGT_DYN_isoreg = train_isoreg(DIST_DMGT_DYN_model, common_val_loader) if is_isoreg else None
                 rare_SIEVE_isoreg = train_isoreg(SIEVE_model, rare_val_loader) if is_isoreg else None
                 common_SIEVE_isoreg = train_isoreg(SIEVE_model, common_val_loader) if is_isoreg else None
+                rare_THREE_SIEVES_isoreg = train_isoreg(THREE_SIEVES_model, rare_val_loader) if is_isoreg else None
+                common_THREE_SIEVES_isoreg = train_isoreg(THREE_SIEVES_model, common_val_loader) if is_isoreg else None
+                model_version += 1
         
                 rare_acc[trial,sel_round+1] = (
                          torch.cat((calc_acc(DIST_DMGT_UNIF_model, test_loader, num_classes)[0], 
                                     calc_acc(DIST_DMGT_DYN_model, test_loader, num_classes)[0],
                                     calc_acc(RAND_model, test_loader, num_classes)[0],
-                                    calc_acc(SIEVE_model, test_loader, num_classes)[0])))
+                                    calc_acc(SIEVE_model, test_loader, num_classes)[0],
+                                    calc_acc(THREE_SIEVES_model, test_loader, num_classes)[0])))
                 
                 all_acc[trial,sel_round+1] = (
                         torch.cat((calc_acc(DIST_DMGT_UNIF_model, test_loader, num_classes)[1],
                                    calc_acc(DIST_DMGT_DYN_model, test_loader, num_classes)[1],
                                    calc_acc(RAND_model, test_loader, num_classes)[1],
-                                   calc_acc(SIEVE_model, test_loader, num_classes)[1])))
+                                   calc_acc(SIEVE_model, test_loader, num_classes)[1],
+                                   calc_acc(THREE_SIEVES_model, test_loader, num_classes)[1])))
+
+        if pool is not None:
+            pool.close()
 
         torch.save(rare_acc, rare_acc_path)
         torch.save(all_acc, all_acc_path)
@@ -686,6 +1334,10 @@ def experiment(num_init_pts,
         torch.save(sum_sizes, sum_sizes_path)
         
         torch.save(sieve_taus, sieve_taus_path)
+        torch.save(oracle_calls, oracle_calls_path)
+        torch.save(comm_bytes, comm_bytes_path)
+        torch.save(tree_stats, tree_stats_path)
+        torch.save(train_stats, train_stats_path)
 
     rare_acc = torch.load(rare_acc_path)
     all_acc = torch.load(all_acc_path)
@@ -709,18 +1361,22 @@ def dataframe(data,
                                'DIST_DMGT_DYN_all_acc',
                                'RAND_all_acc',
                                'SIEVE_all_acc',
+                               'THREE_SIEVES_all_acc',
                                'DIST_DMGT_UNIF_rare_acc',
                                'DIST_DMGT_DYN_rare_acc',
                                'RAND_rare_acc',
                                'SIEVE_rare_acc',
+                               'THREE_SIEVES_rare_acc',
                                'DIST_DMGT_UNIF_rare_amnt',
                                'DIST_DMGT_DYN_rare_amnt',
                                'RAND_rare_amnt',
                                'SIEVE_rare_amnt',
+                               'THREE_SIEVES_rare_amnt',
                                'DIST_DMGT_UNIF_common_amnt',
                                'DIST_DMGT_DYN_common_amnt',
                                'RAND_common_amnt',
                                'SIEVE_common_amnt',
+                               'THREE_SIEVES_common_amnt',
                                'sum_sizes',
                                'sum_sizes_perc'])
     
@@ -731,18 +1387,22 @@ def dataframe(data,
                                      'DIST_DMGT_DYN_all_acc':all_acc[trial,:,1].squeeze(),
                                      'RAND_all_acc':all_acc[trial,:,2].squeeze(),
                                      'SIEVE_all_acc':all_acc[trial,:,3].squeeze(),
+                                     'THREE_SIEVES_all_acc':all_acc[trial,:,4].squeeze(),
                                      'DIST_DMGT_UNIF_rare_acc':rare_acc[trial,:,0].squeeze(),
                                      'DIST_DMGT_DYN_rare_acc':rare_acc[trial,:,1].squeeze(),
                                      'RAND_rare_acc':rare_acc[trial,:,2].squeeze(),
                                      'SIEVE_rare_acc':rare_acc[trial,:,3].squeeze(),
+                                     'THREE_SIEVES_rare_acc':rare_acc[trial,:,4].squeeze(),
                                      'DIST_DMGT_UNIF_rare_amnt':(torch.stack([x[:5].sum().int() for x in sizes[trial,:,0]])),
                                      'DIST_DMGT_DYN_rare_amnt':(torch.stack([x[:5].sum().int() for x in sizes[trial,:,1]])),
                                      'RAND_rare_amnt':(torch.stack([x[:5].sum().int() for x in sizes[trial,:,2]])),
                                      'SIEVE_rare_amnt':(torch.stack([x[:5].sum().int() for x in sizes[trial,:,3]])),
+                                     'THREE_SIEVES_rare_amnt':(torch.stack([x[:5].sum().int() for x in sizes[trial,:,4]])),
                                      'DIST_DMGT_UNIF_common_amnt':(torch.stack([x[5:].sum().int() for x in sizes[trial,:,0]])),
                                      'DIST_DMGT_DYN_common_amnt':(torch.stack([x[5:].sum().int() for x in sizes[trial,:,1]])),
                                      'RAND_common_amnt':(torch.stack([x[5:].sum().int() for x in sizes[trial,:,2]])),
                                      'SIEVE_common_amnt':(torch.stack([x[5:].sum().int() for x in sizes[trial,:,3]])),
+                                     'THREE_SIEVES_common_amnt':(torch.stack([x[5:].sum().int() for x in sizes[trial,:,4]])),
                                      'sum_sizes':sum_sizes[trial].squeeze().int(),
                                      'sum_sizes_perc':(sum_sizes[trial].squeeze().int()/(30*(num_sel_rounds+1)))}),
                                      ignore_index=True)
@@ -754,18 +1414,20 @@ def accuracy_plot(df, date_time, num_algs, num_sel_rounds):
     fig, ax = plt.subplots()
     sns.despine()
     
-    all_acc_data_files = ['DIST_DMGT_UNIF_all_acc','DIST_DMGT_DYN_all_acc','RAND_all_acc','SIEVE_all_acc'] 
-    rare_acc_data_files = ['DIST_DMGT_UNIF_rare_acc','DIST_DMGT_DYN_rare_acc','RAND_rare_acc','SIEVE_rare_acc']
+    all_acc_data_files = ['DIST_DMGT_UNIF_all_acc','DIST_DMGT_DYN_all_acc','RAND_all_acc','SIEVE_all_acc','THREE_SIEVES_all_acc'] 
+    rare_acc_data_files = ['DIST_DMGT_UNIF_rare_acc','DIST_DMGT_DYN_rare_acc','RAND_rare_acc','SIEVE_rare_acc','THREE_SIEVES_rare_acc']
     
     all_acc_labels = ['Filt. Dist. DMGT w/ Uniform Thresholds: all classes',
                       'Filt. Dist. DMGT w/ Increasing Thresholds: all classes',
                       'RAND: all classes',
-                      'SIEVE: all classes']
+                      'SIEVE: all classes',
+                      'ThreeSieves: all classes']
     
     rare_acc_labels = ['Filt. Dist. DMGT w/ Uniform Thresholds: rare classes',
                        'Filt. Dist. DMGT w/ Increasing Thresholds: rare classes',
                        'RAND: rare classes',
-                       'SIEVE: rare classes']
+                       'SIEVE: rare classes',
+                       'ThreeSieves: rare classes']
 
     for i in range(num_algs):
         sns.lineplot(data=df[['sel_rnd', all_acc_data_files[i]]],
@@ -797,8 +1459,8 @@ def accuracy_plot(df, date_time, num_algs, num_sel_rounds):
     fig.tight_layout()
     fig.savefig(img_dir + date_time + '_accuracy.pdf')
 
-def balance_plot(date_time,sizes,num_algs,num_classes,num_sel_rounds,unif_taus,dyn_taus):
-    alg_names = ['Filt. Dist. DMGT w/ Uniform Thresholds','Filt. Dist. DMGT w/ Increasing Thresholds','RAND','SIEVE']
+def balance_plot(date_time,sizes,num_algs,num_classes,num_sel_rounds,unif_taus,dyn_taus,objective):
+    alg_names = ['Filt. Dist. DMGT w/ Uniform Thresholds','Filt. Dist. DMGT w/ Increasing Thresholds','RAND','SIEVE','ThreeSieves']
     avg_sizes = sizes.mean(dim=0)
     non_cum_sizes = torch.zeros(num_algs, num_classes, num_sel_rounds)
     for i in range(num_algs):
@@ -830,16 +1492,14 @@ def balance_plot(date_time,sizes,num_algs,num_classes,num_sel_rounds,unif_taus,d
                      markerfacecolor='black',
                      markersize=8)
     
-    n = Symbol('n')
-    unif_balanced_size = int(np.ceil(solve(sympy.sqrt(n+1) - sympy.sqrt(n) - unif_taus[0], n)[0]))
+    unif_balanced_size = objective.balanced_size(unif_taus[0])
     sns.lineplot(x=np.arange(num_sel_rounds),
                  y=unif_balanced_size,
                  color='gray',
                  label=r'Balanced Uniform $\tau$', 
                  linestyle='--')
     
-    n = Symbol('n')
-    dyn_balanced_sizes = [int(np.ceil(solve(sympy.sqrt(n+1) - sympy.sqrt(n) - dyn_taus[i], n)[0])) for i in range(len(dyn_taus))]
+    dyn_balanced_sizes = [objective.balanced_size(dyn_taus[i]) for i in range(len(dyn_taus))]
     sns.lineplot(x=np.arange(num_sel_rounds),
                  y=dyn_balanced_sizes,
                  color='black',
@@ -861,7 +1521,7 @@ parser.add_argument('--dyn_taus', nargs='+', type=float, default=[0.1,0.1,0.13,0
 parser.add_argument('--num_agents', type=int, default=3)
 parser.add_argument('--trials', nargs='+', type=int, default=np.arange(3))
 parser.add_argument('--num_sel_rounds', type=int, default=8)
-parser.add_argument('--num_algs', type=int, default=4)
+parser.add_argument('--num_algs', type=int, default=5)
 parser.add_argument('--stream_size', type=int, default=500)
 parser.add_argument('--num_test_pts', type=int, default=5000)
 parser.add_argument('--num_epochs', type=int, default=200)
@@ -874,6 +1534,16 @@ parser.add_argument('--is_isoreg', type=bool, default=True)
 parser.add_argument('--seed', type=int, default=0)
 parser.add_argument('--budget', type=int, default=250)
 parser.add_argument('--epsilon', type=float, default=0.1)
+parser.add_argument('--patience', type=int, default=50)
+parser.add_argument('--num_procs', type=int, default=1)
+parser.add_argument('--fanout', type=int, default=0)
+parser.add_argument('--encoding', type=str, default='full', choices=['full', 'fp16', 'int8', 'index'])
+parser.add_argument('--stop_patience', type=int, default=0)
+parser.add_argument('--stop_frac', type=float, default=0.2)
+parser.add_argument('--time_budget', type=float, default=0.)
+parser.add_argument('--objective', type=str, default='sqrt', choices=list(objectives.keys()))
+parser.add_argument('--objective_param', type=float, default=None)
+parser.add_argument('--score_batch_size', type=int, default=100)
 
 if __name__ == "__main__":
     
@@ -906,7 +1576,24 @@ if __name__ == "__main__":
     
     # min and max thresholds from sieve algorithm
     sieve_taus_path=val_dir + 'sieve_taus.pkl'
+    
+    # scored and bound-skipped stream items, and peak stored selections, per selection track
+    oracle_calls_path=val_dir + 'oracle_calls.pkl'
+    
+    # bytes each agent sends to the center per selection round
+    comm_bytes_path=val_dir + 'comm_bytes.pkl'
+    
+    # slowest aggregator seconds, items in and items out per tree level, per filtered track
+    tree_stats_path=val_dir + 'tree_stats.pkl'
+    
+    # epochs each track trained for per round, and why it stopped
+    train_stats_path=val_dir + 'train_stats.pkl'
 
+    objective = Objective(args.objective, args.budget, args.objective_param)
+    
+    # the calibration halves are only split when early stopping is on
+    stop_frac = args.stop_frac if args.stop_patience > 0 else 0.
+    
     # class mat path
     input_args = [args.init_pts[0],
                   args.imbals,
@@ -933,7 +1620,20 @@ if __name__ == "__main__":
                   device,
                   args.budget,
                   args.epsilon,
-                  sieve_taus_path]
+                  sieve_taus_path,
+                  args.score_batch_size,
+                  objective,
+                  oracle_calls_path,
+                  args.patience,
+                  args.num_procs,
+                  args.fanout,
+                  tree_stats_path,
+                  args.encoding,
+                  comm_bytes_path,
+                  stop_frac,
+                  args.stop_patience,
+                  args.time_budget,
+                  train_stats_path]
 
     rare_acc, all_acc, sizes, sum_sizes, sieve_taus = experiment(*input_args)
     
@@ -941,5 +1641,5 @@ if __name__ == "__main__":
                    args.trials,
                    args.num_sel_rounds)
 
-    balance_plot(date_time,sizes,args.num_algs,args.num_classes,args.num_sel_rounds,args.unif_taus,args.dyn_taus)
+    balance_plot(date_time,sizes,args.num_algs,args.num_classes,args.num_sel_rounds,args.unif_taus,args.dyn_taus,objective)
     accuracy_plot(df,date_time,args.num_algs,args.num_sel_rounds)
@@ -0,0 +1,95 @@
+import importlib.util
+import os
+import sys
+
+import torch
+
+EXPERIMENTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_script(name):
+    spec = importlib.util.spec_from_file_location(name, os.path.join(EXPERIMENTS_DIR, name + '.py'))
+    module = importlib.util.module_from_spec(spec)
+    argv, sys.argv = sys.argv, [name]
+    try:
+        spec.loader.exec_module(module)
+    finally:
+        sys.argv = argv
+    return module
+
+
+def write_embeds(tmp_path, num_classes, embed_dim):
+    # cached embeddings stand in for the ImageNet pass, so experiment never touches images
+    torch.manual_seed(0)
+    means = 3*torch.randn(num_classes, embed_dim)
+    paths = {}
+    for split, num_pts in [('train', 4000), ('test', 800)]:
+        labels = torch.arange(num_pts) % num_classes
+        embeds = means[labels] + torch.randn(num_pts, embed_dim)
+        paths[split] = (str(tmp_path / f'{split}_embeds.pkl'), str(tmp_path / f'{split}_labels.pkl'))
+        torch.save(embeds, paths[split][0])
+        torch.save(labels.float(), paths[split][1])
+    paths['idx_conv_dict'] = str(tmp_path / 'idx_conv_dict.pkl')
+    torch.save({}, paths['idx_conv_dict'])
+    return paths
+
+
+def test_filtered_round(tmp_path):
+    script = load_script('imnet_filtered_dmgt')
+    script.device = torch.device('cpu')
+    
+    args = script.parser.parse_args(['--imbals', '2', '2', '--num_agents', '2', '--trials', '0',
+                                     '--num_sel_rounds', '1', '--num_init_pts', '100', '--stream_size', '200',
+                                     '--num_epochs', '2', '--batch_size', '64', '--embed_dim', '16',
+                                     '--budget', '20', '--score_batch_size', '50'])
+    paths = write_embeds(tmp_path, args.num_classes, args.embed_dim)
+    val_path = lambda name: str(tmp_path / f'{name}.pkl')
+    
+    input_args = [args.num_init_pts, args.imbals, args.unif_taus, args.dyn_taus, args.trials,
+                  args.num_sel_rounds, args.num_algs, args.num_agents, args.stream_size, args.num_test_pts,
+                  args.num_epochs, args.batch_size, args.num_workers, args.num_classes, args.dataset_name,
+                  args.num_sm_bins, args.is_isoreg, args.embed_batch_size, args.embed_dim, args.data_dir,
+                  args.test_dir, args.folder_to_class_file, args.test_label_file,
+                  val_path('rare_acc'), val_path('all_acc'), val_path('sizes'), val_path('sum_sizes'),
+                  None, *paths['train'], paths['idx_conv_dict'], *paths['test'], val_path('model'),
+                  script.device, args.budget, args.epsilon, val_path('sieve_taus'), args.score_batch_size,
+                  script.Objective(args.objective, args.budget, args.objective_param), val_path('oracle_calls'),
+                  args.patience, args.num_procs, args.fanout, val_path('tree_stats'), args.encoding,
+                  val_path('comm_bytes'), args.vectorized, args.trainer, 0., args.stop_patience,
+                  args.time_budget, val_path('train_stats')]
+    
+    rare_acc, all_acc, sizes, sum_sizes, sieve_taus = script.experiment(*input_args)
+    
+    assert all_acc.shape == (1, 2, args.num_algs)
+    assert torch.all(all_acc[0,1] > 0)
+    assert torch.all(sum_sizes[0,1] > sum_sizes[0,0])
+    assert torch.load(val_path('comm_bytes')).sum() > 0
+
+
+def test_vectorized_ships_probs(monkeypatch):
+    script = load_script('imnet_filtered_dmgt')
+    device = torch.device('cpu')
+    num_agents, num_classes, embed_dim, budget, score_batch_size = 3, 4, 8, 30, 16
+    torch.manual_seed(0)
+    model = script.LogRegModel(embed_dim, num_classes)
+    streams_x = torch.randn(num_agents, 150, embed_dim)
+    streams_y = torch.randint(num_classes, (num_agents, 150))
+    objective = script.Objective('sqrt', budget)
+    select_args = (torch.tensor([0.2]), 0, model, num_classes, False, None, None, device, budget, score_batch_size, objective)
+
+    VEC_sets = script.get_VEC_DMGT_subsets(streams_x, streams_y, *select_args, torch.zeros(3))
+
+    for agent in range(num_agents):
+        DIST_DMGT_x, DIST_DMGT_y, DIST_DMGT_probs, _ = script.get_DIST_DMGT_subsets(streams_x[agent], streams_y[agent],
+                                                                                    *select_args, torch.zeros(3))
+        assert torch.equal(VEC_sets[agent][0], DIST_DMGT_x)
+        assert torch.equal(VEC_sets[agent][1], DIST_DMGT_y)
+        assert torch.allclose(VEC_sets[agent][2], DIST_DMGT_probs)
+
+    # the center filters the vectorized candidates with the probabilities they carry, without running the model
+    scored = []
+    class_probs = script.class_probs
+    monkeypatch.setattr(script, 'class_probs', lambda x, *args: scored.append(len(x)) or class_probs(x, *args))
+    script.tree_aggregate(VEC_sets, script.SelectedBuffer(budget*num_agents), 0, script.get_DIST_DMGT_subsets,
+                          select_args + (torch.zeros(3),), torch.zeros(4, 3))
+    assert scored == []
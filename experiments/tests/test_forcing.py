@@ -0,0 +1,103 @@
+import importlib.util
+import os
+import sys
+
+import numpy as np
+import pytest
+import torch
+from sklearn.isotonic import IsotonicRegression
+
+EXPERIMENTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_script(name):
+    spec = importlib.util.spec_from_file_location(name, os.path.join(EXPERIMENTS_DIR, name + '.py'))
+    module = importlib.util.module_from_spec(spec)
+    argv, sys.argv = sys.argv, [name]
+    try:
+        spec.loader.exec_module(module)
+    finally:
+        sys.argv = argv
+    return module
+
+
+def calibrated_setup(script, num_classes, embed_dim, stream_size):
+    torch.manual_seed(0)
+    model = script.LogRegModel(embed_dim, num_classes)
+
+    # every third item has logits far enough apart that its float32 top score is exactly 1
+    stream_x = torch.randn(stream_size, embed_dim)
+    stream_x[::3] *= 100
+    stream_y = torch.randint(num_classes, (stream_size,))
+
+    rng = np.random.default_rng(0)
+    isoregs = []
+    for _ in range(2):
+        top_scores = rng.uniform(1/num_classes, 1, 500)
+        preds_correct = (rng.uniform(size=500) < top_scores).astype(float)
+        isoregs += [script.IsoTable(IsotonicRegression(y_min=0, y_max=1, increasing=True, out_of_bounds='clip').fit(top_scores, preds_correct))]
+    return model, stream_x, stream_y, isoregs
+
+
+def unforced(self, threshold, budget, weights=None):
+    return False if self.size >= budget else None
+
+
+def unforced_states(self, thresholds, budget, weights=None):
+    reject = self.sizes >= budget
+    return torch.zeros_like(reject), reject
+
+
+def test_forcing_matches_scoring_with_isoreg(monkeypatch):
+    script = load_script('imnet_dmgt')
+    device = torch.device('cpu')
+    num_classes, budget, score_batch_size = 3, 40, 16
+    model, stream_x, stream_y, (rare_isoreg, common_isoreg) = calibrated_setup(script, num_classes, 8, 300)
+    objective = script.Objective('sqrt', budget)
+    taus = torch.tensor([0.3])
+
+    def run():
+        torch.manual_seed(1)
+        oracle_calls = torch.zeros(2, 3)
+        DMGT_x, DMGT_y, _, _ = script.get_DMGT_subsets(stream_x, stream_y, taus, 0, model, num_classes, True, rare_isoreg,
+                                                       common_isoreg, device, budget, score_batch_size, objective,
+                                                       oracle_calls[0], 0, 1, 0.01)
+        SIEVE_x, SIEVE_y, _ = script.get_SIEVE_subsets(stream_x, stream_y, model, num_classes, True, rare_isoreg,
+                                                       common_isoreg, device, budget, 0.1, score_batch_size, objective,
+                                                       oracle_calls[1])
+        return DMGT_x, SIEVE_x, oracle_calls
+
+    forced_DMGT_x, forced_SIEVE_x, forced_calls = run()
+    monkeypatch.setattr(script.SelectionState, 'forced', unforced)
+    monkeypatch.setattr(script.SelectionStates, 'forced', unforced_states)
+    scored_DMGT_x, scored_SIEVE_x, scored_calls = run()
+
+    assert torch.equal(forced_DMGT_x, scored_DMGT_x)
+    assert torch.equal(forced_SIEVE_x, scored_SIEVE_x)
+
+    # calibrated rows are still forced out once no class gain reaches the threshold, so scoring is skipped
+    assert forced_calls[0,0] < scored_calls[0,0]
+    assert forced_calls[0,1] > 0
+
+
+@pytest.mark.parametrize('is_isoreg', [False, True])
+def test_vectorized_matches_per_agent(is_isoreg):
+    script = load_script('imnet_distributed_dmgt')
+    device = torch.device('cpu')
+    num_agents, num_classes, budget, score_batch_size = 3, 3, 40, 16
+    model, stream_x, stream_y, (rare_isoreg, common_isoreg) = calibrated_setup(script, num_classes, 8, 600)
+    rare_isoreg, common_isoreg = (rare_isoreg, common_isoreg) if is_isoreg else (None, None)
+    streams_x, streams_y = stream_x.view(num_agents, -1, 8), stream_y.view(num_agents, -1)
+    objective = script.Objective('sqrt', budget)
+    taus = torch.tensor([0.3])
+
+    VEC_sets = script.get_VEC_DMGT_subsets(streams_x, streams_y, taus, 0, model, num_classes, is_isoreg, rare_isoreg,
+                                           common_isoreg, device, budget, score_batch_size, objective, torch.zeros(3))
+
+    for agent in range(num_agents):
+        DIST_DMGT_x, DIST_DMGT_y, *_ = script.get_DIST_DMGT_subsets(streams_x[agent], streams_y[agent], taus, 0, model,
+                                                                    num_classes, is_isoreg, rare_isoreg, common_isoreg,
+                                                                    device, budget, score_batch_size, objective,
+                                                                    torch.zeros(3))
+        assert torch.equal(VEC_sets[agent][0], DIST_DMGT_x)
+        assert torch.equal(VEC_sets[agent][1], DIST_DMGT_y)